@@ -0,0 +1,128 @@
+"""
+Aligns all pairs of a set of protein structures with TM-align and writes the TM-scores to
+a matrix (see helper/all_vs_all.py). Read the result with helper.all_vs_all.read_matrix.
+"""
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from helper import all_vs_all, telemetry
+from helper.cache import file_digest
+from helper.hpc import EXECUTORS, distribute_csv
+from helper.runners import TMAlignAllVsAll
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""
+        All-vs-all TM-align of a set of structures.
+        """
+    )
+
+    parser.add_argument(
+        "--dataset",
+        "-d",
+        required=True,
+        type=str,
+        help="Path to TSV file with the columns id and structure_path.",
+    )
+    parser.add_argument(
+        "--outdir", "-o", default=os.getcwd(), type=str, help="Path to output directory"
+    )
+    parser.add_argument(
+        "--min_tm_score",
+        default=0.0,
+        type=float,
+        help="Skip pairs whose length ratio rules out a TM-score (normalized by the"
+        " longer structure) of at least this value.",
+    )
+    parser.add_argument(
+        "--pairs_per_block",
+        default=100_000,
+        type=int,
+        help="Number of pairs of a block of matrix rows. Blocks are computed and"
+        " resumed as a whole.",
+    )
+    parser.add_argument(
+        "--cpus",
+        "-c",
+        default=1,
+        type=int,
+        help="Number of processes to use for parallel execution",
+    )
+    parser.add_argument(
+        "--backend",
+        default=None,
+        type=str,
+        choices=sorted(EXECUTORS),
+        help="Distribute the blocks as chunked array jobs: 'sge' on the HPC (ZBH"
+        " in-house cluster), 'local' with a pool of processes on this machine (--cpus"
+        " concurrent tasks). By default, blocks run in this process.",
+    )
+    parser.add_argument(
+        "--no_resume",
+        default=False,
+        action="store_true",
+        help="Recompute all blocks. By default, blocks that finished in an earlier run"
+        " with the same parameters (see journal in outdir/results) are skipped.",
+    )
+
+    args = parser.parse_args()
+
+    dataset_file = Path(args.dataset)
+    outdir = Path(args.outdir)
+    cpus = args.cpus
+    backend = args.backend
+    resume = not args.no_resume
+
+    if not dataset_file.is_file():
+        print("Error: Dataset file does not exist.")
+        sys.exit(1)
+    if not outdir.is_dir():
+        print("Error: Specified output directory does not exist or is not a directory.")
+        sys.exit(1)
+
+    logging.basicConfig(
+        filename=str((outdir / "log.log").absolute()),
+        level=logging.INFO,
+        format="%(asctime)s %(name)-12s %(levelname)-8s %(message)s",
+    )
+    logger.info(f'Starting scripts: {" ".join(sys.argv)}')
+
+    # timings of all TM-align calls (summarize with python -m helper.telemetry)
+    telemetry.enable(
+        telemetry.telemetry_dir() or outdir / "telemetry", dataset=dataset_file.stem
+    )
+
+    blocks_tsv = all_vs_all.prepare(
+        pd.read_csv(dataset_file, sep="\t", header=0),
+        outdir,
+        min_tm_score=args.min_tm_score,
+        pairs_per_block=args.pairs_per_block,
+        cpus=cpus,
+    )
+
+    if backend is not None:
+        distribute_csv(
+            blocks_tsv,
+            runner=TMAlignAllVsAll(outdir, cpus=1, resume=resume),
+            outdir=outdir,
+            job_name="all_vs_all",
+            cpus=cpus,
+            executor=EXECUTORS[backend](),
+        )
+    else:
+        runner = TMAlignAllVsAll(outdir, cpus=cpus, resume=resume)
+        runner.run(blocks_tsv, outdir / all_vs_all.RESULTS_DIR)
+
+    all_vs_all.fill_matrix(outdir, file_digest(outdir / all_vs_all.INDEX_TSV))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,7 @@ import helper
 from helper import BAD_PDBIDS
 from helper import constants
 from helper.constants import one_2_three_dict
-from helper.data_operations import read_microminer_csv
-from helper.utils import scantree
+from helper.data_operations import find_microminer_results, read_microminer_csv
 
 logger = logging.getLogger(__name__)
 
@@ -56,11 +55,19 @@ def main():
         " whole mutation datasets with structure annotations.",
     )
 
+    parser.add_argument(
+        "--cpus",
+        default=1,
+        type=int,
+        help="Number of processes to use for reading MicroMiner results",
+    )
+
     args = parser.parse_args()
 
     dataset_names = args.dataset
     mm_resultdir = Path(args.mm_resultdir)
     outdir = Path(args.outdir)
+    cpus = args.cpus
     ids_only = args.ids_only
 
     logging.basicConfig(
@@ -78,10 +85,8 @@ def main():
         print("Error: Specified output directory does not exist or is not a directory.")
         sys.exit(1)
 
-    mm_result_file_paths = [
-        path for path in scantree(mm_resultdir) if path.name == "resultStatistic.csv"
-    ]
-    df_mm = read_microminer_csv(mm_result_file_paths)
+    mm_result_file_paths = find_microminer_results([mm_resultdir])
+    df_mm = read_microminer_csv(mm_result_file_paths, cpus=cpus)
 
     logger.info(f"Collected {df_mm.shape[0]} MicroMiner hits from disk")
 
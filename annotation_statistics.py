@@ -10,8 +10,7 @@ import helper
 from helper import BAD_PDBIDS
 from helper import constants
 from helper.constants import one_2_three_dict
-from helper.data_operations import read_microminer_csv
-from helper.utils import scantree
+from helper.data_operations import find_microminer_results, read_microminer_csv
 
 logger = logging.getLogger(__name__)
 
@@ -49,11 +48,19 @@ def main():
         "--outdir", "-o", default=os.getcwd(), type=str, help="Path to output directory"
     )
 
+    parser.add_argument(
+        "--cpus",
+        default=1,
+        type=int,
+        help="Number of processes to use for reading MicroMiner results",
+    )
+
     args = parser.parse_args()
 
     dataset_names = args.dataset
     mm_resultdir = Path(args.mm_resultdir)
     outdir = Path(args.outdir)
+    cpus = args.cpus
 
     logging.basicConfig(
         level=logging.INFO, format="%(asctime)s %(name)-12s %(levelname)-8s %(message)s"
@@ -70,10 +77,8 @@ def main():
         print("Error: Specified output directory does not exist or is not a directory.")
         sys.exit(1)
 
-    mm_result_file_paths = [
-        path for path in scantree(mm_resultdir) if path.name == "resultStatistic.csv"
-    ]
-    df_mm = read_microminer_csv(mm_result_file_paths)
+    mm_result_file_paths = find_microminer_results([mm_resultdir])
+    df_mm = read_microminer_csv(mm_result_file_paths, cpus=cpus)
 
     logger.info(f"Collected {df_mm.shape[0]} MicroMiner rows from disk")
 
@@ -0,0 +1,86 @@
+"""Simulated wall-clock time of an HPC array job with equal-row chunks and with
+longest-job-first bin-packing (see helper.hpc.scheduling).
+
+Query costs are drawn from a heavy-tailed distribution (most structures are small, few
+are large ribosomes or viral capsids). Tasks are started in array order on a limited
+number of slots, like SGE does with "-tc".
+
+Usage: python benchmarks/hpc_scheduling.py --nof_queries 200000 --cpus 800
+"""
+import argparse
+import heapq
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from helper.hpc.scheduling import schedule_longest_first  # noqa: E402
+
+
+def simulate_wall_clock(task_costs: np.ndarray, slots: int) -> float:
+    """Simulates the wall-clock time of tasks started in order on a number of slots.
+
+    :param task_costs: Total cost of every task in array order.
+    :param slots: Number of concurrently running tasks.
+    :return: Time until the last task finished.
+    """
+    finish_times = [0.0] * slots
+    for cost in task_costs:
+        heapq.heapreplace(finish_times, finish_times[0] + cost)
+    return max(finish_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""
+        Compare the simulated wall-clock time of equal-row chunks and cost-aware
+        longest-job-first scheduling.
+        """
+    )
+    parser.add_argument("--nof_queries", default=200_000, type=int)
+    parser.add_argument("--cpus", default=800, type=int)
+    parser.add_argument("--sigma", default=1.5, type=float, help="Log-normal sigma.")
+    parser.add_argument(
+        "--noise",
+        default=0.5,
+        type=float,
+        help="Log-normal sigma of the error of the cost estimate.",
+    )
+    parser.add_argument("--seed", default=42, type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    costs = pd.Series(rng.lognormal(0.0, args.sigma, args.nof_queries))
+    # the scheduler only knows an estimate of the costs, e.g. from file sizes
+    estimates = costs * rng.lognormal(0.0, args.noise, args.nof_queries)
+
+    # same number of tasks as get_chunksize
+    chunksize = -(-args.nof_queries // (args.cpus * 4))
+    nof_tasks = -(-args.nof_queries // chunksize)
+
+    equal_rows = costs.groupby(np.arange(args.nof_queries) // chunksize).sum()
+    schedule = schedule_longest_first(estimates, nof_tasks)
+    longest_first = costs[schedule.index].groupby(schedule.to_numpy()).sum()
+
+    lower_bound = max(costs.sum() / args.cpus, costs.max())
+    print(
+        f"{args.nof_queries} queries, {nof_tasks} tasks on {args.cpus} slots,"
+        f" lower bound {lower_bound:.1f}"
+    )
+    for name, task_costs in [
+        ("equal rows", equal_rows),
+        ("longest first", longest_first),
+    ]:
+        wall_clock = simulate_wall_clock(task_costs.to_numpy(), args.cpus)
+        print(
+            f"{name:>14}: wall clock {wall_clock:8.1f}"
+            f" ({wall_clock / lower_bound:5.2f}x lower bound),"
+            f" longest task {task_costs.max():7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Cold-start import time of the entry points of the helper package.
+
+Imports every entry point in fresh interpreters with ``python -X importtime`` and reports
+the summed import time and whether pandas was imported, e.g. to compare before and after
+a change of the imports:
+
+Usage: python benchmarks/import_time.py --repeats 10 --top 15
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# statements executed at the start of scripts and tasks
+ENTRY_POINTS = {
+    "import helper": "import helper",
+    # the runner script of the HPC tasks (see distribute_csv.generate_runner_script)
+    "runner script": "from helper.runners import MicroMinerSearch",
+    # the k-mer index staging of the HPC tasks (see distribute_csv)
+    "node_cache": "import helper.hpc.node_cache",
+    "dataset collection": "import helper; helper.get_dataset_collection()",
+}
+
+
+def parse_importtime(stderr: str) -> Tuple[int, Dict[str, int]]:
+    """Parse the output of python -X importtime.
+
+    :param stderr: Standard error of the interpreter.
+    :return: Summed import time of the top-level imports in microseconds and the
+             cumulative import time of every module.
+    """
+    total = 0
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = int(cumulative)
+        # nested imports are indented
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total, modules
+
+
+def measure(statement: str, repeats: int) -> Tuple[List[int], Dict[str, int]]:
+    """Import an entry point in fresh interpreters.
+
+    :param statement: Python statement importing the entry point.
+    :param repeats: Number of interpreters.
+    :return: The summed import times in microseconds and the cumulative import times of
+             the modules of the fastest run.
+    """
+    times = []
+    fastest = None
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        total, modules = parse_importtime(out.stderr)
+        times.append(total)
+        if fastest is None or total <= min(times):
+            fastest = modules
+    return times, fastest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cold-start import time of the helper entry points."
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="Fresh interpreters per entry point."
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        help="Print the most expensive helper modules and pandas of every entry point.",
+    )
+    args = parser.parse_args()
+
+    for label, statement in ENTRY_POINTS.items():
+        times, modules = measure(statement, args.repeats)
+        print(
+            f"{label:20s} min {min(times) / 1000:7.1f} ms"
+            f"  median {statistics.median(times) / 1000:7.1f} ms"
+            f"  pandas imported: {'pandas' in modules}"
+        )
+        if args.top > 0:
+            top = sorted(
+                (
+                    (t, name)
+                    for name, t in modules.items()
+                    if name.startswith("helper") or name == "pandas"
+                ),
+                reverse=True,
+            )[: args.top]
+            for t, name in top:
+                print(f"    {t / 1000:7.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Benchmark of merge_results_for_pair_eval against its reference implementation.
+
+Generates a synthetic mutation dataset and MicroMiner hit table, runs both implementations
+for all matching modes and checks that all outputs are identical (values, dtypes, index and
+column order).
+
+Usage: python benchmarks/merge_results_for_pair_eval.py --nof_mutations 20000 --nof_hits 2000000
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from helper import BAD_PDBIDS  # noqa: E402
+from helper.constants import (  # noqa: E402
+    MM_QUERY_NAME,
+    MM_HIT_NAME,
+    MM_QUERY_POS,
+    MM_HIT_POS,
+    MM_QUERY_AA,
+    MM_HIT_AA,
+    MM_QUERY_CHAIN,
+    MM_HIT_CHAIN,
+    WILD_COL,
+    MUTANT_COL,
+    WILD_AA,
+    MUT_AA,
+    WILD_SEQ_NUM,
+    WILD_CHAIN,
+    one_2_three_dict,
+)
+from helper.data_operations import merge_results_for_pair_eval  # noqa: E402
+
+
+def merge_results_for_pair_eval_reference(
+    df_dataset: pd.DataFrame, df_microminer: pd.DataFrame, backward: bool
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Reference implementation of merge_results_for_pair_eval (before vectorization).
+
+    Wild-type columns are matched with MM query while mutant name and mutant AA are matched with
+    MM hit columns to check if MicroMiner could retrieve the wild-type/mutant structure pair
+    from the mutation dataset. Use backward parameter to invert matching.
+
+    # If a chain ID is available in the mutation dataset it will be used for matching. Note that,
+    # many mutation dataset contain no chain or inconsistent chain information (especially for
+    # the backward case) in these cases chain ID will not be used for matching.
+
+    :param df_dataset: The mutation dataset dataframe.
+    :param df_microminer: The MicroMiner result dataframe.
+    :param backward: Whether to match backward (match wild-type columns with MM hit columns
+                     and mutant columns with MM query columns)
+    :return: 3 dataframes: mutations found by MicroMiner, mutations not found, a dataframe of all
+             mutation annotated with MicroMiner results.
+    """
+    df_ref = df_dataset
+    df_mm = df_microminer
+
+    assert MUTANT_COL in df_ref.columns, f"Need {MUTANT_COL} column"
+
+    right_on = [MM_QUERY_NAME, MM_HIT_NAME, MM_QUERY_AA, MM_HIT_AA, MM_QUERY_POS]
+    if backward:
+        right_on = [MM_QUERY_NAME, MM_HIT_NAME, MM_QUERY_AA, MM_HIT_AA, MM_HIT_POS]
+
+    ref_key_cols = [WILD_COL, WILD_AA, WILD_SEQ_NUM, MUT_AA, MUTANT_COL]
+
+    if WILD_CHAIN in df_ref.columns:
+        # Unfortunately, some mutation dataset hold no or inconsistent chain ID annotations.
+        # We only use the chain ID if we trust the annotation. We trust the annotation
+        # when a WILD_CHAIN column is available.
+        right_on.append(MM_HIT_CHAIN if backward else MM_QUERY_CHAIN)
+        ref_key_cols.append(WILD_CHAIN)
+
+    # We can drop duplicates in MicroMiner results here. Duplicates are not necessary
+    # to check for successful retrieval of a known wild-type/mutant structure pair.
+    # In addition, probably all duplicates present are multiple matches in homo-meric structures.
+    df_mm = df_mm.drop_duplicates(right_on)
+
+    df_ref = df_ref[~df_ref[WILD_COL].isin(BAD_PDBIDS)]
+    df_ref = df_ref[~df_ref[MUTANT_COL].isin(BAD_PDBIDS)]
+
+    # drop duplicates. There are often duplicates, e.g. because of multiple ddG measurements
+    df_ref = df_ref.drop_duplicates(ref_key_cols)
+
+    from_one_to_three = lambda aa: one_2_three_dict[aa] if len(aa) != 3 else aa
+    df_ref["wild_aa3"] = df_ref[WILD_AA].apply(from_one_to_three)
+    df_ref["mutant_aa3"] = df_ref[MUT_AA].apply(from_one_to_three)
+
+    left_on = [WILD_COL, MUTANT_COL, "wild_aa3", "mutant_aa3", WILD_SEQ_NUM]
+    if backward:
+        left_on = [MUTANT_COL, WILD_COL, "mutant_aa3", "wild_aa3", WILD_SEQ_NUM]
+
+    if WILD_CHAIN in df_ref.columns:
+        left_on.append(WILD_CHAIN)
+
+    df_merged = df_ref.merge(df_mm, left_on=left_on, right_on=right_on, how="left")
+    df_anno = df_merged.dropna(subset=right_on)
+    df_not_found = df_ref.merge(
+        df_mm, left_on=left_on, right_on=right_on, how="left", indicator=True
+    )
+    df_not_found.query('_merge == "left_only"', inplace=True)
+    df_not_found.drop("_merge", axis=1, inplace=True)
+
+    # clean up
+    df_anno = df_anno.drop(["wild_aa3", "mutant_aa3"], axis=1)
+    df_not_found.drop(["wild_aa3", "mutant_aa3"], axis=1, inplace=True)
+    df_merged = df_merged.drop(["wild_aa3", "mutant_aa3"], axis=1)
+
+    return df_anno, df_not_found, df_merged
+
+
+def make_synthetic_tables(
+    nof_mutations: int, nof_hits: int, seed: int = 42
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Generates a synthetic mutation dataset and a MicroMiner hit table.
+
+    About half of the mutations have a matching hit, about half of them in backward
+    direction (mutant as query, wild-type as hit). The hit table contains duplicates, hits
+    for other mutations and further columns of different dtypes.
+
+    :param nof_mutations: Number of mutations in the dataset.
+    :param nof_hits: Number of MicroMiner hits.
+    :param seed: Random seed.
+    :return: The mutation dataset and the MicroMiner hit table.
+    """
+    rng = np.random.default_rng(seed)
+    pdbids = np.array(
+        [f"{i}{chr(65 + i % 26)}{i % 7}{chr(65 + i % 11)}" for i in range(1, 10)]
+        + [f"{i:04X}" for i in range(4096, 4096 + nof_mutations // 10 + 10)]
+    )
+    one_letter = np.array(sorted(one_2_three_dict.keys()))
+    chains = np.array(["A", "B", "C", "1"])
+
+    def mutations(n):
+        return pd.DataFrame(
+            {
+                WILD_COL: rng.choice(pdbids, n),
+                MUTANT_COL: rng.choice(pdbids, n),
+                WILD_AA: rng.choice(one_letter, n),
+                WILD_SEQ_NUM: rng.integers(-5, 500, n).astype(str),
+                MUT_AA: rng.choice(one_letter, n),
+                WILD_CHAIN: rng.choice(chains, n),
+            }
+        )
+
+    df_dataset = mutations(nof_mutations)
+    df_dataset["ddG"] = rng.normal(size=nof_mutations)
+    # some 3-letter codes, duplicate measurements and bad PDB IDs
+    three_letter = rng.random(nof_mutations) < 0.1
+    df_dataset.loc[three_letter, WILD_AA] = df_dataset.loc[three_letter, WILD_AA].map(
+        one_2_three_dict
+    )
+    df_dataset = pd.concat(
+        [df_dataset, df_dataset.sample(nof_mutations // 10, random_state=seed)],
+        ignore_index=True,
+    )
+    df_dataset.loc[df_dataset.index[:3], WILD_COL] = BAD_PDBIDS[0]
+
+    # hits for half of the mutations (in both directions) and random other hits
+    df_true = df_dataset.sample(frac=0.5, random_state=seed)
+    df_true = pd.concat([df_true, mutations(max(0, nof_hits - df_true.shape[0]))])
+    df_true = df_true.sample(nof_hits, replace=True, random_state=seed)
+    # backward hits have the mutant as query and the wild-type as hit
+    backward = rng.random(nof_hits) < 0.5
+    wild_aa3 = df_true[WILD_AA].map(lambda aa: one_2_three_dict.get(aa, aa)).to_numpy()
+    mut_aa3 = df_true[MUT_AA].map(one_2_three_dict).to_numpy()
+    wild_chain = df_true[WILD_CHAIN].to_numpy()
+    other_chain = rng.choice(chains, nof_hits)
+    df_mm = pd.DataFrame(
+        {
+            MM_QUERY_NAME: np.where(
+                backward, df_true[MUTANT_COL].to_numpy(), df_true[WILD_COL].to_numpy()
+            ),
+            MM_QUERY_AA: np.where(backward, mut_aa3, wild_aa3),
+            MM_QUERY_CHAIN: np.where(backward, other_chain, wild_chain),
+            MM_QUERY_POS: df_true[WILD_SEQ_NUM].to_numpy(),
+            MM_HIT_NAME: np.where(
+                backward, df_true[WILD_COL].to_numpy(), df_true[MUTANT_COL].to_numpy()
+            ),
+            MM_HIT_AA: np.where(backward, wild_aa3, mut_aa3),
+            MM_HIT_CHAIN: np.where(backward, wild_chain, other_chain),
+            MM_HIT_POS: df_true[WILD_SEQ_NUM].to_numpy(),
+            "nofSiteResidues": rng.integers(5, 40, nof_hits),
+            "siteTMScore": rng.random(nof_hits),
+            "isHomomer": rng.random(nof_hits) < 0.5,
+        }
+    )
+    return df_dataset, df_mm
+
+
+def _assert_identical(expected: pd.DataFrame, actual: pd.DataFrame, name: str) -> None:
+    """Checks that two dataframes are identical including dtypes, index and columns.
+
+    :param expected: Expected dataframe.
+    :param actual: Actual dataframe.
+    :param name: Name of the dataframe for error messages.
+    :return: None
+    """
+    pd.testing.assert_frame_equal(actual, expected, check_exact=True, obj=name)
+    if not actual.equals(expected):
+        raise AssertionError(f"{name} differs")
+
+
+def _measure(func, *args):
+    """Runs a function and measures its run time and peak memory allocation.
+
+    :param func: The function.
+    :param args: Arguments of the function.
+    :return: Tuple of the return value, the run time and the peak memory in bytes.
+    """
+    tracemalloc.start()
+    tic = time.perf_counter()
+    ret = func(*args)
+    toc = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ret, toc - tic, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""
+        Benchmark merge_results_for_pair_eval against its reference implementation and
+        check that both give identical results.
+        """
+    )
+    parser.add_argument("--nof_mutations", default=20_000, type=int)
+    parser.add_argument("--nof_hits", default=1_000_000, type=int)
+    parser.add_argument("--seed", default=42, type=int)
+    args = parser.parse_args()
+
+    df_dataset, df_mm = make_synthetic_tables(
+        args.nof_mutations, args.nof_hits, args.seed
+    )
+    print(f"{df_dataset.shape[0]} mutations, {df_mm.shape[0]} MicroMiner hits")
+
+    df_dataset_nochain = df_dataset.drop(columns=[WILD_CHAIN])
+    # read_microminer_csv returns categorical string columns
+    df_mm_categorical = df_mm.astype(
+        {c: "category" for c in df_mm.columns if df_mm[c].dtype == object}
+    )
+    for name, df_ref, df_hits in [
+        ("with chain", df_dataset, df_mm),
+        ("without chain", df_dataset_nochain, df_mm),
+        ("categorical", df_dataset, df_mm_categorical),
+    ]:
+        for backward in [False, True]:
+            expected, t_ref, mem_ref = _measure(
+                merge_results_for_pair_eval_reference, df_ref, df_hits, backward
+            )
+            actual, t_new, mem_new = _measure(
+                merge_results_for_pair_eval, df_ref, df_hits, backward
+            )
+            for df_name, df_expected, df_actual in zip(
+                ["annotated", "not found", "merged"], expected, actual
+            ):
+                _assert_identical(df_expected, df_actual, df_name)
+            if actual[0].shape[0] == 0:
+                raise AssertionError(
+                    f"No annotated mutations {name} backward={backward}"
+                )
+            print(
+                f"{name:>13} backward={backward!s:<5}:"
+                f" reference {t_ref:7.3f} s {mem_ref / 2**20:8.1f} MiB |"
+                f" vectorized {t_new:7.3f} s {mem_new / 2**20:8.1f} MiB |"
+                f" speedup {t_ref / t_new:5.1f}x |"
+                f" outputs identical ({actual[0].shape[0]} annotated)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Wall-clock time of reading query structures from slow storage and computing on them,
+with and without prefetching (see helper.prefetch).
+
+Slow storage is simulated by a fixed latency per read, the search by a fixed compute
+time per query. Without prefetching, every query pays both. With prefetching, reads
+overlap with the computation of earlier queries and the time approaches the compute-bound
+limit.
+
+Usage: python benchmarks/prefetch.py --nof_queries 200 --read_latency 0.02 --compute 0.02
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from helper.prefetch import Prefetcher  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare sequential reads and prefetching of query structures."
+    )
+    parser.add_argument("--nof_queries", default=200, type=int)
+    parser.add_argument(
+        "--read_latency", default=0.02, type=float, help="Seconds per file read."
+    )
+    parser.add_argument(
+        "--compute", default=0.02, type=float, help="Seconds of computation per query."
+    )
+    parser.add_argument("--depth", default=8, type=int, help="Prefetch depth.")
+    args = parser.parse_args()
+
+    copyfile = shutil.copyfile
+
+    def slow_read(src, dst=None):
+        time.sleep(args.read_latency)
+        if dst is not None:
+            return copyfile(src, dst)
+        return Path(src).read_bytes()
+
+    def compute(path: Path):
+        time.sleep(args.compute)
+        return len(path.read_bytes())
+
+    with tempfile.TemporaryDirectory() as t:
+        tmpdir = Path(t)
+        jobs = []
+        for i in range(args.nof_queries):
+            path = tmpdir / f"pdb{i:04d}.ent.gz"
+            path.write_bytes(b"x" * 10_000)
+            jobs.append((str(i), path))
+
+        start = time.time()
+        for _, path in jobs:
+            slow_read(path)
+            compute(path)
+        t_sequential = time.time() - start
+
+        prefetcher = Prefetcher(depth=args.depth, max_size=64 * 1024**2)
+        start = time.time()
+        with mock.patch("helper.prefetch.shutil.copyfile", slow_read):
+            for key, path in prefetcher.prefetch(jobs, path_index=1):
+                compute(path)
+                prefetcher.release(key)
+        t_prefetch = time.time() - start
+
+    t_compute = args.nof_queries * args.compute
+    print(f"compute-bound limit: {t_compute:.2f}s")
+    print(f"sequential reads:    {t_sequential:.2f}s ({t_sequential / t_compute:.2f}x)")
+    print(f"prefetching:         {t_prefetch:.2f}s ({t_prefetch / t_compute:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""Performance benchmark suite of the hot paths of the helper package.
+
+Every benchmark generates synthetic data (see synthetic.py), scaled by --scale, and times
+a function over several repeats. Results can be saved as a JSON baseline and compared
+against a baseline to flag regressions, e.g. before and after a change:
+
+Usage: python benchmarks/suite.py --save benchmarks/baselines/before.json
+       python benchmarks/suite.py --compare benchmarks/baselines/before.json --threshold 0.2
+
+Baselines are only comparable on the same machine with the same --scale.
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import synthetic  # noqa: E402
+from helper import tmalign  # noqa: E402
+from helper.constants import CONFIG  # noqa: E402
+from helper.data_operations import (  # noqa: E402
+    make_search_parameter_table,
+    merge_results_for_pair_eval,
+    read_microminer_csv,
+)
+from helper.datasets.dataset import MockMutationDataset  # noqa: E402
+from helper.datasets.pdb_index import get_structure_file_index  # noqa: E402
+from helper.mock_executables import (  # noqa: E402
+    write_mock_microminer,
+    write_mock_tmalign,
+)
+from helper.mol_utils import read_plddt_values  # noqa: E402
+from helper.plddt import extract_plddt  # noqa: E402
+from helper.runners import MicroMinerPair, MicroMinerSearch, TMAlignBatch  # noqa: E402
+from helper.utils import scantree  # noqa: E402
+
+# A benchmark gets a scratch directory and the scale. It generates its data and returns
+# the timed function and the size parameters of the data.
+Benchmark = Callable[[Path, float], Tuple[Callable[[], object], Dict]]
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str):
+    """Registers a benchmark of the suite.
+
+    :param name: Name of the benchmark.
+    :return: Decorator.
+    """
+
+    def register(func: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+def _scaled(n: int, scale: float) -> int:
+    return max(1, int(round(n * scale)))
+
+
+@benchmark("read_microminer_csv")
+def bench_read_microminer_csv(tmpdir: Path, scale: float):
+    nof_queries = _scaled(500, scale)
+    nof_hits = _scaled(200000, scale)
+    files = synthetic.write_result_tree(tmpdir, nof_queries, nof_hits)
+    return lambda: read_microminer_csv(files), {
+        "nof_files": nof_queries,
+        "nof_hits": nof_hits,
+    }
+
+
+@benchmark("merge_results_for_pair_eval")
+def bench_merge_results_for_pair_eval(tmpdir: Path, scale: float):
+    nof_mutations = _scaled(20000, scale)
+    nof_hits = _scaled(500000, scale)
+    df_dataset, df_mm = synthetic.make_synthetic_tables(nof_mutations, nof_hits)
+    return lambda: merge_results_for_pair_eval(df_dataset, df_mm, False), {
+        "nof_mutations": nof_mutations,
+        "nof_hits": nof_hits,
+    }
+
+
+@benchmark("make_search_parameter_table")
+def bench_make_search_parameter_table(tmpdir: Path, scale: float):
+    nof_mutations = _scaled(50000, scale)
+    df_dataset = synthetic.make_mutation_dataset(nof_mutations)
+    pdbids = synthetic.mutation_pdbids(df_dataset)
+    # most, but not all structures of the dataset are in the mirror
+    synthetic.write_pdb_mirror(tmpdir / "pdb", pdbids[: int(len(pdbids) * 0.9)])
+    dataset = MockMutationDataset()
+    dataset.read_single_mutations = lambda pdb_mutant_only=False: df_dataset.copy()
+
+    def run():
+        # the structure file index is built once per process. Time a full build.
+        get_structure_file_index.cache_clear()
+        with mock.patch.dict(
+            CONFIG["DATA"], {"PDB_DIR": str(tmpdir / "pdb"), "PDB_OBSOLETE_DIR": ""}
+        ), mock.patch.dict(CONFIG["CACHE"], {"PDB_INDEX_DIR": ""}):
+            return make_search_parameter_table(dataset, backward=False)
+
+    return run, {"nof_mutations": nof_mutations, "nof_structures": len(pdbids)}
+
+
+@benchmark("read_plddt_values")
+def bench_read_plddt_values(tmpdir: Path, scale: float):
+    nof_files = _scaled(20, scale)
+    nof_residues = 1000
+    paths = []
+    for i in range(nof_files):
+        path = tmpdir / f"AF-{i:05d}-F1-model_v4.pdb.gz"
+        synthetic.write_alphafold_structure(path, nof_residues, seed=i)
+        paths.append(path)
+    return lambda: [read_plddt_values(p) for p in paths], {
+        "nof_files": nof_files,
+        "nof_residues": nof_residues,
+    }
+
+
+@benchmark("extract_plddt")
+def bench_extract_plddt(tmpdir: Path, scale: float):
+    nof_files = _scaled(200, scale)
+    nof_residues = 1000
+    paths = []
+    for i in range(nof_files):
+        path = tmpdir / f"AF-{i:05d}-F1-model_v4.pdb.gz"
+        synthetic.write_alphafold_structure(path, nof_residues, seed=i)
+        paths.append(path)
+    outdirs = (tmpdir / f"out{i}" for i in range(1_000_000))
+    return lambda: extract_plddt(paths, next(outdirs)), {
+        "nof_files": nof_files,
+        "nof_residues": nof_residues,
+    }
+
+
+@benchmark("tmalign.parse_stdout")
+def bench_tmalign_parse_stdout(tmpdir: Path, scale: float):
+    stdout, nof_alignments = synthetic.make_tmalign_stdout(_scaled(5000, scale))
+    return lambda: tmalign.parse_stdout(stdout, read_alignment=True), {
+        "nof_alignments": nof_alignments
+    }
+
+
+def _bench_scantree(tmpdir: Path, scale: float, threads: int):
+    nof_dirs = _scaled(500, scale)
+    nof_files = synthetic.write_file_tree(tmpdir, nof_dirs, 40)
+    return lambda: sum(1 for _ in scantree(tmpdir, threads=threads)), {
+        "nof_dirs": nof_dirs,
+        "nof_files": nof_files,
+        "threads": threads,
+    }
+
+
+@benchmark("scantree")
+def bench_scantree(tmpdir: Path, scale: float):
+    return _bench_scantree(tmpdir, scale, threads=1)
+
+
+@benchmark("scantree_threads")
+def bench_scantree_threads(tmpdir: Path, scale: float):
+    return _bench_scantree(tmpdir, scale, threads=16)
+
+
+def _write_search_input(tmpdir: Path, nof_queries: int) -> Path:
+    """Writes small query structures and a search parameter TSV for them.
+
+    :param tmpdir: Directory to write to.
+    :param nof_queries: Number of queries.
+    :return: Path to the search parameter TSV.
+    """
+    rows = []
+    for i in range(nof_queries):
+        path = tmpdir / f"pdb{i:04d}.ent"
+        synthetic.write_alphafold_structure(path, 100, seed=i, compress=False)
+        rows.append({"id": f"{i:04d}", "structure_path": path})
+    param_tsv = tmpdir / "input.tsv"
+    pd.DataFrame(rows).to_csv(param_tsv, sep="\t", index=False)
+    return param_tsv
+
+
+def _bench_search(tmpdir: Path, scale: float, batch: bool):
+    nof_queries = _scaled(40, scale)
+    exe = write_mock_microminer(tmpdir / "MicroMiner", tmpdir / "index_loads.txt")
+    param_tsv = _write_search_input(tmpdir, nof_queries)
+    runner = MicroMinerSearch(
+        mm_mode="single_mutation", mm_repr="monomer", batch=batch, resume=False
+    )
+    outdirs = (tmpdir / f"out{i}" for i in range(1_000_000))
+
+    def run():
+        with mock.patch.dict(CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}):
+            return runner.run(param_tsv, next(outdirs))
+
+    return run, {"nof_queries": nof_queries, "batch": batch}
+
+
+@benchmark("MicroMinerSearch")
+def bench_microminer_search(tmpdir: Path, scale: float):
+    return _bench_search(tmpdir, scale, batch=False)
+
+
+@benchmark("MicroMinerSearch_batch")
+def bench_microminer_search_batch(tmpdir: Path, scale: float):
+    return _bench_search(tmpdir, scale, batch=True)
+
+
+@benchmark("MicroMinerPair")
+def bench_microminer_pair(tmpdir: Path, scale: float):
+    nof_pairs = _scaled(40, scale)
+    exe = write_mock_microminer(tmpdir / "MicroMiner", tmpdir / "index_loads.txt")
+    df = pd.read_csv(_write_search_input(tmpdir, nof_pairs + 1), sep="\t")
+    param_tsv = tmpdir / "pairs.tsv"
+    pd.DataFrame(
+        {
+            "id1": df["id"].iloc[:-1].to_numpy(),
+            "structure_path1": df["structure_path"].iloc[:-1].to_numpy(),
+            "id2": df["id"].iloc[1:].to_numpy(),
+            "structure_path2": df["structure_path"].iloc[1:].to_numpy(),
+        }
+    ).to_csv(param_tsv, sep="\t", index=False)
+    runner = MicroMinerPair(resume=False)
+    outdirs = (tmpdir / f"out{i}" for i in range(1_000_000))
+
+    def run():
+        with mock.patch.dict(CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}):
+            return runner.run(param_tsv, next(outdirs))
+
+    return run, {"nof_pairs": nof_pairs}
+
+
+@benchmark("TMAlignBatch")
+def bench_tmalign_batch(tmpdir: Path, scale: float):
+    nof_structures = _scaled(20, scale)
+    exe = write_mock_tmalign(tmpdir / "TMalign", tmpdir / "reads.txt")
+    paths = []
+    for i in range(nof_structures):
+        path = tmpdir / f"pdb{i:04d}.ent.gz"
+        synthetic.write_alphafold_structure(path, 300, seed=i)
+        paths.append(path)
+    # every structure is part of several pairs
+    pairs = [
+        (i, (i + k) % nof_structures) for i in range(nof_structures) for k in (1, 2)
+    ]
+    df = pd.DataFrame(
+        {
+            "id1": [str(i) for i, _ in pairs],
+            "structure_path1": [paths[i] for i, _ in pairs],
+            "id2": [str(j) for _, j in pairs],
+            "structure_path2": [paths[j] for _, j in pairs],
+        }
+    )
+    runner = TMAlignBatch(read_alignment=True)
+
+    def run():
+        with mock.patch.dict(CONFIG["EXECUTABLES"], {"TMALIGN": str(exe)}):
+            return runner.run(df)
+
+    return run, {"nof_structures": nof_structures, "nof_pairs": len(pairs)}
+
+
+def run_benchmark(name: str, scale: float, repeats: int) -> Dict:
+    """Runs a benchmark of the suite.
+
+    :param name: Name of the benchmark.
+    :param scale: Scale of the synthetic data.
+    :param repeats: Number of timed runs.
+    :return: Dict with the size parameters and the times of all runs in seconds.
+    """
+    with tempfile.TemporaryDirectory() as t:
+        func, params = BENCHMARKS[name](Path(t), scale)
+        func()  # warm up, e.g. imports and the page cache
+        times = []
+        for _ in range(repeats):
+            tic = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - tic)
+    return {
+        "params": params,
+        "times": times,
+        "min": min(times),
+        "median": statistics.median(times),
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Compares benchmark results against a baseline.
+
+    The fastest run of every benchmark is compared, it is the least noisy statistic.
+
+    :param baseline: Results of the baseline (see main).
+    :param current: Results to compare.
+    :param threshold: Relative slowdown above which a benchmark is a regression, e.g. 0.2
+                      for 20 percent.
+    :return: Names of the regressed benchmarks.
+    """
+    if baseline["meta"]["scale"] != current["meta"]["scale"]:
+        print(
+            f"Warning: baseline has scale {baseline['meta']['scale']}, current results"
+            f" have scale {current['meta']['scale']}"
+        )
+    regressions = []
+    print(f"{'benchmark':<30s} {'baseline':>10s} {'current':>10s} {'change':>8s}")
+    for name, result in current["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            print(f"{name:<30s} {'-':>10s} {result['min']:>9.4f}s {'new':>8s}")
+            continue
+        base = baseline["benchmarks"][name]["min"]
+        change = result["min"] / base - 1.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<30s} {base:>9.4f}s {result['min']:>9.4f}s {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the hot paths of the helper package on synthetic data."
+    )
+    parser.add_argument(
+        "--scale", default=1.0, type=float, help="Scale of the synthetic data."
+    )
+    parser.add_argument("--repeats", default=5, type=int, help="Timed runs.")
+    parser.add_argument(
+        "--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run."
+    )
+    parser.add_argument(
+        "--save", type=Path, default=None, help="Save the results as JSON baseline."
+    )
+    parser.add_argument(
+        "--compare", type=Path, default=None, help="JSON baseline to compare against."
+    )
+    parser.add_argument(
+        "--threshold",
+        default=0.2,
+        type=float,
+        help="Relative slowdown flagged as regression (with --compare).",
+    )
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "scale": args.scale,
+            "repeats": args.repeats,
+        },
+        "benchmarks": {},
+    }
+    for name in args.only or BENCHMARKS:
+        result = run_benchmark(name, args.scale, args.repeats)
+        results["benchmarks"][name] = result
+        print(
+            f"{name:<30s} min={result['min']:.4f}s median={result['median']:.4f}s"
+            f" {result['params']}"
+        )
+
+    if args.save is not None:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if baseline is not None:
+        regressions = compare(baseline, results, args.threshold)
+        if len(regressions) > 0:
+            print(f"Regressions above {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Synthetic data for benchmarks: mutation datasets, MicroMiner result trees, PDB mirrors,
+AlphaFold structures and TM-align output of configurable size.
+"""
+import gzip
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from helper.constants import CONFIG, WILD_COL, one_2_three_dict  # noqa: E402
+from merge_results_for_pair_eval import make_synthetic_tables  # noqa: E402
+
+# residue names of the synthetic structures
+_THREE_LETTER = sorted(set(one_2_three_dict.values()))
+# atoms of the synthetic residues
+_ATOMS = ["N", "CA", "C", "O", "CB"]
+
+
+def make_mutation_dataset(nof_mutations: int, seed: int = 42) -> pd.DataFrame:
+    """Generates a synthetic mutation dataset.
+
+    :param nof_mutations: Number of mutations (plus 10 percent duplicate measurements).
+    :param seed: Random seed.
+    :return: The mutation dataset (see make_synthetic_tables).
+    """
+    df_dataset, _ = make_synthetic_tables(nof_mutations, 0, seed=seed)
+    return df_dataset
+
+
+def write_result_tree(
+    root: Path, nof_queries: int, nof_hits: int, seed: int = 42
+) -> List[Path]:
+    """Writes a tree of MicroMiner result CSVs like the search runner does.
+
+    :param root: Directory to write to.
+    :param nof_queries: Number of query result dirs, each with a resultStatistic.csv.
+    :param nof_hits: Total number of hits, distributed over the queries.
+    :param seed: Random seed.
+    :return: Paths to the result CSVs.
+    """
+    _, df_mm = make_synthetic_tables(max(1, nof_hits // 10), nof_hits, seed=seed)
+    paths = []
+    bounds = np.linspace(0, df_mm.shape[0], nof_queries + 1).astype(int)
+    for i in range(nof_queries):
+        df = df_mm.iloc[bounds[i] : bounds[i + 1]]
+        path = root / f"q{i:05d}" / "resultStatistic.csv"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(path, sep="\t", index=False)
+        paths.append(path)
+    return paths
+
+
+def write_pdb_mirror(root: Path, pdbids: List[str]) -> None:
+    """Writes empty structure files in the divided layout of a PDB mirror, e.g.
+    g9/pdb1g9v.ent.gz.
+
+    :param root: Root directory of the mirror.
+    :param pdbids: PDB IDs of the structures.
+    :return: None
+    """
+    prefix = CONFIG["PDB_FILE_INFO"]["PREFIX"]
+    suffix = CONFIG["PDB_FILE_INFO"]["SUFFIX"]
+    for pdbid in set(pdbids):
+        pdbid = pdbid.lower()
+        directory = root / pdbid[1:3]
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{prefix}{pdbid}{suffix}").touch()
+
+
+def write_file_tree(root: Path, nof_dirs: int, files_per_dir: int) -> int:
+    """Writes a two level tree of empty files.
+
+    :param root: Root directory of the tree.
+    :param nof_dirs: Number of directories.
+    :param files_per_dir: Number of files per directory.
+    :return: Number of files written.
+    """
+    for i in range(nof_dirs):
+        directory = root / f"{i % 100:02d}" / f"d{i:05d}"
+        directory.mkdir(parents=True)
+        for j in range(files_per_dir):
+            (directory / f"f{j:05d}.ent.gz").touch()
+    return nof_dirs * files_per_dir
+
+
+def write_alphafold_structure(
+    path: Path, nof_residues: int, seed: int = 42, compress: bool = True
+) -> None:
+    """Writes a synthetic single chain structure with pLDDT values in the B-factor
+    column like AlphaFold DB files.
+
+    :param path: File path (.pdb or .pdb.gz).
+    :param nof_residues: Number of residues. Residue numbers wrap around after 999.
+    :param seed: Random seed.
+    :param compress: Whether to gzip the file.
+    :return: None
+    """
+    rng = np.random.default_rng(seed)
+    residues = rng.choice(_THREE_LETTER, nof_residues)
+    plddts = rng.uniform(20, 99, nof_residues)
+    coords = rng.uniform(-99, 99, (nof_residues * len(_ATOMS), 3))
+    lines = []
+    for i, (resname, plddt) in enumerate(zip(residues, plddts)):
+        for j, atom in enumerate(_ATOMS):
+            serial = i * len(_ATOMS) + j + 1
+            x, y, z = coords[serial - 1]
+            lines.append(
+                f"ATOM  {serial:5d}  {atom:<3s} {resname} A{i % 999 + 1:4d}    "
+                f"{x:8.3f}{y:8.3f}{z:8.3f}  1.00{plddt:6.2f}           {atom[0]}  \n"
+            )
+    lines.append("END\n")
+    opener = gzip.open if compress else open
+    with opener(path, "wt") as f:
+        f.writelines(lines)
+
+
+def make_tmalign_stdout(
+    nof_alignments: int, length: int = 200, seed: int = 42
+) -> Tuple[str, int]:
+    """Generates the standard out of TM-align for a number of pair-wise alignments, like
+    the output for all chain pairs of multi-chain structures (-split 2).
+
+    :param nof_alignments: Number of alignments.
+    :param length: Length of the aligned chains.
+    :param seed: Random seed.
+    :return: The standard out and the number of alignments in it.
+    """
+    rng = np.random.default_rng(seed)
+    one_letter = np.array(sorted(one_2_three_dict.keys()))
+    entries = []
+    for i in range(nof_alignments):
+        len1, len2 = rng.integers(length // 2, length, 2)
+        align_len = int(min(len1, len2))
+        seq1 = "".join(rng.choice(one_letter, align_len))
+        seq2 = "".join(rng.choice(one_letter, align_len))
+        matching = "".join(rng.choice(np.array([":", ".", " "]), align_len))
+        entries.append(
+            "\n"
+            " *********************************************************************\n"
+            " * TM-align (Version 20190822): protein structure alignment          *\n"
+            " * References: Y Zhang, J Skolnick. Nucl Acids Res 33, 2302-9 (2005) *\n"
+            " *********************************************************************\n"
+            "\n"
+            f"Name of Chain_1: /data/pdb{i // 4:05d}.pdb:{chr(65 + i % 4)}"
+            " (to be superimposed onto Chain_2)\n"
+            f"Name of Chain_2: /data/pdb{i // 4 + 1:05d}.pdb:{chr(65 + i // 2 % 4)}\n"
+            f"Length of Chain_1: {len1} residues\n"
+            f"Length of Chain_2: {len2} residues\n"
+            "\n"
+            f"Aligned length= {align_len:4d}, RMSD= {rng.uniform(0, 5):6.2f},"
+            f" Seq_ID=n_identical/n_aligned= {rng.uniform():.3f}\n"
+            f"TM-score= {rng.uniform():.5f} (if normalized by length of Chain_1,"
+            f" i.e., LN={len1}, d0=4.00)\n"
+            f"TM-score= {rng.uniform():.5f} (if normalized by length of Chain_2,"
+            f" i.e., LN={len2}, d0=4.00)\n"
+            "(You should use TM-score normalized by length of the reference structure)\n"
+            "\n"
+            '(":" denotes residue pairs of d <  5.0 Angstrom, "." denotes other aligned'
+            " residues)\n"
+            f"{seq1}\n{matching}\n{seq2}\n"
+        )
+    return "".join(entries), nof_alignments
+
+
+def mutation_pdbids(df_dataset: pd.DataFrame) -> List[str]:
+    """Get the wild-type PDB IDs of a mutation dataset.
+
+    :param df_dataset: The mutation dataset.
+    :return: List of unique PDB IDs.
+    """
+    return sorted(df_dataset[WILD_COL].astype(str).unique())
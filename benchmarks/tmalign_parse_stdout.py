@@ -0,0 +1,137 @@
+"""Benchmark of the TM-align stdout parsers against the reference implementation.
+
+Generates a large TM-align output with many pair-wise chain alignments (as with -split 2),
+parses it with the reference implementation, parse_stdout and parse_stdout_records and
+checks that all results are identical.
+
+Usage: python benchmarks/tmalign_parse_stdout.py --nof_alignments 20000
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from helper.tmalign import parse_stdout, parse_stdout_records  # noqa: E402
+from synthetic import make_tmalign_stdout  # noqa: E402
+
+
+def parse_stdout_reference(stdout_str: str, read_alignment: bool = False) -> List[Dict]:
+    """Reference implementation of parse_stdout (before the single-pass parser).
+
+    :param stdout_str: The standard out string to parse.
+    :param read_alignment: Whether to also parse the alignment.
+    :return: List of dicts. One dict for each pair-wise alignment in the output.
+    """
+    info_dicts = [{}]
+    next_line_is_alignment = False
+    align_counter = 0
+    for i, line in enumerate(stdout_str.split(os.linesep)):
+        if i == 2 and not line.startswith(" * TM-align"):
+            return []
+        if i > 2 and line.startswith(" * TM-align"):
+            # new entry
+            next_line_is_alignment = False
+            align_counter = 0
+            info_dicts.append({})
+
+        if next_line_is_alignment:
+            if align_counter == 0:
+                info_dicts[-1]["refseq"] = line.strip("\n")
+            elif align_counter == 1:
+                info_dicts[-1]["matching"] = line.strip("\n")
+            elif align_counter == 2:
+                info_dicts[-1]["targetseq"] = line.strip("\n")
+            else:
+                next_line_is_alignment = False
+            align_counter += 1
+
+        elif line.startswith("Name of Chain_1"):
+            p = Path(line.split(" ")[3])
+            info_dicts[-1]["id1"] = p.stem
+            name_split = p.name.split(":")
+            if len(name_split) > 1 and len(name_split[-1]) < 3:
+                info_dicts[-1]["chain_id1"] = name_split[-1]
+        elif line.startswith("Name of Chain_2"):
+            p = Path(line.split(" ")[3])
+            info_dicts[-1]["id2"] = p.stem
+            name_split = p.name.split(":")
+            if len(name_split) > 1 and len(name_split[-1]) < 3:
+                info_dicts[-1]["chain_id2"] = name_split[-1]
+        elif line.startswith("Length of Chain_1"):
+            info_dicts[-1]["chain1_len"] = int(line.split(" ")[3])
+        elif line.startswith("Length of Chain_2"):
+            info_dicts[-1]["chain2_len"] = int(line.split(" ")[3])
+        elif line.startswith("Aligned length="):
+            splitted = line.split("=")
+            info_dicts[-1]["align_len"] = int(splitted[1].strip().split(",")[0])
+            info_dicts[-1]["rmsd"] = float(splitted[2].strip().split(",")[0])
+            info_dicts[-1]["seqid"] = float(splitted[4].strip())
+        elif line.startswith("TM-score="):
+            tm_score = line.split(" ")[1]
+            if "Chain_1" in line:
+                info_dicts[-1]["tm_score1"] = float(tm_score)
+            else:
+                info_dicts[-1]["tm_score2"] = float(tm_score)
+        elif read_alignment and line.startswith('(":" denotes residue pairs of'):
+            next_line_is_alignment = True
+
+    return info_dicts
+
+
+def best_of(func, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - tic)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the TM-align stdout parsers with the reference."
+    )
+    parser.add_argument("--nof_alignments", default=20000, type=int)
+    parser.add_argument("--length", default=300, type=int, help="Chain length.")
+    parser.add_argument("--repeats", default=3, type=int)
+    args = parser.parse_args()
+
+    stdout, _ = make_tmalign_stdout(args.nof_alignments, length=args.length)
+    stdout_bytes = stdout.encode()
+    print(f"Output of {args.nof_alignments} alignments ({len(stdout_bytes)} bytes)")
+
+    for read_alignment in (False, True):
+        exp = parse_stdout_reference(stdout, read_alignment)
+        assert parse_stdout(stdout, read_alignment) == exp
+        records = parse_stdout_records(stdout_bytes, read_alignment)
+        assert [
+            {k: v for k, v in r._asdict().items() if v is not None} for r in records
+        ] == exp
+        # also invalid and truncated output
+        for text in ("", "\n\nfoo\n", stdout[: len(stdout) // 3]):
+            assert parse_stdout(text, read_alignment) == parse_stdout_reference(
+                text, read_alignment
+            )
+
+        t_ref = best_of(
+            lambda: parse_stdout_reference(stdout, read_alignment), args.repeats
+        )
+        t_dicts = best_of(lambda: parse_stdout(stdout, read_alignment), args.repeats)
+        t_records = best_of(
+            lambda: parse_stdout_records(stdout_bytes, read_alignment), args.repeats
+        )
+        print(
+            f"read_alignment={read_alignment}: reference {t_ref:.3f}s,"
+            f" parse_stdout {t_dicts:.3f}s ({t_ref / t_dicts:.1f}x),"
+            f" parse_stdout_records {t_records:.3f}s ({t_ref / t_records:.1f}x)"
+        )
+    print("All results identical.")
+
+
+if __name__ == "__main__":
+    main()
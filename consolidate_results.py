@@ -0,0 +1,53 @@
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+from helper.data_operations import consolidate_microminer_results
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""
+        Compact all MicroMiner result CSV files of a result directory into a single
+        Parquet dataset. Analysis scripts read the dataset instead of the CSV files.
+        Run again after adding results to the directory.
+        """
+    )
+    parser.add_argument(
+        "--mm_resultdir",
+        "-m",
+        required=True,
+        type=str,
+        nargs="+",
+        help="Path to directory of MicroMiner results. Is searched recursively"
+        " for MicroMiner result CSV files.",
+    )
+    parser.add_argument(
+        "--rows_per_file",
+        default=10_000_000,
+        type=int,
+        help="Maximum number of MicroMiner hits per Parquet file.",
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(name)-12s %(levelname)-8s %(message)s"
+    )
+    logger.info(f'Starting scripts: {" ".join(sys.argv)}')
+
+    for mm_resultdir in [Path(p) for p in args.mm_resultdir]:
+        if not mm_resultdir.is_dir():
+            print(
+                f"Error: Specified MicroMiner result directory does not exist or is not"
+                f" a directory: {mm_resultdir}"
+            )
+            sys.exit(1)
+        consolidate_microminer_results(mm_resultdir, rows_per_file=args.rows_per_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,21 @@ from pathlib import Path
 from typing import List
 
 import helper
-from helper.data_operations import read_microminer_csv, merge_results_for_pair_eval
+from helper.data_operations import (
+    find_microminer_results,
+    read_microminer_csv,
+    merge_results_for_pair_eval,
+)
 
 logger = logging.getLogger(__name__)
 
 
 def run_mutation_checking(
-    csv_input: List[Path], dataset_names: List[str], outdir: Path, backward: bool
+    csv_input: List[Path],
+    dataset_names: List[str],
+    outdir: Path,
+    backward: bool,
+    cpus: int = 1,
 ) -> None:
     """Checks if known mutations are in MicroMiner output.
 
@@ -26,14 +34,12 @@ def run_mutation_checking(
     :param outdir: Directory to write results.
     :param backward: Whether to consider wild-type in the mutation data sets as the query
                      or hit in the MicroMiner results.
+    :param cpus: Number of processes to use for reading MicroMiner results.
     :return: None
     """
     # gather all 'resultStatistic.csv' in the csv_input list (including recursive read of dirs)
-    files = []
-    for path in csv_input:
-        files.extend(
-            [p for p in helper.utils.scantree(path) if p.name == "resultStatistic.csv"]
-        )
+    # or consolidated results of dirs
+    files = find_microminer_results(csv_input)
     if len(files) == 0:
         print(
             "Error: No resultStatistic.csv in input (and not in subdirs of any input dir)."
@@ -41,7 +47,7 @@ def run_mutation_checking(
         sys.exit(1)
     logger.info(f"Gathered {len(files)} input resultStatistic.csv files.")
 
-    df_res = read_microminer_csv(files)
+    df_res = read_microminer_csv(files, cpus=cpus)
 
     if df_res.shape[0] == 0:
         print("Error: resultStatistic.csv input files are empty.")
@@ -128,12 +134,20 @@ def main():
         help="Invert wild-type and mutant",
     )
 
+    parser.add_argument(
+        "--cpus",
+        default=1,
+        type=int,
+        help="Number of processes to use for reading MicroMiner results",
+    )
+
     args = parser.parse_args()
 
     csv_input = args.csv
     dataset_names = args.dataset
     outdir = Path(args.outdir)
     backward = args.backward
+    cpus = args.cpus
 
     if not outdir.is_dir():
         print("Error: Specified output directory does not exist or is not a directory.")
@@ -147,7 +161,7 @@ def main():
     logger.info(f'Starting scripts: {" ".join(sys.argv)}')
 
     csv_input = [Path(_) for _ in csv_input]
-    run_mutation_checking(csv_input, dataset_names, outdir, backward)
+    run_mutation_checking(csv_input, dataset_names, outdir, backward, cpus)
 
 
 if __name__ == "__main__":
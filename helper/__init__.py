@@ -1,6 +1,11 @@
 """
 The :mod:`helper` module contains functionality for running MicroMiner on data sets.
+
+Submodules are imported on first access, so that scripts only pay for the submodules
+(and pandas) they use. E.g. the runner scripts on HPC nodes import helper.runners only.
 """
+import importlib
+
 from . import constants
 from .constants import (
     CONFIG,
@@ -15,17 +20,13 @@ from .constants import (
     MUTANT_CHAIN,
 )
 
-from . import datasets
-from . import hpc
-
-from . import utils
-from . import mutation_filtering
-from .datasets import get_dataset_collection
-
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).parent
 
+# submodules imported on first access
+_SUBMODULES = {"datasets", "hpc", "utils", "mutation_filtering"}
+
 __all__ = [
     "utils",
     "mutation_filtering",
@@ -42,3 +43,16 @@ __all__ = [
     "constants",
     "hpc",
 ]
+
+
+def __getattr__(name: str):
+    """Import submodules on first access (PEP 562).
+
+    :param name: Name of the attribute.
+    :return: The submodule or get_dataset_collection.
+    """
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if name == "get_dataset_collection":
+        return importlib.import_module(".datasets", __name__).get_dataset_collection
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
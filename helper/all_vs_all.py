@@ -0,0 +1,335 @@
+"""All-vs-all structural similarity of a set of structures with TM-align.
+
+The TM-scores of all pairs are stored in an n x n float32 matrix on disc that is read
+memory-mapped. Entry (i, j) is the TM-score of structures i and j normalized by the length
+of structure i. Every unordered pair is aligned once and its alignment fills both entries.
+Pairs whose length ratio rules out a TM-score of at least min_tm_score are not aligned.
+Their entries, and those of failed alignments, are NaN.
+
+The rows of the matrix are split into blocks with about equal numbers of pairs (a pair
+i < j belongs to the block of row i). Blocks are the input rows of the TMAlignAllVsAll
+runner (see runners), which writes the scores of every finished block to a block file
+and records it in the completion journal. An interrupted computation resumes with the
+unfinished blocks and blocks can be distributed with distribute_csv. fill_matrix writes
+the scores of all finished blocks to the matrix.
+
+Layout of the output directory:
+
+- index.tsv: row of the matrix, id, structure path and length of every structure
+- blocks.tsv: the blocks (input of TMAlignAllVsAll)
+- results/: block files and completion journals
+- tm_score.f32: the matrix (see read_matrix)
+"""
+import logging
+import multiprocessing
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .plddt import parse_ca_residues
+
+logger = logging.getLogger(__name__)
+
+INDEX_TSV = "index.tsv"
+BLOCKS_TSV = "blocks.tsv"
+RESULTS_DIR = "results"
+MATRIX_FILE = "tm_score.f32"
+BLOCK_PREFIX = "block_"
+BLOCK_SUFFIX = ".npz"
+
+MANDATORY_TSV_COLUMNS = ["id", "structure_path"]
+INDEX_COLUMNS = ["row", "id", "structure_path", "length"]
+BLOCK_COLUMNS = ["block", "first_row", "last_row", "nof_pairs", "min_tm_score"]
+
+
+def structure_length(structure_path: Path) -> int:
+    """Get the number of residues TM-align aligns of a structure, i.e. the residues with
+    CA atom of the first chain.
+
+    Like TM-align, residues are identified by residue number and insertion code and only
+    the CA atoms without or with the first alternate location of a residue are read.
+
+    :param structure_path: Path to a PDB file (.pdb or .pdb.gz, .ent or .ent.gz).
+    :return: The number of residues. 0 if the file is not readable.
+    """
+    try:
+        records = parse_ca_residues(structure_path)
+    except (OSError, EOFError, zlib.error) as e:
+        logger.warning(f"Could not read {structure_path}: {e}")
+        return 0
+    if len(records) == 0:
+        return 0
+    chain = records[0][1]
+    length = 0
+    last_residue = None
+    first_alt_loc = {}
+    for alt_loc, record_chain, res_seq, i_code in records:
+        if record_chain != chain:
+            continue
+        residue = (res_seq, i_code)
+        if alt_loc != b" ":
+            if first_alt_loc.setdefault(residue, alt_loc) != alt_loc:
+                continue
+        if residue != last_residue:
+            length += 1
+            last_residue = residue
+    return length
+
+
+def length_ratio_mask(length: int, lengths: np.ndarray, min_tm_score: float):
+    """Find the structures that can reach a TM-score of at least min_tm_score with a
+    structure.
+
+    The TM-score normalized by the longer structure is at most the ratio of the shorter
+    to the longer length, because at most the residues of the shorter structure can be
+    aligned. Structures without residues never qualify.
+
+    :param length: Length of the structure.
+    :param lengths: Lengths of the other structures.
+    :param min_tm_score: Minimal TM-score (normalized by the longer structure).
+    :return: Boolean array, True for the structures that need to be aligned.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.minimum(length, lengths) / np.maximum(length, lengths)
+    return (ratio >= min_tm_score) & (lengths > 0) & (length > 0)
+
+
+def block_pairs(
+    lengths: np.ndarray, first_row: int, last_row: int, min_tm_score: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the pairs of a block that need to be aligned.
+
+    :param lengths: Lengths of all structures (see index.tsv).
+    :param first_row: First row of the block.
+    :param last_row: Row after the last row of the block.
+    :param min_tm_score: Minimal TM-score (see length_ratio_mask).
+    :return: Rows i and j (i < j) of the pairs.
+    """
+    rows_i = []
+    rows_j = []
+    for i in range(first_row, last_row):
+        j = np.flatnonzero(
+            length_ratio_mask(lengths[i], lengths[i + 1 :], min_tm_score)
+        )
+        rows_i.append(np.full(j.shape[0], i, dtype=np.int32))
+        rows_j.append((j + i + 1).astype(np.int32))
+    if len(rows_i) == 0:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    return np.concatenate(rows_i), np.concatenate(rows_j)
+
+
+def split_blocks(
+    nof_pairs: np.ndarray, pairs_per_block: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Split consecutive rows into blocks with about equal numbers of pairs.
+
+    :param nof_pairs: Number of pairs of every row.
+    :param pairs_per_block: Number of pairs of a block. Rows with more pairs get a block
+                            of their own.
+    :return: First row and row after the last row of every block.
+    """
+    bounds = [0]
+    block_pairs_sum = 0
+    for row, n in enumerate(nof_pairs):
+        if block_pairs_sum > 0 and block_pairs_sum + n > pairs_per_block:
+            bounds.append(row)
+            block_pairs_sum = 0
+        block_pairs_sum += n
+    bounds.append(len(nof_pairs))
+    bounds = np.array(bounds)
+    return bounds[:-1], bounds[1:]
+
+
+def prepare(
+    df: pd.DataFrame,
+    outdir: Path,
+    min_tm_score: float = 0.0,
+    pairs_per_block: int = 100_000,
+    cpus: int = 1,
+) -> Path:
+    """Write the index of the structures and the blocks of an all-vs-all comparison.
+
+    The lengths of the structures are taken from an existing index with the same
+    structures.
+
+    :param df: Table of the structures with the columns id and structure_path, e.g. the
+               output of make_search_parameter_table.
+    :param outdir: Output directory of the comparison.
+    :param min_tm_score: Pairs that cannot reach this TM-score (normalized by the longer
+                         structure) according to their lengths are not aligned.
+    :param pairs_per_block: Number of pairs of a block, the unit of resumption.
+    :param cpus: Number of processes for reading the structure lengths.
+    :return: Path to the blocks TSV.
+    """
+    if not all(c in df.columns for c in MANDATORY_TSV_COLUMNS):
+        raise ValueError("Missing mandatory fields in structure table")
+    if not 0.0 <= min_tm_score <= 1.0:
+        raise ValueError(f"Invalid minimal TM-score: {min_tm_score}")
+    df_index = (
+        df[MANDATORY_TSV_COLUMNS]
+        .astype(str)
+        .drop_duplicates(subset="id")
+        .reset_index(drop=True)
+    )
+    df_index.insert(0, "row", df_index.index)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    index_path = outdir / INDEX_TSV
+    if index_path.is_file():
+        df_old = read_index(outdir)
+        if (
+            df_old[MANDATORY_TSV_COLUMNS]
+            .astype(str)
+            .equals(df_index[MANDATORY_TSV_COLUMNS])
+        ):
+            df_index["length"] = df_old["length"]
+    if "length" not in df_index.columns:
+        logger.info(f"Reading the lengths of {df_index.shape[0]} structures")
+        paths = [Path(p) for p in df_index["structure_path"]]
+        if cpus > 1:
+            with multiprocessing.Pool(cpus) as pool:
+                lengths = pool.map(structure_length, paths)
+        else:
+            lengths = [structure_length(p) for p in paths]
+        df_index["length"] = lengths
+        nof_empty = int((df_index["length"] == 0).sum())
+        if nof_empty > 0:
+            logger.warning(f"{nof_empty} structures without residues are not aligned")
+        df_index[INDEX_COLUMNS].to_csv(index_path, sep="\t", index=False)
+
+    lengths = df_index["length"].to_numpy()
+    nof_pairs = np.array(
+        [
+            np.count_nonzero(
+                length_ratio_mask(lengths[i], lengths[i + 1 :], min_tm_score)
+            )
+            for i in range(lengths.shape[0])
+        ],
+        dtype=np.int64,
+    )
+    first_rows, last_rows = split_blocks(nof_pairs, pairs_per_block)
+    cum_pairs = np.concatenate([[0], np.cumsum(nof_pairs)])
+    df_blocks = pd.DataFrame(
+        {
+            "block": np.arange(first_rows.shape[0]),
+            "first_row": first_rows,
+            "last_row": last_rows,
+            "nof_pairs": cum_pairs[last_rows] - cum_pairs[first_rows],
+            "min_tm_score": min_tm_score,
+        }
+    )
+    blocks_path = outdir / BLOCKS_TSV
+    df_blocks[BLOCK_COLUMNS].to_csv(blocks_path, sep="\t", index=False)
+    nof_all = lengths.shape[0] * (lengths.shape[0] - 1) // 2
+    logger.info(
+        f"Aligning {cum_pairs[-1]} of {nof_all} pairs of {lengths.shape[0]} structures"
+        f" in {df_blocks.shape[0]} blocks"
+    )
+    return blocks_path
+
+
+def read_index(outdir: Path) -> pd.DataFrame:
+    """Read the index of the structures of an all-vs-all comparison.
+
+    :param outdir: Output directory of the comparison.
+    :return: Table with the row in the matrix, id, structure path and length of every
+             structure.
+    """
+    index_path = outdir / INDEX_TSV
+    if not index_path.is_file():
+        raise FileNotFoundError(f"No all-vs-all index: {index_path}")
+    return pd.read_csv(index_path, sep="\t", dtype={"id": str, "structure_path": str})
+
+
+def block_file(results_dir: Path, block: int) -> Path:
+    """Get the path of the file with the scores of a block.
+
+    :param results_dir: Result directory of the comparison.
+    :param block: Number of the block.
+    :return: Path to the block file.
+    """
+    return results_dir / f"{BLOCK_PREFIX}{block:05d}{BLOCK_SUFFIX}"
+
+
+def write_block(path: Path, meta: Dict, scores: Dict[str, np.ndarray]) -> None:
+    """Write the scores of a block. The file appears only when completely written.
+
+    :param path: Path to the block file.
+    :param meta: Dict with the first_row, last_row and min_tm_score of the block and
+                 the index_digest of the index it was computed for.
+    :param scores: Dict with the rows i and j of the pairs and their tm_score1 and
+                   tm_score2.
+    :return: None
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.parent / f".{path.name}"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            i=scores["i"].astype(np.int32),
+            j=scores["j"].astype(np.int32),
+            tm_score1=scores["tm_score1"].astype(np.float32),
+            tm_score2=scores["tm_score2"].astype(np.float32),
+            **{k: np.array(v) for k, v in meta.items()},
+        )
+    os.replace(tmp_path, path)
+
+
+def fill_matrix(outdir: Path, index_digest: str) -> int:
+    """Write the scores of all finished blocks to the matrix.
+
+    The matrix is rebuilt from the block files, so that it always matches the current
+    blocks. Block files of other indices or block bounds are ignored.
+
+    :param outdir: Output directory of the comparison.
+    :param index_digest: Digest of the index (see cache.file_digest).
+    :return: Number of blocks written to the matrix.
+    """
+    n = read_index(outdir).shape[0]
+    df_blocks = pd.read_csv(outdir / BLOCKS_TSV, sep="\t")
+    matrix = np.memmap(outdir / MATRIX_FILE, dtype=np.float32, mode="w+", shape=(n, n))
+    matrix[:] = np.nan
+    np.fill_diagonal(matrix, 1.0)
+    nof_blocks = 0
+    for row in df_blocks.itertuples(index=False):
+        path = block_file(outdir / RESULTS_DIR, row.block)
+        if not path.is_file():
+            continue
+        with np.load(path) as block:
+            if (
+                str(block["index_digest"]) != index_digest
+                or int(block["first_row"]) != row.first_row
+                or int(block["last_row"]) != row.last_row
+                or float(block["min_tm_score"]) != row.min_tm_score
+            ):
+                logger.warning(f"Ignoring block file of other parameters: {path}")
+                continue
+            matrix[block["i"], block["j"]] = block["tm_score1"]
+            matrix[block["j"], block["i"]] = block["tm_score2"]
+        nof_blocks += 1
+    matrix.flush()
+    logger.info(f"Wrote {nof_blocks} of {df_blocks.shape[0]} blocks to the matrix")
+    return nof_blocks
+
+
+def read_matrix(outdir: Path) -> Tuple[np.memmap, pd.DataFrame]:
+    """Read the TM-score matrix of an all-vs-all comparison memory-mapped.
+
+    :param outdir: Output directory of the comparison.
+    :return: The matrix, entry (i, j) is the TM-score normalized by the length of
+             structure i (NaN if not aligned), and the index of the structures (see
+             read_index) whose rows are the rows of the matrix.
+    """
+    df_index = read_index(outdir)
+    n = df_index.shape[0]
+    matrix_path = outdir / MATRIX_FILE
+    if not matrix_path.is_file():
+        raise FileNotFoundError(f"No all-vs-all matrix: {matrix_path}")
+    return (
+        np.memmap(matrix_path, dtype=np.float32, mode="r", shape=(n, n)),
+        df_index,
+    )
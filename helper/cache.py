@@ -0,0 +1,214 @@
+"""Content-addressed cache of tool results on the local disc."""
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from .constants import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=4096)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    """Hashes the content of a file. Memoized by path, size and modification time.
+
+    :param path: Path to the file.
+    :param size: Size of the file (only used as memoization key).
+    :param mtime_ns: Modification time of the file (only used as memoization key).
+    :return: Hex digest of the file content.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    """Hashes the content of a file.
+
+    :param path: Path to the file.
+    :return: Hex digest of the file content.
+    """
+    st = path.stat()
+    return _file_digest(str(path.resolve()), st.st_size, st.st_mtime_ns)
+
+
+def file_identity(path: Path) -> List:
+    """Identifies a (large) file by path, size and modification time without reading it.
+
+    :param path: Path to the file.
+    :return: List of the resolved path, size and modification time.
+    """
+    try:
+        st = path.stat()
+    except OSError:
+        return [str(path)]
+    return [str(path.resolve()), st.st_size, st.st_mtime_ns]
+
+
+class ResultCache:
+    """Cache of result directories and standard out of command line calls.
+
+    Entries are addressed by a key derived from everything that determines a result (see
+    key()). Each entry is a directory with a copy of the result directory, the standard
+    out and standard error of the call. Entries are written atomically, so that several
+    processes can share a cache. If the cache grows beyond its maximum size, the least
+    recently used entries are evicted.
+    """
+
+    RESULT_DIR = "result"
+    STDOUT_FILE = "stdout.txt"
+    STDERR_FILE = "stderr.txt"
+    META_FILE = "meta.json"
+
+    def __init__(self, directory: Path, max_size: int):
+        """Create a new cache.
+
+        :param directory: Directory of the cache.
+        :param max_size: Maximum size of the cache in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(**params) -> str:
+        """Derives a cache key from the parameters that determine a result.
+
+        :param params: JSON serializable parameters.
+        :return: The cache key.
+        """
+        return hashlib.sha256(
+            json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str, outdir: Path) -> Optional[dict]:
+        """Look up a result. On a hit, the cached result files are copied into outdir.
+
+        :param key: The cache key.
+        :param outdir: Result dir to copy the cached result files to.
+        :return: Dict with the standard out and standard error of the cached call or None
+                 if the result is not cached.
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            shutil.copytree(
+                entry_dir / ResultCache.RESULT_DIR, outdir, dirs_exist_ok=True
+            )
+            response = {
+                "stdout": (entry_dir / ResultCache.STDOUT_FILE).read_bytes(),
+                "stderr": (entry_dir / ResultCache.STDERR_FILE).read_bytes(),
+            }
+            # mark as recently used
+            os.utime(entry_dir)
+        except OSError:
+            # not cached or evicted meanwhile
+            self.misses += 1
+            return None
+        self.hits += 1
+        return response
+
+    def put(self, key: str, outdir: Path, stdout: bytes, stderr: bytes) -> None:
+        """Store a result.
+
+        :param key: The cache key.
+        :param outdir: Result dir with the result files to store.
+        :param stdout: Standard out of the call.
+        :param stderr: Standard error of the call.
+        :return: None
+        """
+        entry_dir = self._entry_dir(key)
+        if entry_dir.is_dir():
+            return
+        entry_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp_", dir=entry_dir.parent))
+        try:
+            shutil.copytree(outdir, tmp_dir / ResultCache.RESULT_DIR)
+            (tmp_dir / ResultCache.STDOUT_FILE).write_bytes(stdout)
+            (tmp_dir / ResultCache.STDERR_FILE).write_bytes(stderr)
+            size = sum(p.stat().st_size for p in tmp_dir.rglob("*") if p.is_file())
+            with open(tmp_dir / ResultCache.META_FILE, "w") as f:
+                json.dump({"size": size}, f)
+            tmp_dir.rename(entry_dir)
+        except OSError as e:
+            # most likely stored by another process meanwhile
+            logger.debug(f"Could not store cache entry {key}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _entries(self) -> List:
+        """List all cache entries.
+
+        :return: List of (last use time, size, entry dir) tuples.
+        """
+        entries = []
+        if not self.directory.is_dir():
+            return entries
+        for prefix_dir in os.scandir(self.directory):
+            if not prefix_dir.is_dir():
+                continue
+            for entry in os.scandir(prefix_dir.path):
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    with open(Path(entry.path) / ResultCache.META_FILE) as f:
+                        size = json.load(f)["size"]
+                    entries.append((entry.stat().st_mtime, size, Path(entry.path)))
+                except (OSError, ValueError, KeyError):
+                    continue
+        return entries
+
+    def size(self) -> int:
+        """Get the size of all cache entries.
+
+        :return: The size in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits its maximum size.
+
+        :return: Number of removed entries.
+        """
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+        nof_removed = 0
+        for _, size, entry_dir in entries:
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+            nof_removed += 1
+        if nof_removed > 0:
+            logger.info(f"Evicted {nof_removed} entries from result cache")
+        return nof_removed
+
+
+@functools.lru_cache(maxsize=None)
+def _result_cache(directory: str, max_size: int) -> ResultCache:
+    return ResultCache(Path(directory), max_size)
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Get the result cache configured in the CACHE section of the config.
+
+    The same cache object is returned for the same configuration, so that its hit and
+    miss counters accumulate within a process.
+
+    :return: The result cache or None if caching is disabled.
+    """
+    directory = CONFIG["CACHE"]["RESULT_CACHE_DIR"].strip()
+    if directory == "":
+        return None
+    max_size = int(float(CONFIG["CACHE"]["RESULT_CACHE_MAX_SIZE_GB"]) * 1024**3)
+    return _result_cache(directory, max_size)
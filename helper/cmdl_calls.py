@@ -1,13 +1,21 @@
+import functools
 import logging
+import os
 import subprocess
+import tempfile
+import time
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 
-from . import utils
+from . import telemetry, utils
+from .cache import ResultCache, file_digest, file_identity, get_result_cache
 from .constants import CONFIG
 
 logger = logging.getLogger(__name__)
 
+# MicroMiner search option to read many queries from a file in a single invocation.
+MICROMINER_QUERY_LIST_FLAG = "--query_list"
+
 
 def exe_cmdl_call(cmd_call: List[str], log_msg: str, raise_error: bool) -> dict:
     """Execute a command line call.
@@ -15,13 +23,25 @@ def exe_cmdl_call(cmd_call: List[str], log_msg: str, raise_error: bool) -> dict:
     :param cmd_call: The command line call as list.
     :param log_msg: A message to log.
     :param raise_error: Whether to raise an error when the cmdl call returns != 0.
-    :return: Dict containing the exit_code, standard out and standard error of the call.
+    :return: Dict containing the exit_code, standard out and standard error of the call
+             and the resource usage of the called process (wall time and CPU time in
+             seconds, peak resident memory in MB).
     """
     logger.info(f'Calling {" ".join(cmd_call)}')
-    process = subprocess.Popen(cmd_call, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    with utils.timer(f"{log_msg} | " + " ".join(cmd_call)):
-        stdout, stderr = process.communicate()
-        exit_code = process.wait()
+    # standard error goes to a file, so that standard out can be read to the end before
+    # waiting for the process and its resource usage, without risking a full pipe
+    with tempfile.TemporaryFile() as stderr_file:
+        tic = time.time()
+        process = subprocess.Popen(cmd_call, stdout=subprocess.PIPE, stderr=stderr_file)
+        with utils.timer(f"{log_msg} | " + " ".join(cmd_call)):
+            stdout = process.stdout.read()
+            process.stdout.close()
+            _, status, rusage = os.wait4(process.pid, 0)
+        exit_code = os.waitstatus_to_exitcode(status)
+        process.returncode = exit_code
+        wall_time = time.time() - tic
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
     if exit_code != 0:
         msg = (
             f'Failed call {" ".join(cmd_call)}\nstdout={stdout.decode()}\n'
@@ -30,39 +50,80 @@ def exe_cmdl_call(cmd_call: List[str], log_msg: str, raise_error: bool) -> dict:
         logging.error(msg)
         if raise_error:
             raise ValueError(msg)
-    return {"exit_code": exit_code, "stdout": stdout, "stderr": stderr}
+    return {
+        "exit_code": exit_code,
+        "stdout": stdout,
+        "stderr": stderr,
+        "usage": {
+            "wall_time": wall_time,
+            "cpu_time": rusage.ru_utime + rusage.ru_stime,
+            # kilobytes on Linux
+            "max_rss_mb": rusage.ru_maxrss / 1024,
+        },
+    }
 
 
-def call_microminer_search(
-    pdb_query_path: Path,
-    outdir: Path,
-    mode: str = "single_mutation",
-    mm_repr: str = "monomer",
-    raise_error: bool = True,
-) -> dict:
-    """Calls the MicroMiner executable in search mode.
+def _record_call(tool: str, exe: Path, response: dict, **fields) -> None:
+    """Records a telemetry event of a tool invocation.
+
+    :param tool: Name of the tool.
+    :param exe: The executable.
+    :param response: Response of exe_cmdl_call.
+    :param fields: Further fields of the event.
+    :return: None
+    """
+    if telemetry.telemetry_dir() is None:
+        return
+    try:
+        exe_version = file_digest(exe)[:12]
+    except OSError:
+        exe_version = None
+    telemetry.record(
+        tool,
+        exe_version=exe_version,
+        exit_code=response["exit_code"],
+        **response["usage"],
+        **fields,
+    )
+
+
+def _microminer_algo_hash() -> str:
+    """Hashes the MicroMiner algorithm settings of the config for telemetry events.
+
+    :return: Short hash of the settings.
+    """
+    return ResultCache.key(**dict(CONFIG["MICROMINER_ALGO"]))[:12]
+
+
+def _microminer_phases(stdout: bytes) -> dict:
+    """Parses the per-phase timings and counts of a MicroMiner search for telemetry.
+
+    Batched searches report phases per query. Their sum is returned.
+
+    :param stdout: Standard out of the search.
+    :return: Dict of the numeric fields of parse_microminer_search_stdout.
+    """
+    phases = {}
+    stdout = stdout.decode("utf-8")
+    sections = list(utils.split_microminer_batch_stdout(stdout).values()) or [stdout]
+    for section in sections:
+        for k, v in utils.parse_microminer_search_stdout(section).items():
+            if isinstance(v, (int, float)):
+                phases[k] = phases.get(k, 0) + v
+    return phases
+
+
+def _microminer_search_options(mode: str, mm_repr: str) -> List[str]:
+    """Command line options of a MicroMiner search except for query and output.
 
-    :param pdb_query_path: Path to query PDB file
-    :param outdir: Result dir path.
     :param mode: Search mode.
     :param mm_repr: Structure representation mode.
-    :param raise_error: Whether to raise exception if command line call return != 0
-    :return: Dict with details on the tool execution.
+    :return: List of command line options.
     """
-    outdir.mkdir(parents=True, exist_ok=True)
-
-    exe = Path(CONFIG["EXECUTABLES"]["MICROMINER"])
     sitesearchdb = Path(CONFIG["DATABASES"]["SITE_SEARCH_DB"])
-
-    cmd_call = [
-        str(exe.resolve()),
-        "search",
-        "-q",
-        str(pdb_query_path.resolve()),
+    return [
         "-s",
         str(sitesearchdb.resolve()),
-        "-o",
-        str(outdir.resolve()),
         # '-d',  #write ensembles to disc
         "--cpus",
         str(CONFIG["MICROMINER_ALGO"]["CPUS"]),
@@ -86,8 +147,223 @@ def call_microminer_search(
         mm_repr,
     ]
 
+
+def _microminer_cache_key(structure_paths: List[Path], **params) -> str:
+    """Derives the result cache key of a MicroMiner call.
+
+    The key combines the content and file names of the structure files (MicroMiner
+    derives structure names in its results from file names), the MicroMiner algorithm
+    settings, the identity of the executable and further call specific parameters.
+
+    :param structure_paths: Input structure files of the call.
+    :param params: Further call specific parameters (e.g. mode and representation).
+    :return: The cache key.
+    """
+    return ResultCache.key(
+        structures=[(p.name, file_digest(p)) for p in structure_paths],
+        algo=dict(CONFIG["MICROMINER_ALGO"]),
+        exe=file_identity(Path(CONFIG["EXECUTABLES"]["MICROMINER"])),
+        **params,
+    )
+
+
+def _microminer_search_cache_key(
+    pdb_query_path: Path, mode: str, mm_repr: str
+) -> Optional[str]:
+    """Derives the result cache key of a MicroMiner search.
+
+    :param pdb_query_path: Path to query PDB file.
+    :param mode: Search mode.
+    :param mm_repr: Structure representation mode.
+    :return: The cache key or None if the result cache is disabled or the query is not
+             readable.
+    """
+    if get_result_cache() is None or not pdb_query_path.is_file():
+        return None
+    return _microminer_cache_key(
+        [pdb_query_path],
+        mode=mode,
+        repr=mm_repr,
+        index=file_identity(Path(CONFIG["DATABASES"]["SITE_SEARCH_DB"])),
+    )
+
+
+def get_cached_microminer_search(
+    pdb_query_path: Path, outdir: Path, mode: str, mm_repr: str
+) -> Optional[dict]:
+    """Serves a MicroMiner search from the result cache.
+
+    On a hit, the cached result files are copied to outdir.
+
+    :param pdb_query_path: Path to query PDB file.
+    :param outdir: Result dir path.
+    :param mode: Search mode.
+    :param mm_repr: Structure representation mode.
+    :return: Dict with details on the cached tool execution or None on a cache miss.
+    """
+    key = _microminer_search_cache_key(pdb_query_path, mode, mm_repr)
+    if key is None:
+        return None
+    response = get_result_cache().get(key, outdir)
+    if response is not None:
+        logger.info(f"Serving MicroMiner search of {pdb_query_path} from result cache")
+        response.update({"exit_code": 0, "params": "", "cache_hit": True})
+    return response
+
+
+def cache_microminer_search(
+    pdb_query_path: Path,
+    outdir: Path,
+    mode: str,
+    mm_repr: str,
+    stdout: bytes,
+    stderr: bytes,
+) -> None:
+    """Stores the result of a successful MicroMiner search in the result cache.
+
+    :param pdb_query_path: Path to query PDB file.
+    :param outdir: Result dir path.
+    :param mode: Search mode.
+    :param mm_repr: Structure representation mode.
+    :param stdout: Standard out of the search.
+    :param stderr: Standard error of the search.
+    :return: None
+    """
+    key = _microminer_search_cache_key(pdb_query_path, mode, mm_repr)
+    if key is not None:
+        get_result_cache().put(key, outdir, stdout, stderr)
+
+
+def call_microminer_search(
+    pdb_query_path: Path,
+    outdir: Path,
+    mode: str = "single_mutation",
+    mm_repr: str = "monomer",
+    raise_error: bool = True,
+) -> dict:
+    """Calls the MicroMiner executable in search mode.
+
+    :param pdb_query_path: Path to query PDB file
+    :param outdir: Result dir path.
+    :param mode: Search mode.
+    :param mm_repr: Structure representation mode.
+    :param raise_error: Whether to raise exception if command line call return != 0
+    :return: Dict with details on the tool execution.
+    """
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    response = get_cached_microminer_search(pdb_query_path, outdir, mode, mm_repr)
+    if response is not None:
+        return response
+
+    exe = Path(CONFIG["EXECUTABLES"]["MICROMINER"])
+
+    cmd_call = [
+        str(exe.resolve()),
+        "search",
+        "-q",
+        str(pdb_query_path.resolve()),
+        "-o",
+        str(outdir.resolve()),
+    ] + _microminer_search_options(mode, mm_repr)
+
     response = exe_cmdl_call(cmd_call, "MicroMiner Search", raise_error)
     response["params"] = " ".join(cmd_call)
+    response["cache_hit"] = False
+    _record_call(
+        "microminer_search",
+        exe,
+        response,
+        mode=mode,
+        repr=mm_repr,
+        algo_hash=_microminer_algo_hash(),
+        query=pdb_query_path.name,
+        nof_queries=1,
+        **_microminer_phases(response["stdout"]),
+    )
+    if response["exit_code"] == 0:
+        cache_microminer_search(
+            pdb_query_path,
+            outdir,
+            mode,
+            mm_repr,
+            response["stdout"],
+            response["stderr"],
+        )
+    return response
+
+
+@functools.lru_cache(maxsize=None)
+def microminer_supports_batch(exe: str) -> bool:
+    """Checks whether a MicroMiner executable can search many queries in one invocation.
+
+    The check looks for the query list option in the help message of the search mode.
+
+    :param exe: Path to the MicroMiner executable.
+    :return: True if the executable supports batched searches, false otherwise.
+    """
+    try:
+        res = subprocess.run(
+            [exe, "search", "--help"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            timeout=60,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not determine batch support of {exe}: {e}")
+        return False
+    return MICROMINER_QUERY_LIST_FLAG.encode() in res.stdout
+
+
+def call_microminer_search_batch(
+    queries: List[Tuple[Path, Path]],
+    query_list_path: Path,
+    mode: str = "single_mutation",
+    mm_repr: str = "monomer",
+    raise_error: bool = True,
+) -> dict:
+    """Calls the MicroMiner executable in search mode for many queries at once.
+
+    The k-mer index is read only once for all queries. The queries are passed in a query
+    list file with one query per line: the query structure path and its result dir separated
+    by a tab. The standard out contains one "Working on <query>" section per query.
+
+    The result cache is not consulted. Use get_cached_microminer_search and
+    cache_microminer_search for the individual queries.
+
+    :param queries: List of (query structure path, result dir path) tuples.
+    :param query_list_path: Path for writing the query list file.
+    :param mode: Search mode.
+    :param mm_repr: Structure representation mode.
+    :param raise_error: Whether to raise exception if command line call return != 0
+    :return: Dict with details on the tool execution.
+    """
+    with open(query_list_path, "w") as f:
+        for pdb_query_path, outdir in queries:
+            outdir.mkdir(parents=True, exist_ok=True)
+            f.write(f"{pdb_query_path.resolve()}\t{outdir.resolve()}\n")
+
+    exe = Path(CONFIG["EXECUTABLES"]["MICROMINER"])
+
+    cmd_call = [
+        str(exe.resolve()),
+        "search",
+        MICROMINER_QUERY_LIST_FLAG,
+        str(query_list_path.resolve()),
+    ] + _microminer_search_options(mode, mm_repr)
+
+    response = exe_cmdl_call(cmd_call, "MicroMiner Search (batch)", raise_error)
+    response["params"] = " ".join(cmd_call)
+    _record_call(
+        "microminer_search_batch",
+        exe,
+        response,
+        mode=mode,
+        repr=mm_repr,
+        algo_hash=_microminer_algo_hash(),
+        nof_queries=len(queries),
+        **_microminer_phases(response["stdout"]),
+    )
     return response
 
 
@@ -104,6 +380,24 @@ def call_microminer_pair(
     """
     outdir.mkdir(parents=True, exist_ok=True)
 
+    key = None
+    if (
+        get_result_cache() is not None
+        and pdb_query_path.is_file()
+        and pdb_target_path.is_file()
+    ):
+        key = _microminer_cache_key(
+            [pdb_query_path, pdb_target_path], mode="site_align"
+        )
+        response = get_result_cache().get(key, outdir)
+        if response is not None:
+            logger.info(
+                f"Serving MicroMiner site_align of {pdb_query_path} and"
+                f" {pdb_target_path} from result cache"
+            )
+            response.update({"exit_code": 0, "cache_hit": True})
+            return response
+
     exe = Path(CONFIG["EXECUTABLES"]["MICROMINER"])
 
     cmd_call = [
@@ -126,7 +420,19 @@ def call_microminer_pair(
         "--flexibility_sensitivity",
         str(CONFIG["MICROMINER_ALGO"]["FLEXIBILITY_SENSITIVITY"]),
     ]
-    return exe_cmdl_call(cmd_call, "MicroMiner site_align", raise_error)
+    response = exe_cmdl_call(cmd_call, "MicroMiner site_align", raise_error)
+    response["cache_hit"] = False
+    _record_call(
+        "microminer_pair",
+        exe,
+        response,
+        algo_hash=_microminer_algo_hash(),
+        query=pdb_query_path.name,
+        target=pdb_target_path.name,
+    )
+    if key is not None and response["exit_code"] == 0:
+        get_result_cache().put(key, outdir, response["stdout"], response["stderr"])
+    return response
 
 
 def call_tmalign(
@@ -178,4 +484,12 @@ def call_tmalign(
     if ter_flag is not None:
         cmd_call.extend(["-ter", str(ter_flag)])
 
-    return exe_cmdl_call(cmd_call, "TMAlign", raise_error)
+    response = exe_cmdl_call(cmd_call, "TMAlign", raise_error)
+    _record_call(
+        "tmalign",
+        exe,
+        response,
+        query=pdb_query_path.name,
+        target=pdb_target_path.name,
+    )
+    return response
@@ -1,8 +1,18 @@
+import contextlib
+import functools
 import logging
+import multiprocessing
+import shutil
+import tempfile
+import time
 from pathlib import Path
 from typing import List, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as pa_ds
+import pyarrow.parquet as pq
 from pandas.errors import EmptyDataError
 
 import helper
@@ -23,10 +33,14 @@ from helper.constants import (
     MM_QUERY_CHAIN,
     WILD_CHAIN,
     MM_HIT_CHAIN,
+    MM_SITE_GAPS,
+    MM_SITE_MISMATCHES,
+    MM_SITE_RESIDUES,
 )
 from helper.datasets.dataset import Dataset
 from helper.datasets.scope import read_scope
-from helper.datasets.utils import get_pdb_file_path
+from helper.datasets.pdb_index import lookup_pdb_file_paths
+from helper.journal import CompletionJournal
 
 logger = logging.getLogger(__name__)
 dataset_collection = helper.get_dataset_collection()
@@ -65,17 +79,13 @@ def make_search_parameter_table(dataset: Dataset, backward: bool) -> pd.DataFram
             pdb_mirror = "standard"  # backward mode always with standard PDB files.
             df = df[~df[helper.MUTANT_COL].isin(BAD_PDBIDS)]
 
-            df[path_col] = df[helper.MUTANT_COL].apply(
-                lambda val: get_pdb_file_path(
-                    val, mirror=pdb_mirror, allow_obsolete=True
-                )
+            df[path_col] = lookup_pdb_file_paths(
+                df[helper.MUTANT_COL], mirror=pdb_mirror, allow_obsolete=True
             )
             id_col = helper.MUTANT_COL
         else:
-            df[path_col] = df[helper.WILD_COL].apply(
-                lambda val: get_pdb_file_path(
-                    val, mirror=pdb_mirror, allow_obsolete=True
-                )
+            df[path_col] = lookup_pdb_file_paths(
+                df[helper.WILD_COL], mirror=pdb_mirror, allow_obsolete=True
             )
             id_col = helper.WILD_COL
     else:
@@ -88,10 +98,8 @@ def make_search_parameter_table(dataset: Dataset, backward: bool) -> pd.DataFram
         else:
             raise NotImplementedError("dataset not known")
         if path_col not in df.columns:
-            df[path_col] = df[id_col].apply(
-                lambda val: get_pdb_file_path(
-                    val, mirror=pdb_mirror, allow_obsolete=True
-                )
+            df[path_col] = lookup_pdb_file_paths(
+                df[id_col], mirror=pdb_mirror, allow_obsolete=True
             )
 
     df = df[[id_col, path_col]]
@@ -100,7 +108,7 @@ def make_search_parameter_table(dataset: Dataset, backward: bool) -> pd.DataFram
     if na_mask.any():
         # remove missing values, e.g. when only CIF file is available, but we want PDB
         logger.info(f"Dropping {na_mask.sum()} missing values (of {df.shape[0]} total)")
-        df = df[na_mask]
+        df = df[~na_mask]
 
     # remove duplicate ROWS, i.e. when ID and PATH are identical. Would lead to redundant
     # computations. Duplicates are frequent in mutation datasets, e.g. the same mutation
@@ -155,11 +163,11 @@ def make_pair_parameter_table(dataset: Dataset, backward: bool) -> pd.DataFrame:
         pdb_mirror2, pdb_mirror1 = pdb_mirror1, pdb_mirror2
         id_col1, id_col2 = id_col2, id_col1
 
-    df[path_col1] = df[id_col1].apply(
-        lambda val: get_pdb_file_path(val, mirror=pdb_mirror1, allow_obsolete=True)
+    df[path_col1] = lookup_pdb_file_paths(
+        df[id_col1], mirror=pdb_mirror1, allow_obsolete=True
     )
-    df[path_col2] = df[id_col2].apply(
-        lambda val: get_pdb_file_path(val, mirror=pdb_mirror2, allow_obsolete=True)
+    df[path_col2] = lookup_pdb_file_paths(
+        df[id_col2], mirror=pdb_mirror2, allow_obsolete=True
     )
     df = df[[id_col1, path_col1, id_col2, path_col2]]
 
@@ -167,7 +175,7 @@ def make_pair_parameter_table(dataset: Dataset, backward: bool) -> pd.DataFrame:
     if na_mask.any():
         # remove missing values, e.g. when only CIF file is available, but we want PDB
         logger.info(f"Dropping {na_mask.sum()} missing values (of {df.shape[0]} total)")
-        df = df[na_mask]
+        df = df[~na_mask]
 
     # remove duplicate ROWS, i.e. when ID and PATH are identical. Would lead to redundant
     # computations.
@@ -177,35 +185,384 @@ def make_pair_parameter_table(dataset: Dataset, backward: bool) -> pd.DataFrame:
     return df
 
 
-def read_microminer_csv(files: List[Path]) -> pd.DataFrame:
+# Name of MicroMiner result CSV files and of the consolidated Parquet dataset of a result dir.
+MM_RESULT_CSV = "resultStatistic.csv"
+MM_RESULT_PARQUET = "resultStatistic.parquet"
+# Manifest of resultStatistic.csv files in a result dir for faster repeated discovery
+MM_RESULT_MANIFEST = ".resultStatistic_manifest.json"
+# Number of threads for listing result dirs. Listing is I/O bound, especially on NFS.
+MM_RESULT_SCAN_THREADS = 16
+
+# String columns of MicroMiner results. We use strings to guarantee consistent and correct
+# behaviour when matching. They are returned as categoricals, since they have few distinct
+# values compared to the number of hits.
+_MM_STRING_COLUMNS = [
+    MM_QUERY_NAME,
+    MM_QUERY_AA,
+    MM_QUERY_CHAIN,
+    MM_QUERY_POS,
+    MM_HIT_NAME,
+    MM_HIT_AA,
+    MM_HIT_CHAIN,
+    MM_HIT_POS,
+]
+_MM_INT_COLUMNS = [MM_SITE_GAPS, MM_SITE_MISMATCHES, MM_SITE_RESIDUES]
+
+
+def _read_microminer_csv_file(
+    filepath: Path, columns: List[str] = None, filters=None
+) -> pd.DataFrame:
+    """Reads a single result CSV of MicroMiner.
+
+    :param filepath: Path to a MicroMiner CSV file.
+    :param columns: Columns to read. All columns if None.
+    :param filters: Row filters (see read_microminer_csv).
+    :return: Dataframe of the CSV file or None if the file is empty.
+    """
+    try:
+        df = pd.read_csv(
+            filepath,
+            sep="\t",
+            header=0,
+            dtype={c: str for c in _MM_STRING_COLUMNS},
+            usecols=None if columns is None else lambda c: c in columns,
+        )
+    except EmptyDataError:
+        logger.warning(f"File is empty: {filepath}")
+        return None
+    if filters is not None:
+        df = (
+            pa.Table.from_pandas(df, preserve_index=False)
+            .filter(pq.filters_to_expression(filters))
+            .to_pandas()
+        )
+    return df
+
+
+def _to_categorical(df: pd.DataFrame) -> pd.DataFrame:
+    """Converts the string columns of a MicroMiner result table to categoricals.
+
+    :param df: MicroMiner result table.
+    :return: The table.
+    """
+    for col in _MM_STRING_COLUMNS:
+        if col in df.columns and df[col].dtype != "category":
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _read_microminer_csv_chunk(
+    files: List[Path], columns: List[str] = None, filters=None
+) -> pd.DataFrame:
+    """Reads a chunk of result CSVs of MicroMiner into a deduplicated dataframe.
+
+    :param files: List of file paths to MicroMiner CSV files.
+    :param columns: Columns to read. All columns if None.
+    :param filters: Row filters (see read_microminer_csv).
+    :return: Dataframe of the CSV files or None if all files are empty.
+    """
+    dfs = [_read_microminer_csv_file(f, columns, filters) for f in files]
+    dfs = [df for df in dfs if df is not None]
+    if len(dfs) == 0:
+        return None
+    return _to_categorical(pd.concat(dfs, ignore_index=True)).drop_duplicates()
+
+
+def _concat_microminer_tables(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenates MicroMiner result tables and keeps string columns categorical.
+
+    :param dfs: List of MicroMiner result tables.
+    :return: The concatenated table.
+    """
+    for col in _MM_STRING_COLUMNS:
+        if len(dfs) > 1 and all(
+            col in df.columns and df[col].dtype == "category" for df in dfs
+        ):
+            # Concatenation falls back to object for different categories.
+            categories = pd.Index(
+                np.concatenate([df[col].cat.categories.to_numpy() for df in dfs])
+            ).unique()
+            for df in dfs:
+                df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def read_microminer_csv(
+    files: List[Path],
+    columns: List[str] = None,
+    filters=None,
+    cpus: int = 1,
+    chunk_size: int = 1000,
+) -> pd.DataFrame:
     """Reads result CSVs of a MicroMiner to a single dataframe.
 
      This function is convenient because sometimes we need to enforce dtypes.
      For example PDB IDs are sometimes interpreted as a float given in scientific notation
      or residue positions can or can not contain insertion code (iCode) or start with a minus
      or chain identifiers are '1' and interpreted as int.
-    :param files: List of file paths to MicroMiner CSV files.
-    :return: A single dataframe containing the content of all input CSV files
-            (duplicate entries are removed).
+
+     Files may also be consolidated Parquet datasets of result dirs (see
+     consolidate_microminer_results). Only the requested columns and the row groups that
+     may match the filters are read from those.
+
+     CSV files are read in chunks, in parallel if cpus > 1. Duplicates are removed within
+     every chunk before the chunks are concatenated, which keeps the memory peak low.
+
+    :param files: List of file paths to MicroMiner CSV files or consolidated Parquet datasets.
+    :param columns: Columns to read. All columns if None.
+    :param filters: Row filters in pyarrow's disjunctive normal form, e.g.
+                    [("queryName", "in", ["1G9V", "2RN2"]), ("fullSeqId", ">=", 0.4)].
+    :param cpus: Number of CPU cores for reading CSV files.
+    :param chunk_size: Number of CSV files per chunk.
+    :return: A single dataframe containing the content of all input files (duplicate
+             entries are removed). MicroMiner name, residue, chain and position columns
+             are categoricals of strings.
+    """
+    dfs = [
+        _read_microminer_parquet(f, columns, filters)
+        for f in files
+        if f.name == MM_RESULT_PARQUET
+    ]
+    csv_files = [f for f in files if f.name != MM_RESULT_PARQUET]
+    chunks = [
+        csv_files[i : i + chunk_size] for i in range(0, len(csv_files), chunk_size)
+    ]
+    read_chunk = functools.partial(
+        _read_microminer_csv_chunk, columns=columns, filters=filters
+    )
+
+    def report_progress(nof_files_read, nof_rows, tic):
+        elapsed = max(time.time() - tic, 1e-9)
+        logger.info(
+            f"Read {nof_files_read} of {len(csv_files)} MicroMiner result files"
+            f" ({nof_rows} rows, {nof_files_read / elapsed:.1f} files/s)"
+        )
+
+    if len(chunks) > 0:
+        tic = time.time()
+        nof_files_read = 0
+        nof_rows = 0
+        with contextlib.ExitStack() as stack:
+            if cpus > 1 and len(chunks) > 1:
+                pool = stack.enter_context(multiprocessing.Pool(min(cpus, len(chunks))))
+                chunk_dfs = pool.imap(read_chunk, chunks)
+            else:
+                chunk_dfs = map(read_chunk, chunks)
+            for chunk, df in zip(chunks, chunk_dfs):
+                nof_files_read += len(chunk)
+                if df is not None:
+                    dfs.append(df)
+                    nof_rows += df.shape[0]
+                if nof_files_read % (10 * chunk_size) < chunk_size:
+                    report_progress(nof_files_read, nof_rows, tic)
+        report_progress(nof_files_read, nof_rows, tic)
+
+    df = _concat_microminer_tables(dfs)
+    return _to_categorical(df).drop_duplicates()
+
+
+def _read_microminer_parquet(
+    path: Path, columns: List[str] = None, filters=None
+) -> pd.DataFrame:
+    """Reads a consolidated Parquet dataset of MicroMiner results.
+
+    :param path: Path to the dataset.
+    :param columns: Columns to read. All columns if None.
+    :param filters: Row filters (see read_microminer_csv).
+    :return: Dataframe of the dataset.
+    """
+    dataset = pa_ds.dataset(path, format="parquet")
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    table = dataset.to_table(
+        columns=columns,
+        filter=None if filters is None else pq.filters_to_expression(filters),
+    )
+    # dictionary encoded columns become categoricals
+    return table.to_pandas()
+
+
+def find_microminer_results(paths: List[Path]) -> List[Path]:
+    """Gathers MicroMiner results for read_microminer_csv.
+
+    For every directory the consolidated Parquet dataset is taken if it exists and
+    is up-to-date. Otherwise all resultStatistic.csv files in the directory and its subdirs
+    are taken. A dataset is outdated if any completion journal in the directory or in its
+    results subdir (of distributed runs) was modified after the consolidation.
+
+    :param paths: MicroMiner result files or directories.
+    :return: List of MicroMiner CSV files and Parquet datasets.
+    """
+    files = []
+    for path in paths:
+        dataset_path = path / MM_RESULT_PARQUET
+        if path.is_dir() and dataset_path.is_dir():
+            # the journals of distributed runs are in the results subdir. Not searched
+            # recursively, the result dirs of the queries would have to be listed.
+            journals = [
+                journal
+                for journal_dir in [path, path / "results"]
+                for journal in journal_dir.glob(f"{CompletionJournal.FILE_PREFIX}*.tsv")
+            ]
+            if all(j.stat().st_mtime <= dataset_path.stat().st_mtime for j in journals):
+                logger.info(f"Using consolidated MicroMiner results {dataset_path}")
+                files.append(dataset_path)
+                continue
+            logger.warning(
+                f"Ignoring outdated consolidated MicroMiner results {dataset_path}."
+                f" Consolidate again for faster reading."
+            )
+        files.extend(scan_microminer_result_csvs(path))
+    return files
+
+
+def scan_microminer_result_csvs(path: Path) -> List[Path]:
+    """Finds all resultStatistic.csv files in a directory and its subdirs.
+
+    Directories are listed concurrently. A manifest in the directory remembers the files,
+    so that repeated scans only list directories that changed.
+
+    :param path: MicroMiner result file or directory.
+    :return: List of resultStatistic.csv files.
     """
-    # We use strings to guarantee consistent and correct behaviour when matching.
-    col_dtypes = {
-        MM_QUERY_NAME: str,
-        MM_HIT_NAME: str,
-        MM_QUERY_POS: str,
-        MM_HIT_POS: str,
-        MM_QUERY_CHAIN: str,
-        MM_HIT_CHAIN: str,
-    }
-
-    def df_gen(files_list):
-        for filepath in files_list:
-            try:
-                yield pd.read_csv(filepath, sep="\t", header=0, dtype=col_dtypes)
-            except EmptyDataError:
-                print("Warning: file is empty: ", filepath)
-
-    return pd.concat(df_gen(files), ignore_index=True).drop_duplicates()
+    return list(
+        helper.utils.scantree(
+            path,
+            name=MM_RESULT_CSV,
+            threads=MM_RESULT_SCAN_THREADS,
+            manifest=path / MM_RESULT_MANIFEST if path.is_dir() else None,
+        )
+    )
+
+
+def _microminer_arrow_schema(df: pd.DataFrame) -> pa.Schema:
+    """Derives the Parquet schema of MicroMiner results from a result table.
+
+    String columns are dictionary encoded. Counts are stored as 32 bit integers and all other
+    numeric columns as 64 bit floats.
+
+    :param df: MicroMiner result table.
+    :return: The schema.
+    """
+    fields = []
+    for col in df.columns:
+        if col in _MM_INT_COLUMNS:
+            fields.append(pa.field(col, pa.int32()))
+        elif col in _MM_STRING_COLUMNS or not pd.api.types.is_numeric_dtype(df[col]):
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(col, pa.float64()))
+    return pa.schema(fields)
+
+
+def consolidate_microminer_results(
+    resultdir: Path, rows_per_file: int = 10_000_000
+) -> Path:
+    """Compacts all resultStatistic.csv files of a result dir into a Parquet dataset.
+
+    The dataset is written to resultStatistic.parquet in the result dir. It consists of
+    several Parquet files, each sorted by query name, so that reading with a filter on the
+    query name can skip most of the data. An existing dataset is replaced.
+
+    :param resultdir: MicroMiner result dir.
+    :param rows_per_file: Number of rows after which a new Parquet file is started. Also
+                          bounds the memory needed for consolidation.
+    :return: Path to the dataset.
+    """
+    files = sorted(scan_microminer_result_csvs(resultdir))
+    if len(files) == 0:
+        raise FileNotFoundError(f"No {MM_RESULT_CSV} in {resultdir}")
+    logger.info(f"Consolidating {len(files)} MicroMiner result files in {resultdir}")
+
+    dataset_path = resultdir / MM_RESULT_PARQUET
+    tmp_path = Path(tempfile.mkdtemp(prefix=f".{MM_RESULT_PARQUET}_", dir=resultdir))
+    schema = None
+    nof_parts = 0
+    nof_rows = 0
+    pending = []
+    nof_pending_rows = 0
+
+    def write_part(dfs):
+        df = pd.concat(dfs, ignore_index=True).drop_duplicates()
+        df = df.sort_values(MM_QUERY_NAME, kind="stable")
+        pq.write_table(
+            pa.Table.from_pandas(df, schema=schema, preserve_index=False),
+            tmp_path / f"part-{nof_parts:05d}.parquet",
+            row_group_size=100_000,
+        )
+        return df.shape[0]
+
+    try:
+        for filepath in files:
+            df = _read_microminer_csv_file(filepath)
+            if df is None or df.shape[0] == 0:
+                continue
+            if schema is None:
+                schema = _microminer_arrow_schema(df)
+            elif df.columns.tolist() != schema.names:
+                raise ValueError(f"Unexpected columns in {filepath}")
+            pending.append(df)
+            nof_pending_rows += df.shape[0]
+            if nof_pending_rows >= rows_per_file:
+                nof_rows += write_part(pending)
+                nof_parts += 1
+                pending, nof_pending_rows = [], 0
+        if len(pending) > 0:
+            nof_rows += write_part(pending)
+            nof_parts += 1
+
+        if dataset_path.exists():
+            shutil.rmtree(dataset_path)
+        tmp_path.rename(dataset_path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    logger.info(
+        f"Wrote {nof_rows} MicroMiner hits in {nof_parts} files to {dataset_path}"
+    )
+    return dataset_path
+
+
+def _to_three_letter_code(aa: pd.Series) -> pd.Categorical:
+    """Converts amino acids in 1-letter code to 3-letter code. 3-letter codes are kept.
+
+    The conversion is done once per distinct value instead of once per row.
+
+    :param aa: Amino acids in 1- or 3-letter code.
+    :return: Amino acids in 3-letter code.
+    """
+    aa = pd.Categorical(aa)
+    categories = aa.categories.to_series()
+    is_three = categories.str.len() == 3
+    three = categories.where(is_three, categories.map(one_2_three_dict))
+    unknown = three.isna()
+    if unknown.any():
+        raise KeyError(categories[unknown].iloc[0])
+    uniques_codes, uniques = pd.factorize(three)
+    codes = np.where(aa.codes >= 0, uniques_codes[aa.codes], -1)
+    return pd.Categorical.from_codes(codes, uniques)
+
+
+def _factorize_jointly(left, right) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Encodes the values of two join key columns as integer codes of a common dictionary.
+
+    Equal values get equal codes. Missing values get -1 (and match each other, like in
+    pandas merges).
+
+    :param left: Left join key column.
+    :param right: Right join key column.
+    :return: Codes of the left and the right column and the number of distinct codes.
+    """
+    left = pd.Categorical(left)
+    right = pd.Categorical(right)
+    uniques = left.categories.append(right.categories).unique()
+
+    def recode(values):
+        codes = uniques.get_indexer(values.categories)[values.codes]
+        codes[values.codes < 0] = -1
+        return codes.astype(np.int64)
+
+    return recode(left), recode(right), len(uniques)
 
 
 def merge_results_for_pair_eval(
@@ -221,6 +578,9 @@ def merge_results_for_pair_eval(
     # many mutation dataset contain no chain or inconsistent chain information (especially for
     # the backward case) in these cases chain ID will not be used for matching.
 
+    The join key of every row is encoded as a single integer. Every mutation is looked up once
+    and the three result tables are taken from that single lookup.
+
     :param df_dataset: The mutation dataset dataframe.
     :param df_microminer: The MicroMiner result dataframe.
     :param backward: Whether to match backward (match wild-type columns with MM hit columns
@@ -246,39 +606,64 @@ def merge_results_for_pair_eval(
         right_on.append(MM_HIT_CHAIN if backward else MM_QUERY_CHAIN)
         ref_key_cols.append(WILD_CHAIN)
 
-    # We can drop duplicates in MicroMiner results here. Duplicates are not necessary
-    # to check for successful retrieval of a known wild-type/mutant structure pair.
-    # In addition, probably all duplicates present are multiple matches in homo-meric structures.
-    df_mm = df_mm.drop_duplicates(right_on)
-
     df_ref = df_ref[~df_ref[WILD_COL].isin(BAD_PDBIDS)]
     df_ref = df_ref[~df_ref[MUTANT_COL].isin(BAD_PDBIDS)]
 
     # drop duplicates. There are often duplicates, e.g. because of multiple ddG measurements
     df_ref = df_ref.drop_duplicates(ref_key_cols)
 
-    from_one_to_three = lambda aa: one_2_three_dict[aa] if len(aa) != 3 else aa
-    df_ref["wild_aa3"] = df_ref[WILD_AA].apply(from_one_to_three)
-    df_ref["mutant_aa3"] = df_ref[MUT_AA].apply(from_one_to_three)
-
-    left_on = [WILD_COL, MUTANT_COL, "wild_aa3", "mutant_aa3", WILD_SEQ_NUM]
+    # amino acids of the dataset are matched by their 3-letter code
+    left_on = [WILD_COL, MUTANT_COL, WILD_AA, MUT_AA, WILD_SEQ_NUM]
     if backward:
-        left_on = [MUTANT_COL, WILD_COL, "mutant_aa3", "wild_aa3", WILD_SEQ_NUM]
+        left_on = [MUTANT_COL, WILD_COL, MUT_AA, WILD_AA, WILD_SEQ_NUM]
 
     if WILD_CHAIN in df_ref.columns:
         left_on.append(WILD_CHAIN)
 
-    df_merged = df_ref.merge(df_mm, left_on=left_on, right_on=right_on, how="left")
-    df_anno = df_merged.dropna(subset=right_on)
-    df_not_found = df_ref.merge(
-        df_mm, left_on=left_on, right_on=right_on, how="left", indicator=True
-    )
-    df_not_found.query('_merge == "left_only"', inplace=True)
-    df_not_found.drop("_merge", axis=1, inplace=True)
+    # encode the join key of every row as a single integer
+    ref_keys = np.zeros(df_ref.shape[0], dtype=np.int64)
+    mm_keys = np.zeros(df_mm.shape[0], dtype=np.int64)
+    nof_keys = 1
+    for left_col, right_col in zip(left_on, right_on):
+        left = df_ref[left_col]
+        if left_col in (WILD_AA, MUT_AA):
+            left = _to_three_letter_code(left)
+        left_codes, right_codes, nof_codes = _factorize_jointly(left, df_mm[right_col])
+        if nof_keys * (nof_codes + 1) >= 2**62:
+            # renumber the keys so far to avoid an overflow
+            codes, uniques = pd.factorize(np.concatenate([ref_keys, mm_keys]))
+            ref_keys, mm_keys = codes[: ref_keys.size], codes[ref_keys.size :]
+            nof_keys = len(uniques)
+        # missing values (code -1) become 0
+        ref_keys = ref_keys * (nof_codes + 1) + (left_codes + 1)
+        mm_keys = mm_keys * (nof_codes + 1) + (right_codes + 1)
+        nof_keys *= nof_codes + 1
 
-    # clean up
-    df_anno = df_anno.drop(["wild_aa3", "mutant_aa3"], axis=1)
-    df_not_found.drop(["wild_aa3", "mutant_aa3"], axis=1, inplace=True)
-    df_merged = df_merged.drop(["wild_aa3", "mutant_aa3"], axis=1)
+    # We can drop duplicates in MicroMiner results here. Duplicates are not necessary
+    # to check for successful retrieval of a known wild-type/mutant structure pair.
+    # In addition, probably all duplicates present are multiple matches in homo-meric structures.
+    mm_rows = np.flatnonzero(~pd.Series(mm_keys).duplicated().to_numpy())
+
+    # Without duplicates, every mutation matches at most one MicroMiner row. The left join
+    # is a lookup of every mutation's key.
+    matches = pd.Index(mm_keys[mm_rows]).get_indexer(ref_keys)
+    is_found = matches >= 0
+    df_merged_ref = df_ref.reset_index(drop=True)
+    if is_found.all():
+        df_merged_mm = df_mm.iloc[mm_rows[matches]].reset_index(drop=True)
+    else:
+        # missing rows become NaN with the same dtype conversions as in a pandas merge
+        df_merged_mm = df_mm.reset_index(drop=True).reindex(
+            np.where(is_found, mm_rows[matches], -1)
+        )
+        df_merged_mm.index = df_merged_ref.index
+    common_cols = df_merged_ref.columns.intersection(df_merged_mm.columns)
+    if len(common_cols) > 0:
+        df_merged_ref = df_merged_ref.rename(columns={c: f"{c}_x" for c in common_cols})
+        df_merged_mm = df_merged_mm.rename(columns={c: f"{c}_y" for c in common_cols})
+    df_merged = pd.concat([df_merged_ref, df_merged_mm], axis=1)
+
+    df_anno = df_merged.dropna(subset=right_on)
+    df_not_found = df_merged[~is_found]
 
     return df_anno, df_not_found, df_merged
@@ -1,40 +1,73 @@
 """
 The :mod: dataset module for reading structure and mutation data sets.
+
+Data sets are created on first use and their modules imported on first access, so that
+importing the helper module stays fast (e.g. for the runner scripts on HPC nodes).
 """
+import functools
+import importlib
 from pathlib import Path
 
-import helper
+from helper.constants import CONFIG
 
-from .afdb import AFDB
 from .dataset import DatasetCollection
-from .fireprotdb import FireProtDB
-from .pdb import PDB
-from .platinum import Platinum
-from .protherm import ProTherm
-from .prothermdb import ProThermDB
-from .shanthirabalan import Shanthirabalan
-from .skempi2 import SKEMPI2
-from .thermomutdb import ThermoMutDB
-
-# register new datasets here
+
+# data set classes by module
+_CLASSES = {
+    "AFDB": ".afdb",
+    "FireProtDB": ".fireprotdb",
+    "PDB": ".pdb",
+    "Platinum": ".platinum",
+    "ProTherm": ".protherm",
+    "ProThermDB": ".prothermdb",
+    "Shanthirabalan": ".shanthirabalan",
+    "SKEMPI2": ".skempi2",
+    "ThermoMutDB": ".thermomutdb",
+}
+
+# register new datasets here: name, class and the key of its file in the DATA section
+_DATASETS = [
+    ("protherm", "ProTherm", "PROTHERM"),
+    ("platinum", "Platinum", "PLATINUM"),
+    ("thermomutdb", "ThermoMutDB", "THERMOMUTDB"),
+    ("prothermdb", "ProThermDB", "PROTHERMDB"),
+    ("skempi2", "SKEMPI2", "SKEMPI2"),
+    ("shanthirabalan", "Shanthirabalan", "SHANTHIRABALAN"),
+    ("fireprotdb", "FireProtDB", "FIREPROTDB"),
+    ("pdb", "PDB", "PDB_DIR"),
+    ("afdb", "AFDB", "AFDB_DIR"),
+]
+
+
+def __getattr__(name: str):
+    """Import the data set classes on first access (PEP 562).
+
+    :param name: Name of the attribute.
+    :return: The class.
+    """
+    if name not in _CLASSES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_CLASSES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def _create_dataset(class_name: str, config_key: str):
+    """Create a data set with the path of the DATA section of the config.
+
+    :param class_name: Name of the data set class.
+    :param config_key: Key of the path in the DATA section.
+    :return: The data set.
+    """
+    return __getattr__(class_name)(Path(CONFIG["DATA"][config_key]))
+
+
 dataset_collection = DatasetCollection()
-dataset_collection.register_dataset(ProTherm(Path(helper.CONFIG["DATA"]["PROTHERM"])))
-dataset_collection.register_dataset(Platinum(Path(helper.CONFIG["DATA"]["PLATINUM"])))
-dataset_collection.register_dataset(
-    ThermoMutDB(Path(helper.CONFIG["DATA"]["THERMOMUTDB"]))
-)
-dataset_collection.register_dataset(
-    ProThermDB(Path(helper.CONFIG["DATA"]["PROTHERMDB"]))
-)
-dataset_collection.register_dataset(SKEMPI2(Path(helper.CONFIG["DATA"]["SKEMPI2"])))
-dataset_collection.register_dataset(
-    Shanthirabalan(Path(helper.CONFIG["DATA"]["SHANTHIRABALAN"]))
-)
-dataset_collection.register_dataset(
-    FireProtDB(Path(helper.CONFIG["DATA"]["FIREPROTDB"]))
-)
-dataset_collection.register_dataset(PDB(Path(helper.CONFIG["DATA"]["PDB_DIR"])))
-dataset_collection.register_dataset(AFDB(Path(helper.CONFIG["DATA"]["AFDB_DIR"])))
+for _name, _class_name, _config_key in _DATASETS:
+    dataset_collection.register_dataset_factory(
+        _name, functools.partial(_create_dataset, _class_name, _config_key)
+    )
+del _name, _class_name, _config_key
 
 
 def get_dataset_collection():
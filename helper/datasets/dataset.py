@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Callable, List
 
 import pandas as pd
 
@@ -67,6 +67,7 @@ class DatasetCollection:
     def __init__(self):
         """Create a new instance."""
         self.dataset_map = {}
+        self.factory_map = {}
 
     def register_dataset(self, dataset_obj: Dataset) -> None:
         """Register a new data set in the collection.
@@ -76,13 +77,24 @@ class DatasetCollection:
         """
         self.dataset_map[dataset_obj.name] = dataset_obj
 
+    def register_dataset_factory(
+        self, database_name: str, factory: Callable[[], Dataset]
+    ) -> None:
+        """Register a new data set in the collection that is created on first use.
+
+        :param database_name: The data sets name.
+        :param factory: Function without arguments that creates the data set object.
+        :return: None
+        """
+        self.factory_map[database_name] = factory
+
     def contains(self, database_name: str) -> bool:
         """Check if ceratin data set is contained in collection.
 
         :param database_name: The data sets name.
         :return: True if data set is contained, false otherwise.
         """
-        return database_name in self.dataset_map
+        return database_name in self.dataset_map or database_name in self.factory_map
 
     @staticmethod
     def is_mutation_dataset(database_obj: Dataset) -> bool:
@@ -99,6 +111,8 @@ class DatasetCollection:
         :param database_name: The data sets name.
         :return: The data set instance.
         """
+        if database_name not in self.dataset_map:
+            self.dataset_map[database_name] = self.factory_map[database_name]()
         return self.dataset_map[database_name]
 
     def get_dataset_names(self) -> List[str]:
@@ -106,7 +120,7 @@ class DatasetCollection:
 
         :return: List of data set names.
         """
-        return list(self.dataset_map.keys())
+        return list(dict.fromkeys([*self.factory_map, *self.dataset_map]))
 
     def get_mutation_datasets_with_structure_pairs(self) -> List[Dataset]:
         """Get all mutation data sets in the collection.
@@ -115,17 +129,18 @@ class DatasetCollection:
         """
         return [
             dataset
-            for dataset in self.dataset_map.values()
+            for dataset in self
             if dataset.has_structure_pairs
             and DatasetCollection.is_mutation_dataset(dataset)
         ]
 
     def __iter__(self):
-        """iter function to iterate contained data sets.
+        """iter function to iterate contained data sets. Creates all data sets that
+        were not used yet.
 
         :return: Iterator of the contained data sets.
         """
-        return self.dataset_map.values().__iter__()
+        return iter([self.get_dataset(name) for name in self.get_dataset_names()])
 
 
 class MockDataset(Dataset):
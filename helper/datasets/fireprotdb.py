@@ -5,6 +5,7 @@ import pandas as pd
 
 from helper import WILD_COL, WILD_AA, WILD_CHAIN, WILD_SEQ_NUM, MUT_AA
 from helper.datasets.dataset import MutationDataset
+from helper.datasets.snapshot import snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +52,7 @@ class FireProtDB(MutationDataset):
             low_memory=False,
         )
 
+    @snapshot
     def read_single_mutations(self, pdb_mutant_only: bool) -> pd.DataFrame:
         """Read all single mutations.
 
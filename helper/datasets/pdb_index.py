@@ -0,0 +1,205 @@
+"""Index of structure files in PDB mirrors for looking up many structure paths at once."""
+import functools
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from helper import CONFIG
+from helper.utils import scantree
+
+logger = logging.getLogger(__name__)
+
+# Number of threads for scanning mirror directories. Scanning is I/O bound.
+SCAN_THREADS = 16
+
+
+def _index_dir() -> Optional[Path]:
+    """Get the directory for persisting structure file indices.
+
+    :return: The directory or None if indices should not be persisted.
+    """
+    index_dir = CONFIG["CACHE"]["PDB_INDEX_DIR"].strip()
+    if index_dir == "":
+        return None
+    index_dir = Path(index_dir).expanduser()
+    try:
+        index_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Cannot persist structure file indices in {index_dir}: {e}")
+        return None
+    return index_dir
+
+
+def scan_structure_files(
+    directory: Path,
+    label: str,
+    parse_id: Callable[[Optional[str], str], Optional[str]],
+) -> Dict[str, Path]:
+    """Scans a directory tree for structure files.
+
+    The file names of every directory are persisted in a manifest (see scantree), so that
+    repeated scans only list directories that changed since.
+
+    :param directory: Root directory of the structure files.
+    :param label: Label of the directory for naming the manifest.
+    :param parse_id: Function mapping the relative directory and file name of a file to
+                     the ID of its structure. Returns None for files that are no structures.
+                     With None as directory, it must check the file name only.
+    :return: Dict mapping structure IDs to file paths. Files in the root directory take
+             precedence over files with the same ID in subdirs.
+    """
+    if not directory.is_dir():
+        logger.warning(f"Structure file directory does not exist: {directory}")
+        return {}
+
+    manifest = None
+    index_dir = _index_dir()
+    if index_dir is not None:
+        dir_hash = hashlib.sha1(str(directory.resolve()).encode("utf-8")).hexdigest()
+        manifest = index_dir / f"{label}_{dir_hash[:12]}.json"
+
+    root = str(directory)
+    paths = {}
+    for path in scantree(
+        directory,
+        name=lambda n: parse_id(None, n) is not None,
+        threads=SCAN_THREADS,
+        manifest=manifest,
+    ):
+        rel_dir = os.path.relpath(str(path.parent), root)
+        structure_id = parse_id(rel_dir, path.name)
+        if structure_id is None:
+            continue
+        if structure_id not in paths or rel_dir == ".":
+            paths[structure_id] = path
+    logger.info(f"Indexed {len(paths)} structure files in {directory}")
+    return paths
+
+
+def _parse_standard_pdb_id(
+    rel_dir: Optional[str], name: str, divided_only: bool
+) -> Optional[str]:
+    """Parses PDB IDs from PDB mirror file names, e.g. divided/pdb/g9/pdb1g9v.ent.gz.
+
+    :param rel_dir: Directory of the file relative to the mirror root.
+    :param name: File name.
+    :param divided_only: Whether only files in the "divided" directory layout are valid.
+    :return: Upper case PDB ID or None if the file is no structure of the mirror.
+    """
+    prefix = CONFIG["PDB_FILE_INFO"]["PREFIX"]
+    suffix = CONFIG["PDB_FILE_INFO"]["SUFFIX"]
+    if not (name.startswith(prefix) and name.endswith(suffix)):
+        return None
+    pdbid = name[len(prefix) : len(name) - len(suffix)].upper()
+    if len(pdbid) < 4:
+        return None
+    if (
+        rel_dir is None
+        or rel_dir == pdbid[1:3].lower()
+        or (rel_dir == "." and not divided_only)
+    ):
+        return pdbid
+    return None
+
+
+def _parse_custom_pdb_id(rel_dir: Optional[str], name: str) -> Optional[str]:
+    """Parses PDB IDs from file names of data set specific structures, e.g. 1G9V.pdb.
+
+    :param rel_dir: Directory of the file relative to the structure dir.
+    :param name: File name.
+    :return: Upper case PDB ID or None if the file is no structure of the data set.
+    """
+    if not name.endswith(".pdb") or rel_dir not in (None, "."):
+        return None
+    return name[: -len(".pdb")].upper()
+
+
+def _parse_scope_sid(rel_dir: Optional[str], name: str) -> Optional[str]:
+    """Parses SCOPe sids from pdbstyle file names, e.g. 5z/d5zzwa_.ent.
+
+    :param rel_dir: Directory of the file relative to the SCOPe pdbstyle dir.
+    :param name: File name.
+    :return: The sid or None if the file is no SCOPe structure.
+    """
+    if not name.endswith(".ent") or len(name) < 9:
+        return None
+    sid = name[: -len(".ent")]
+    if rel_dir is not None and rel_dir != sid[2:4].lower():
+        return None
+    return sid
+
+
+@functools.lru_cache(maxsize=None)
+def get_structure_file_index(mirror: str, allow_obsolete: bool) -> Dict[str, Path]:
+    """Get the index of all structure files of a PDB mirror. Built once per process.
+
+    :param mirror: PDB mirror (see get_pdb_file_path).
+    :param allow_obsolete: Whether to include obsolete structures of the standard mirror.
+    :return: Dict mapping normalized IDs (see normalize_structure_ids) to file paths.
+    """
+    if mirror == "skempi2":
+        return scan_structure_files(
+            Path(CONFIG["DATA"]["SKEMPI2_PDBS"]), mirror, _parse_custom_pdb_id
+        )
+    elif mirror == "platinum":
+        return scan_structure_files(
+            Path(CONFIG["DATA"]["PLATINUM_PDBS"]), mirror, _parse_custom_pdb_id
+        )
+    elif mirror == "scope":
+        return scan_structure_files(
+            Path(CONFIG["DATA"]["SCOPE_DATA_DIR"]), mirror, _parse_scope_sid
+        )
+    paths = {}
+    if allow_obsolete and CONFIG["DATA"]["PDB_OBSOLETE_DIR"]:
+        paths.update(
+            scan_structure_files(
+                Path(CONFIG["DATA"]["PDB_OBSOLETE_DIR"]),
+                "obsolete",
+                functools.partial(_parse_standard_pdb_id, divided_only=True),
+            )
+        )
+    # current structures take precedence over obsolete ones
+    paths.update(
+        scan_structure_files(
+            Path(CONFIG["DATA"]["PDB_DIR"]),
+            "standard",
+            functools.partial(_parse_standard_pdb_id, divided_only=False),
+        )
+    )
+    return paths
+
+
+def normalize_structure_ids(ids: pd.Series, mirror: str) -> pd.Series:
+    """Normalizes structure IDs for lookup in a structure file index.
+
+    :param ids: Structure IDs.
+    :param mirror: PDB mirror (see get_pdb_file_path).
+    :return: The normalized IDs. SCOPe sids are case-sensitive, PDB IDs are upper case.
+    """
+    ids = ids.astype(str)
+    if mirror == "scope":
+        return ids
+    return ids.str.upper()
+
+
+def lookup_pdb_file_paths(
+    ids: pd.Series, mirror: str = "standard", allow_obsolete: bool = True
+) -> pd.Series:
+    """Get file paths for a column of PDB IDs without accessing the file system per ID.
+
+    Same semantics as get_pdb_file_path, except that missing structures are NaN instead
+    of raising an error.
+
+    :param ids: PDB IDs (or SCOPe sids for the scope mirror).
+    :param mirror: PDB mirror to use. Default is 'standard'.
+    :param allow_obsolete: Whether to fall back to obsolete structures if necessary.
+    :return: The file paths (NaN for missing structures) with the index of ids.
+    """
+    if mirror not in ("skempi2", "platinum", "scope"):
+        mirror = "standard"
+    index = get_structure_file_index(mirror, allow_obsolete)
+    return normalize_structure_ids(ids, mirror).map(index)
@@ -5,6 +5,7 @@ import pandas as pd
 
 import helper
 from helper.datasets.dataset import MutationDataset
+from helper.datasets.snapshot import snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +51,7 @@ class Platinum(MutationDataset):
         """
         return pd.read_csv(self.file_path, sep=",")
 
+    @snapshot
     def read_single_mutations(self, pdb_mutant_only: bool) -> pd.DataFrame:
         """Read all valid single mutations in the PLATINUM data set to table.
 
@@ -5,6 +5,7 @@ import pandas as pd
 
 import helper
 from helper.datasets.dataset import MutationDataset
+from helper.datasets.snapshot import snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +56,7 @@ class ProTherm(MutationDataset):
             self.file_path, sep=",", header=0, encoding="latin-1", low_memory=False
         )
 
+    @snapshot
     def read_single_mutations(self, pdb_mutant_only: bool):
         """Read all valid single mutations in the ProTherm data set to table.
 
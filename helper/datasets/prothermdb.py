@@ -5,6 +5,7 @@ import pandas as pd
 
 import helper
 from helper.datasets.dataset import MutationDataset
+from helper.datasets.snapshot import snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +43,7 @@ class ProThermDB(MutationDataset):
         """
         return pd.read_csv(self.file_path, sep="\t")
 
+    @snapshot
     def read_single_mutations(self, pdb_mutant_only: bool) -> pd.DataFrame:
         """Read all valid single mutations in the ProThermDB data set to table.
 
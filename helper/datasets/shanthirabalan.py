@@ -5,6 +5,7 @@ import pandas as pd
 
 import helper
 from helper.datasets.dataset import MutationDataset
+from helper.datasets.snapshot import snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +39,7 @@ class Shanthirabalan(MutationDataset):
             dtype={helper.WILD_SEQ_NUM: str, helper.MUT_SEQ_NUM: str},
         )
 
+    @snapshot
     def read_single_mutations(self, pdb_mutant_only: bool = True):
         """Read all valid single mutations in the Shanthirabalan et al. data set to table.
 
@@ -5,6 +5,7 @@ import pandas as pd
 
 import helper
 from helper.datasets.dataset import MutationDataset
+from helper.datasets.snapshot import snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +56,7 @@ class SKEMPI2(MutationDataset):
         """
         return pd.read_csv(self.file_path, sep=";")
 
+    @snapshot
     def read_single_mutations(self, pdb_mutant_only: bool) -> pd.DataFrame:
         """Read all valid single mutations in the SKEMPI2.0 data set to table.
 
@@ -0,0 +1,195 @@
+"""Snapshots of parsed mutation data sets for reading them without parsing again.
+
+Snapshots are pickled, because the parsed tables have object columns of mixed types that
+columnar formats like Parquet do not restore exactly.
+"""
+import functools
+import hashlib
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+
+from helper import CONFIG
+from helper.cache import file_digest, file_identity
+
+logger = logging.getLogger(__name__)
+
+
+SNAPSHOT_SUFFIX = ".pkl"
+
+# modules with parsing code shared by the data sets
+SHARED_MODULES = [
+    "helper.constants",
+    "helper.mutation_filtering",
+    "helper.datasets.dataset",
+    "helper.datasets.utils",
+]
+
+
+def _snapshot_dir() -> Optional[Path]:
+    """Get the directory for snapshots of parsed data sets.
+
+    :return: The directory or None if snapshots are disabled.
+    """
+    snapshot_dir = CONFIG["CACHE"]["DATASET_SNAPSHOT_DIR"].strip()
+    if snapshot_dir == "":
+        return None
+    snapshot_dir = Path(snapshot_dir).expanduser()
+    try:
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Cannot write data set snapshots to {snapshot_dir}: {e}")
+        return None
+    return snapshot_dir
+
+
+def evict(snapshot_dir: Path, max_size: int) -> int:
+    """Remove least recently used snapshots until all snapshots fit the maximum size.
+
+    :param snapshot_dir: Directory of the snapshots.
+    :param max_size: Maximum size of all snapshots in bytes.
+    :return: Number of removed snapshots.
+    """
+    entries = []
+    for path in snapshot_dir.glob(f"*{SNAPSHOT_SUFFIX}"):
+        try:
+            st = path.stat()
+        except OSError:
+            # removed by another process meanwhile
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+    total_size = sum(size for _, size, _ in entries)
+    nof_removed = 0
+    for _, size, path in entries:
+        if total_size <= max_size:
+            break
+        path.unlink(missing_ok=True)
+        total_size -= size
+        nof_removed += 1
+    if nof_removed > 0:
+        logger.info(f"Evicted {nof_removed} data set snapshots from {snapshot_dir}")
+    return nof_removed
+
+
+def snapshot_key(dataset, pdb_mutant_only: bool) -> str:
+    """Key of the single mutations of a data set. Changes if the source file (by path,
+    size and modification time), the module parsing it, one of the SHARED_MODULES or the
+    pandas version changes.
+
+    :param dataset: The mutation data set with the path to its source file in file_path.
+    :param pdb_mutant_only: Argument of read_single_mutations.
+    :return: Hex digest of the key.
+    """
+    key = {
+        "dataset": type(dataset).__qualname__,
+        "source": file_identity(Path(dataset.file_path)),
+        "code": file_digest(Path(inspect.getfile(type(dataset)))),
+        # found without importing, helper.datasets.utils imports further data sets
+        "shared_code": [
+            file_digest(Path(importlib.util.find_spec(name).origin))
+            for name in SHARED_MODULES
+        ],
+        "pdb_mutant_only": bool(pdb_mutant_only),
+        "pandas": pd.__version__,
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _read_snapshot(path: Path, key: str) -> Optional[pd.DataFrame]:
+    """Read a snapshot if it has the given key.
+
+    :param path: Path to the snapshot.
+    :param key: Expected key (see snapshot_key).
+    :return: The table or None if there is no snapshot with this key.
+    """
+    try:
+        with open(path, "rb") as f:
+            entry = pickle.load(f)
+    except (
+        OSError,
+        EOFError,
+        pickle.UnpicklingError,
+        AttributeError,
+        ImportError,
+    ) as e:
+        logger.warning(f"Could not read data set snapshot {path}: {e}")
+        return None
+    if entry.get("key") != key:
+        return None
+    # mark as recently used
+    os.utime(path)
+    return entry["table"]
+
+
+def _write_snapshot(path: Path, key: str, df: pd.DataFrame) -> None:
+    """Write a snapshot. The snapshot appears only when completely written.
+
+    :param path: Path to the snapshot.
+    :param key: Key of the snapshot (see snapshot_key).
+    :param df: The table.
+    :return: None
+    """
+    tmp_path = path.parent / f".{path.name}.{os.getpid()}"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"key": key, "table": df}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write data set snapshot {path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+
+
+def snapshot(read_single_mutations: Callable) -> Callable:
+    """Decorator for MutationDataset.read_single_mutations that returns the table of an
+    earlier call from a snapshot instead of parsing the source file again.
+
+    Snapshots are files in the DATASET_SNAPSHOT_DIR of the CACHE section of the config,
+    one per data set source file and pdb_mutant_only. A snapshot is replaced when its key
+    (see snapshot_key) changed. If the snapshots grow beyond DATASET_SNAPSHOT_MAX_SIZE_GB,
+    the least recently used ones are evicted.
+
+    :param read_single_mutations: The method parsing the single mutations.
+    :return: The decorated method.
+    """
+    signature = inspect.signature(read_single_mutations)
+
+    @functools.wraps(read_single_mutations)
+    def wrapper(self, *args, **kwargs) -> pd.DataFrame:
+        snapshot_dir = _snapshot_dir()
+        if snapshot_dir is None:
+            return read_single_mutations(self, *args, **kwargs)
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        pdb_mutant_only = arguments.arguments["pdb_mutant_only"]
+
+        source_hash = hashlib.sha1(
+            str(Path(self.file_path).resolve()).encode("utf-8")
+        ).hexdigest()
+        path = snapshot_dir / (
+            f"{self.name}_{source_hash[:12]}"
+            f"_{'pdb_mutant_only' if pdb_mutant_only else 'all'}{SNAPSHOT_SUFFIX}"
+        )
+        key = snapshot_key(self, pdb_mutant_only)
+        df = _read_snapshot(path, key) if path.is_file() else None
+        if df is not None:
+            logger.info(
+                f"{self.name}: Read {df.shape[0]} single mutations from snapshot {path}"
+            )
+            return df
+        df = read_single_mutations(self, *args, **kwargs)
+        _write_snapshot(path, key, df)
+        evict(
+            snapshot_dir,
+            int(float(CONFIG["CACHE"]["DATASET_SNAPSHOT_MAX_SIZE_GB"]) * 1024**3),
+        )
+        return df
+
+    return wrapper
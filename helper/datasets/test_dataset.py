@@ -0,0 +1,27 @@
+import unittest
+from unittest import mock
+
+from helper.datasets.dataset import DatasetCollection, MockMutationDataset
+
+
+class DatasetCollectionTests(unittest.TestCase):
+    """Test the collection of data sets"""
+
+    def test_register_dataset_factory(self):
+        """Test that data sets registered with a factory are created on first use"""
+        collection = DatasetCollection()
+        factory = mock.Mock(return_value=MockMutationDataset())
+        collection.register_dataset_factory(MockMutationDataset.name, factory)
+
+        self.assertTrue(collection.contains(MockMutationDataset.name))
+        self.assertEqual(collection.get_dataset_names(), [MockMutationDataset.name])
+        factory.assert_not_called()
+
+        dataset = collection.get_dataset(MockMutationDataset.name)
+        self.assertIs(collection.get_dataset(MockMutationDataset.name), dataset)
+        self.assertEqual(list(collection), [dataset])
+        self.assertEqual(
+            collection.get_mutation_datasets_with_structure_pairs(), [dataset]
+        )
+        self.assertEqual(collection.get_dataset_names(), [MockMutationDataset.name])
+        factory.assert_called_once()
@@ -0,0 +1,72 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from helper import CONFIG
+from helper.datasets.pdb_index import get_structure_file_index, lookup_pdb_file_paths
+
+
+class PDBIndexTests(unittest.TestCase):
+    """Test looking up structure files in PDB mirrors"""
+
+    def setUp(self):
+        get_structure_file_index.cache_clear()
+
+    def tearDown(self):
+        get_structure_file_index.cache_clear()
+
+    def test_lookup_pdb_file_paths(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            prefix = CONFIG["PDB_FILE_INFO"]["PREFIX"]
+            suffix = CONFIG["PDB_FILE_INFO"]["SUFFIX"]
+            paths = {
+                "1G9V": tmpdir / "pdb" / f"{prefix}1g9v{suffix}",
+                "2RN2": tmpdir / "pdb" / "rn" / f"{prefix}2rn2{suffix}",
+                "1ABC": tmpdir / "obsolete" / "ab" / f"{prefix}1abc{suffix}",
+                "1CSB": tmpdir / "skempi" / "1CSB.pdb",
+                "d5zzwa_": tmpdir / "scope" / "zz" / "d5zzwa_.ent",
+            }
+            for path in paths.values():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.touch()
+            # ignored: obsolete structures outside the divided layout and other files
+            (tmpdir / "obsolete" / f"{prefix}1xyz{suffix}").touch()
+            (tmpdir / "pdb" / "rn" / "README").touch()
+
+            config_data = {
+                "PDB_DIR": str(tmpdir / "pdb"),
+                "PDB_OBSOLETE_DIR": str(tmpdir / "obsolete"),
+                "SKEMPI2_PDBS": str(tmpdir / "skempi"),
+                "SCOPE_DATA_DIR": str(tmpdir / "scope"),
+            }
+            with mock.patch.dict(CONFIG["DATA"], config_data), mock.patch.dict(
+                CONFIG["CACHE"], {"PDB_INDEX_DIR": str(tmpdir / "index")}
+            ):
+                ids = pd.Series(
+                    ["1g9v", "2RN2", "1ABC", "1XYZ", "9NOT"], index=[5, 6, 7, 8, 9]
+                )
+                df = lookup_pdb_file_paths(ids)
+                self.assertEqual(df.index.tolist(), ids.index.tolist())
+                self.assertEqual(
+                    df.tolist()[:3], [paths["1G9V"], paths["2RN2"], paths["1ABC"]]
+                )
+                self.assertTrue(df.iloc[3:].isna().all())
+
+                df = lookup_pdb_file_paths(ids, allow_obsolete=False)
+                self.assertTrue(df.iloc[2:].isna().all())
+
+                self.assertEqual(
+                    lookup_pdb_file_paths(pd.Series(["1csb"]), mirror="skempi2")[0],
+                    paths["1CSB"],
+                )
+                self.assertEqual(
+                    lookup_pdb_file_paths(pd.Series(["d5zzwa_"]), mirror="scope")[0],
+                    paths["d5zzwa_"],
+                )
+
+                # the index is persisted
+                self.assertEqual(len(list((tmpdir / "index").glob("*.json"))), 4)
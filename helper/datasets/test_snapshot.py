@@ -0,0 +1,97 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from helper import CONFIG, WILD_COL
+from helper.datasets.protherm import ProTherm
+from helper.cache import file_digest
+from helper.datasets.snapshot import SHARED_MODULES, evict, snapshot_key
+
+
+class SnapshotTests(unittest.TestCase):
+    """Test snapshots of parsed mutation data sets"""
+
+    def test_snapshot(self):
+        """Test that parsed single mutations are read from snapshots"""
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            protherm_csv = tmpdir / "protherm.csv"
+            lines = [
+                "pt_no,col1,protein,source,length,mol_weight,pir_id,swissprot_id,"
+                "e_c_number,pmd_no,pdb_wild,pdb_mutant,mutation,mutated_chain",
+                "2,,,,,,,,,,1BP2,,I 42 A,",
+                "2,,,,,,,,,,1G9V,2RN2,H 48 N,",
+            ]
+            with open(protherm_csv, "w") as f:
+                f.write("\n".join(lines))
+
+            with mock.patch.dict(
+                CONFIG["CACHE"], {"DATASET_SNAPSHOT_DIR": str(tmpdir / "snapshots")}
+            ):
+                dataset = ProTherm(protherm_csv)
+                df_all = dataset.read_single_mutations(pdb_mutant_only=False)
+                df_mut = dataset.read_single_mutations(pdb_mutant_only=True)
+                self.assertEqual(len(list((tmpdir / "snapshots").iterdir())), 2)
+
+                # later calls do not parse again
+                with mock.patch.object(ProTherm, "read") as read:
+                    pd.testing.assert_frame_equal(
+                        dataset.read_single_mutations(pdb_mutant_only=False), df_all
+                    )
+                    pd.testing.assert_frame_equal(
+                        dataset.read_single_mutations(True), df_mut
+                    )
+                    read.assert_not_called()
+
+                # a changed data set file is parsed again
+                with open(protherm_csv, "w") as f:
+                    f.write("\n".join(lines + ["2,,,,,,,,,,2LZM,,E 128 A,"]))
+                os.utime(protherm_csv, ns=(0, 0))
+                df = dataset.read_single_mutations(pdb_mutant_only=False)
+                self.assertEqual(df[WILD_COL].tolist(), ["1BP2", "1G9V", "2LZM"])
+                self.assertEqual(len(list((tmpdir / "snapshots").iterdir())), 2)
+
+            # without snapshot dir, data sets are parsed in every call
+            with mock.patch.dict(CONFIG["CACHE"], {"DATASET_SNAPSHOT_DIR": ""}):
+                with mock.patch.object(
+                    ProTherm, "read", autospec=True, side_effect=ProTherm.read
+                ) as read:
+                    dataset.read_single_mutations(pdb_mutant_only=False)
+                    dataset.read_single_mutations(pdb_mutant_only=False)
+                    self.assertEqual(read.call_count, 2)
+
+    def test_snapshot_key(self):
+        """Test that changes of shared parsing code change the snapshot key"""
+        dataset = ProTherm(Path("protherm.csv"))
+        key = snapshot_key(dataset, pdb_mutant_only=False)
+        self.assertEqual(key, snapshot_key(dataset, pdb_mutant_only=False))
+        self.assertNotEqual(key, snapshot_key(dataset, pdb_mutant_only=True))
+        for name in SHARED_MODULES:
+            changed_file = Path(importlib.util.find_spec(name).origin)
+            with mock.patch(
+                "helper.datasets.snapshot.file_digest",
+                side_effect=lambda path: (
+                    "changed" if path == changed_file else file_digest(path)
+                ),
+            ):
+                self.assertNotEqual(key, snapshot_key(dataset, pdb_mutant_only=False))
+
+    def test_evict(self):
+        """Test that least recently used snapshots are evicted beyond the maximum size"""
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            for i in range(4):
+                path = tmpdir / f"dataset{i}_all.pkl"
+                path.write_bytes(b"x" * 100)
+                os.utime(path, (i, i))
+            self.assertEqual(evict(tmpdir, max_size=250), 2)
+            self.assertEqual(
+                sorted(p.name for p in tmpdir.iterdir()),
+                ["dataset2_all.pkl", "dataset3_all.pkl"],
+            )
+            self.assertEqual(evict(tmpdir, max_size=250), 0)
@@ -6,6 +6,7 @@ import pandas as pd
 
 import helper
 from helper.datasets.dataset import MutationDataset
+from helper.datasets.snapshot import snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +49,7 @@ class ThermoMutDB(MutationDataset):
         with open(self.file_path, "r") as f:
             return pd.DataFrame(json.load(f))
 
+    @snapshot
     def read_single_mutations(self, pdb_mutant_only: bool):
         """Read all valid single mutations in the ThermoMutDB data set to table.
 
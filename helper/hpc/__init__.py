@@ -1,7 +1,31 @@
 """
 The :mod:`hpc` module contains functionality for distribute work on the ZBHs SGE HPC.
+
+The exports are imported on first access, so that the command line tools of the tasks
+(e.g. ``python -m helper.hpc.node_cache``) start without importing pandas.
 """
-from . import distribute_csv
-from .distribute_csv import distribute_csv
+import importlib
+
+# exports by module
+_EXPORTS = {
+    "distribute_csv": ".distribute_csv",
+    "EXECUTORS": ".executors",
+    "LocalExecutor": ".executors",
+    "SGEExecutor": ".executors",
+}
+
+__all__ = ["distribute_csv", "EXECUTORS", "LocalExecutor", "SGEExecutor"]
+
+
+def __getattr__(name: str):
+    """Import the exports on first access (PEP 562).
 
-__all__ = ["distribute_csv"]
+    :param name: Name of the attribute.
+    :return: The exported object.
+    """
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    # the function distribute_csv shadows its module (set as attribute by the import)
+    globals()[name] = value
+    return value
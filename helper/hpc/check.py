@@ -1,5 +1,6 @@
 import logging
 from pathlib import Path
+from typing import Optional
 
 import pandas as pd
 
@@ -9,28 +10,35 @@ logger = logging.getLogger(__name__)
 
 
 def sanity_check_microminer_result_dir(
-    result_dir: Path, input_df: pd.DataFrame
+    result_dir: Path, input_df: pd.DataFrame, nof_result_files: Optional[int] = None
 ) -> bool:
     """Performs a sanity check on the results from the cluster run.
 
     :param result_dir: Directory with results.
     :param input_df: Dataframe with query data.
+    :param nof_result_files: Number of resultStatistic.csv files if already known (e.g.
+                             counted while collecting results). The result dir is scanned
+                             otherwise.
     :return: True if result seem sane, false otherwise.
     """
-    files = [
-        p for p in helper.utils.scantree(result_dir) if p.name == "resultStatistic.csv"
-    ]
+    if nof_result_files is None:
+        nof_result_files = sum(
+            1
+            for _ in helper.utils.scantree(
+                result_dir, name="resultStatistic.csv", threads=16
+            )
+        )
     is_sane = True
-    if len(files) != input_df.shape[0]:
+    if nof_result_files != input_df.shape[0]:
         logger.warning(
-            f"Number of resultStatistic.csv differs from input rows: file={len(files)}"
+            f"Number of resultStatistic.csv differs from input rows: file={nof_result_files}"
             f" rows={input_df.shape[0]} in dir={result_dir.resolve()}"
         )
         is_sane = False
     else:
         logger.info(
             f"Check successful: Number of resultStatistic.csv equals input rows:"
-            f" file={len(files)}"
+            f" file={nof_result_files}"
             f" rows={input_df.shape[0]} in dir={result_dir.resolve()}"
         )
     return is_sane
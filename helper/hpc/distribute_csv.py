@@ -1,17 +1,28 @@
-import getpass
 import json
 import logging
 import pickle
-import subprocess
+import shutil
 import tempfile
 import time
-from collections import namedtuple
+from collections import Counter, namedtuple
 from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
 
 import pandas as pd
 
 from .check import sanity_check_microminer_result_dir
-from .sge import SGEJobRunner
+from .ingest import ShardIngester, generate_shard_script
+from .monitor import STAGING_REPORT_SUFFIX, generate_task_marker_script
+from .retry import failing_hosts, host_exclusion, lost_rows_report, rows_without_result
+from .scheduling import (
+    estimate_costs,
+    find_perf_files,
+    read_perf_timings,
+    schedule_longest_first,
+    task_ranges,
+)
+from .executors import SGEExecutor
+from helper import telemetry
 from helper.constants import CONFIG
 from helper.runners import MicroMinerPair, MicroMinerSearch
 
@@ -39,39 +50,53 @@ def get_chunksize(runner, cpus, input_rows):
     return default_chunksize()
 
 
-def generate_microminer_preparation_script():
+def generate_microminer_preparation_script(python_executable: str = "python"):
     """
     Generates a Bash script that prepares necessary files for executing
     MicroMiner (mainly the k-mer look-up index).
+
+    The index is staged in the cache on the local disc of the node (see node_cache). The
+    first task on a node copies it, all other tasks wait and reuse the copy, also in later
+    jobs. How the index was obtained is appended to the staging report of the task.
+    :param python_executable: Python interpreter of the tasks.
     :return: The Bash script as string.
     """
-    kmer_index = CONFIG["DATABASES"]["SITE_SEARCH_DB"]
-    user = getpass.getuser()
     return f"""#! /bin/bash
     
 # This script should be executed from the job script at the HPC node.
 
-# create a cache dir for the necessary files on the local node.
-cache_dir_name="microminer_distributed_cache"
-node_index_dir_suffix="{user}/${{cache_dir_name}}"
-node_index_dir="/local/${{node_index_dir_suffix}}"
-# if [ -d "/ssd_local" ]; then
-#     node_index_dir="/ssd_local/${{node_index_dir_suffix}}"
-# elif [ -d "/local" ]; then
-#     node_index_dir="/local/${{node_index_dir_suffix}}"
-# else
-#     echo "Node has no expected drive! Abort"
-#     exit 1
-# fi
-mkdir -p ${{node_index_dir}}
-
-# copy the index (might take a while if not cached)
-# rsync -ra {kmer_index}* ${{node_index_dir}}
+# copy the index to the local disc of this node (might take a while if not cached)
+node_index=$({python_executable} -m helper.hpc.node_cache index \\
+  --report "${{TASK_MARKER_DIR}}/${{SGE_TASK_ID}}{STAGING_REPORT_SUFFIX}")
+if [ $? -ne 0 ] || [ -z "${{node_index}}" ]; then
+  echo "$0: Can't stage the k-mer index!"
+  exit 1
+fi
 
 # create an environment variable for the helper config to specify this nodes
 #   location of the lookup index.
 # NOTE: that this script must be sourced by the calling script.
-export SITE_SEARCH_DB="${{node_index_dir}}/$(basename {kmer_index})"
+export SITE_SEARCH_DB="${{node_index}}"
+"""
+
+
+def generate_structure_staging_script(python_executable: str = "python"):
+    """
+    Generates Bash code for the job script that copies the structure files of the input
+    file of a task to the cache on the local disc of the node (see node_cache) and points
+    the input file to the copies. Tasks on the same node share the copies, so every
+    structure file is read from network storage once per node.
+    :param python_executable: Python interpreter of the tasks.
+    :return: The Bash code as string.
+    """
+    return f"""
+# copy the structure files of this task to the local disc of this node
+{python_executable} -m helper.hpc.node_cache structures --input "${{THIS_INPUT_FILE}}" \\
+  --report "${{TASK_MARKER_DIR}}/${{SGE_TASK_ID}}{STAGING_REPORT_SUFFIX}"
+if [ $? -ne 0 ]; then
+  echo "$0: Can't stage the structure files!"
+  exit 1
+fi
 """
 
 
@@ -84,9 +109,27 @@ def generate_runner_script(
     and writes the runners results to a result dir.
 
     This script is intended as the interface to this helper module on the HPC cluster.
+    Runners that can write their parsed output to a perf file do so, so that later runs
+    can schedule by the timings. If telemetry is enabled, tasks record their events in the
+    result dir.
     :param runner: A runner instance.
     :return: The Python script as string.
     """
+    if hasattr(runner, "run_to_tsv"):
+        run_call = (
+            "runner.run_to_tsv(param_tsv=Path(str(sys.argv[1])), outdir=Path(str(sys.argv[2])),"
+            " perf_tsv=Path(str(sys.argv[2])) / 'perf.tsv')"
+        )
+    else:
+        run_call = "runner.run(param_tsv=Path(str(sys.argv[1])), outdir=Path(str(sys.argv[2])))"
+    telemetry_call = ""
+    if telemetry.telemetry_dir() is not None:
+        # events are collected with the results of the task
+        telemetry_call = (
+            "from helper import telemetry\n"
+            "telemetry.enable(Path(str(sys.argv[2])) / 'telemetry',"
+            f" **{telemetry.get_context()!r})"
+        )
     return f"""
 # mini python runner script
 from helper.runners import {type(runner).__name__}
@@ -99,7 +142,8 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
                     handlers=[logging.StreamHandler(sys.stdout)])
 runner = pickle.loads({pickle.dumps(runner)})
-runner.run(param_tsv=Path(str(sys.argv[1])), outdir=Path(str(sys.argv[2])))
+{telemetry_call}
+{run_call}
 """
 
 
@@ -112,13 +156,18 @@ def generate_hpc_script(
     stderr_file: Path,
     nof_jobs: int,
     cpus: int,
-    conda_bin_path: Path,
-    conda_env_name: str,
+    conda_bin_path: Optional[Path],
+    conda_env_name: Optional[str],
     queues: list,
     add_to_pythonpath: list,
     runner_script_path: Path,
     prepare_script_path: Path,
-    chunksize: int,
+    task_ranges_file: Path,
+    task_marker_dir: Path,
+    shard_dir: Path,
+    excluded_hosts: Set[str] = frozenset(),
+    python_executable: str = "python",
+    stage_structures: bool = False,
     copy_ssh: list = [],
 ):
     newline = "\n"
@@ -133,15 +182,18 @@ def generate_hpc_script(
 # -S /bin/bash
 # -l os=42.2
 # -l mem_free=1G
-# exclude nodes which disc storage is too small to hold the PDB locally. TODO: they might change
+# exclude nodes which disc storage is too small to hold the PDB locally (EXCLUDED_HOSTS in
+# the config) and nodes with repeatedly failing tasks.
 # we need to use PDB locally because the number of reads per sec is too much for the NFS at /data
-# effectively killing the HPC nodes. 
-#$ -l h='!node113'
+# effectively killing the HPC nodes. Structure files are therefore read from the node cache.
+{f"#$ -l h='{host_exclusion(excluded_hosts)}'" if len(excluded_hosts) > 0 else ''}
 
 
 # avoid core dumps. 
 ulimit -c 0
 
+# completion markers of this task for monitoring the job
+{generate_task_marker_script(task_marker_dir)}
 GLOBAL_WORK_DIR="{global_working_dir.resolve()}"
 LOCAL_WORK_DIR="{local_working_dir}"
 INPUT_FILE="{input_file.resolve()}"
@@ -159,9 +211,9 @@ if [ $? -ne 0 ]; then
   exit 1
 fi
 
-# source the conda env
+{f'''# source the conda env
 export PATH="{str(conda_bin_path)}:${{PATH}}"
-source activate {conda_env_name}
+source activate {conda_env_name}''' if conda_bin_path is not None else ''}
 
 # use this_tmpdir as a source for python packages/scripts
 export PYTHONPATH="${{THIS_TMPDIR}}:${{PYTHONPATH}}"
@@ -174,48 +226,66 @@ export PYTHONPATH="${{THIS_TMPDIR}}:${{PYTHONPATH}}"
 # run/source preparation script
 source {prepare_script_path.resolve()}
 
+# first input row (0-based) and number of input rows of this task
+read startline nof_rows <<< $(sed -n "${{SGE_TASK_ID}}p" "{task_ranges_file.resolve()}")
 THIS_INPUT_FILE="${{THIS_TMPDIR}}/input.tsv"
-startline=$(( ($SGE_TASK_ID - 1) * {chunksize} ))
 head -n1 ${{INPUT_FILE}} > ${{THIS_INPUT_FILE}}
-tail -n "+$((startline+2))" ${{INPUT_FILE}} | head -n {chunksize} >> ${{THIS_INPUT_FILE}}
+tail -n "+$((startline+2))" ${{INPUT_FILE}} | head -n ${{nof_rows}} >> ${{THIS_INPUT_FILE}}
+{generate_structure_staging_script(python_executable) if stage_structures else ''}
 
 THIS_RESULTS_DIR="${{THIS_TMPDIR}}/results"
 mkdir ${{THIS_RESULTS_DIR}}
 
-echo "Calling: python {runner_script_path.resolve()} ${{THIS_INPUT_FILE}} ${{THIS_TMPDIR}}"
-python {runner_script_path.resolve()} "${{THIS_INPUT_FILE}}" "${{THIS_RESULTS_DIR}}"
+echo "Calling: {python_executable} {runner_script_path.resolve()} ${{THIS_INPUT_FILE}} ${{THIS_TMPDIR}}"
+{python_executable} {runner_script_path.resolve()} "${{THIS_INPUT_FILE}}" "${{THIS_RESULTS_DIR}}"
+RUNNER_EXIT_CODE=$?
 
-# collect results back in global working dir
-rsync -ra "${{THIS_RESULTS_DIR}}/" "${{GLOBAL_WORK_DIR}}/results"
+# give the completion journal of this task a unique name among the journals of all tasks
+if [ -f "${{THIS_RESULTS_DIR}}/journal.tsv" ]; then
+  mv "${{THIS_RESULTS_DIR}}/journal.tsv" "${{THIS_RESULTS_DIR}}/journal_${{JOB_ID}}_${{SGE_TASK_ID}}.tsv"
+fi
+if [ -f "${{THIS_RESULTS_DIR}}/perf.tsv" ]; then
+  mv "${{THIS_RESULTS_DIR}}/perf.tsv" "${{THIS_RESULTS_DIR}}/perf_${{JOB_ID}}_${{SGE_TASK_ID}}.tsv"
+fi
 
+# pack results into a single shard in the global working dir
+{generate_shard_script("${THIS_RESULTS_DIR}", shard_dir)}
 # clean up
 rm -r ${{THIS_TMPDIR}}
 
 echo "FINISHED das Script"
+# the exit code ends up in the completion marker of this task
+exit ${{RUNNER_EXIT_CODE}}
 """
 
 
-def distribute_csv(
-    dataset_file: Path, runner, outdir: Path, job_name: str, cpus: int = 1
-) -> None:
-    """Distributes the computation across the SGE cluster. Each row in the input CSV
-    corresponds to a single computation. This function splits the input rows
-    in chunks and submits the computation to the SGE cluster.
+def _submit_rows(
+    df: pd.DataFrame,
+    runner,
+    outdir: Path,
+    job_name: str,
+    cpus: int,
+    excluded_hosts: Set[str],
+    executor,
+) -> Tuple[Dict, pd.Series, int]:
+    """Computes input rows in a single SGE array job and collects the results in outdir.
 
-    :param dataset_file: The input dataset file (the input data).
+    The cost of every row is estimated from timings of earlier runs in outdir or from the
+    size of its structure files. Rows are bin-packed into tasks of roughly equal cost with
+    the most expensive rows first (see schedule_longest_first).
+
+    :param df: The input rows.
     :param runner: The runner class (defines what will be computed)
     :param outdir: Directory to write results.
     :param job_name: A name for the SGE job.
     :param cpus: Number of cores to use.
-    :return: None
+    :param excluded_hosts: Hosts the tasks must not run on.
+    :param executor: Backend that executes the array job (see executors).
+    :return: Final progress of the job (see JobMonitor.progress), the task number
+             (starting at 0) of every input row and the number of collected
+             resultStatistic.csv files.
     """
-    df = pd.read_csv(dataset_file, sep="\t", header=0)
-
-    if df.shape[0] == 0:
-        raise ValueError("Input data empty")
-
     tmpdir_name = time.strftime("%Y%m%d_%H%M%S")
-    cpus = max(1, cpus)
 
     chunksize = get_chunksize(runner, cpus, df.shape[0])
     nof_jobs, extra = divmod(df.shape[0], chunksize)
@@ -224,21 +294,29 @@ def distribute_csv(
     assert nof_jobs <= df.shape[0]
     assert nof_jobs * chunksize >= df.shape[0]
 
-    with tempfile.TemporaryDirectory(
-        dir=CONFIG["HPC"]["HPC_WORKING_DIR"], prefix=tmpdir_name
-    ) as t:
+    costs = estimate_costs(df, read_perf_timings(find_perf_files(outdir)))
+    schedule = schedule_longest_first(costs, nof_jobs)
+    df = df.loc[schedule.index]
+
+    with tempfile.TemporaryDirectory(dir=executor.working_dir, prefix=tmpdir_name) as t:
         tmpdir = Path(t)
 
         # write input parameter file to disc
         input_tsv_path = tmpdir / "input.tsv"
         df.to_csv(input_tsv_path, sep="\t", header=True, index=False)
+        task_ranges_path = tmpdir / "task_ranges.tsv"
+        task_ranges(schedule, nof_jobs).to_csv(
+            task_ranges_path, sep="\t", header=False, index=False
+        )
 
         (tmpdir / "cluster_out").mkdir()
 
         # preparation script to set up environment (copy additional data etc.)
         prepare_script_str = ""
-        if type(runner) == MicroMinerSearch:
-            prepare_script_str = generate_microminer_preparation_script()
+        if type(runner) == MicroMinerSearch and executor.stages_files:
+            prepare_script_str = generate_microminer_preparation_script(
+                executor.python_executable
+            )
         prepare_script_path = tmpdir / "prepare.sh"
         with open(prepare_script_path, "w") as f:
             f.write(prepare_script_str)
@@ -250,58 +328,150 @@ def distribute_csv(
         with open(runner_script_path, "w") as f:
             f.write(runner_script_str)
 
-        (tmpdir / "results").mkdir()
-
         # the SGE cluster job script
         job_script_str = generate_hpc_script(
             job_name=job_name,
             global_working_dir=tmpdir,
-            local_working_dir=CONFIG["HPC"]["HPC_LOCAL_WORKING_DIR"],
+            local_working_dir=executor.local_working_dir,
             input_file=tmpdir / "input.tsv",
             stdout_file=tmpdir / "cluster_out",
             stderr_file=tmpdir / "cluster_out",
             nof_jobs=nof_jobs,
             cpus=cpus,
             queues=ALL_QUEUES,
-            conda_bin_path=Path(CONFIG["HPC"]["CONDA_BIN_PATH"]),
-            conda_env_name=CONFIG["HPC"]["CONDA_ENV_NAME"],
+            conda_bin_path=executor.conda_bin_path,
+            conda_env_name=executor.conda_env_name,
             # copy_ssh=[this_py_module],
-            add_to_pythonpath=[Path(CONFIG["HPC"]["PYPATH_PATHS"])],
+            add_to_pythonpath=executor.pythonpath,
             runner_script_path=runner_script_path,
             prepare_script_path=prepare_script_path,
-            chunksize=chunksize,
+            task_ranges_file=task_ranges_path,
+            task_marker_dir=tmpdir / "cluster_out" / "task_status",
+            shard_dir=tmpdir / "shards",
+            excluded_hosts=excluded_hosts,
+            python_executable=executor.python_executable,
+            stage_structures=executor.stages_files,
         )
         # print(job_script_str)
         with open(tmpdir / "job_script", "w") as f:
             f.write(job_script_str)
 
-        SGEJobRunner.submit_and_wait(tmpdir / "job_script")
+        # results of finished tasks are moved to the outdir while the job is running
+        ingester = ShardIngester(tmpdir / "shards", outdir / "results")
+        progress = executor.submit_and_wait(
+            tmpdir / "job_script",
+            nof_tasks=nof_jobs,
+            max_parallel_tasks=cpus,
+            marker_dir=tmpdir / "cluster_out" / "task_status",
+            log_dir=tmpdir / "cluster_out",
+            callback=ingester.ingest,
+        )
 
-        # rsync the results to the outdir
-        cmd_call = [
-            "rsync",
-            "-ra",
-            "--info=progress2",
-            (tmpdir / "results").resolve(),
-            outdir.resolve(),
-        ]
-        res = subprocess.run(cmd_call, stdout=subprocess.PIPE)
-        if res.returncode != 0:
-            logger.error(res)
-            raise ValueError("Encountered problem {}".format(res))
-
-        # rsync stdout/err of HPC jobs to a log dir
-        cmd_call = [
-            "rsync",
-            "-ra",
-            "--info=progress2",
-            (tmpdir / "cluster_out").resolve(),
-            outdir.resolve(),
+        # copy stdout/err of HPC jobs to a log dir
+        shutil.copytree(
+            tmpdir / "cluster_out", outdir / "cluster_out", dirs_exist_ok=True
+        )
+    return progress, schedule, ingester.nof_result_files
+
+
+def distribute_csv(
+    dataset_file: Path,
+    runner,
+    outdir: Path,
+    job_name: str,
+    cpus: int = 1,
+    executor=None,
+) -> None:
+    """Distributes the computation across the SGE cluster. Each row in the input CSV
+    corresponds to a single computation. This function splits the input rows
+    in chunks and submits the computation to the SGE cluster (or another backend).
+
+    Rows that have no result after the job finished (e.g. because a node died or a task
+    was preempted) are resubmitted as a follow-up job, up to MAX_RETRIES times (see HPC
+    section of the config). Hosts with NODE_MAX_FAILURES failed tasks are excluded from
+    follow-up jobs. Rows still without result are reported in lost_rows.tsv in outdir.
+
+    :param dataset_file: The input dataset file (the input data).
+    :param runner: The runner class (defines what will be computed)
+    :param outdir: Directory to write results.
+    :param job_name: A name for the SGE job.
+    :param cpus: Number of cores to use.
+    :param executor: Backend that executes the array jobs (see executors). Default is
+                     the SGE cluster.
+    :return: None
+    """
+    df_input = pd.read_csv(dataset_file, sep="\t", header=0)
+
+    if df_input.shape[0] == 0:
+        raise ValueError("Input data empty")
+
+    df = df_input
+    if getattr(runner, "resume", False):
+        # only compute what did not finish successfully in earlier runs
+        df = runner.unfinished_rows(df_input, outdir / "results")
+        if df.shape[0] == 0:
+            logger.info("All input rows finished in earlier runs. Nothing to compute.")
+            return
+
+    cpus = max(1, cpus)
+    if executor is None:
+        executor = SGEExecutor()
+    max_retries = int(CONFIG["HPC"]["MAX_RETRIES"])
+    node_max_failures = int(CONFIG["HPC"]["NODE_MAX_FAILURES"])
+    excluded_hosts = set(json.loads(CONFIG["HPC"]["EXCLUDED_HOSTS"]))
+    host_failures = Counter()
+
+    df_todo = df
+    nof_result_files = 0
+    for attempt in range(max_retries + 1):
+        submitted_at = time.time()
+        progress, schedule, nof_files = _submit_rows(
+            df_todo, runner, outdir, job_name, cpus, excluded_hosts, executor
+        )
+        nof_result_files += nof_files
+
+        # rows without journal entry were lost with their task
+        df_todo = df_todo[
+            rows_without_result(
+                runner.row_ids(df_todo), outdir / "results", submitted_at
+            )
         ]
-        res = subprocess.run(cmd_call, stdout=subprocess.PIPE)
-        if res.returncode != 0:
-            logger.error(res)
-            raise ValueError("Encountered problem {}".format(res))
 
-        if type(runner) == MicroMinerSearch or type(runner) == MicroMinerPair:
-            is_sane = sanity_check_microminer_result_dir(outdir / "results", df)
+        host_failures.update(failing_hosts(progress["tasks"]))
+        failed_hosts = {
+            host for host, n in host_failures.items() if n >= node_max_failures
+        }
+        if len(failed_hosts - excluded_hosts) > 0:
+            logger.warning(
+                f"Excluding hosts with repeatedly failing tasks:"
+                f" {sorted(failed_hosts - excluded_hosts)}"
+            )
+            excluded_hosts |= failed_hosts
+
+        if df_todo.shape[0] == 0:
+            break
+        if attempt < max_retries:
+            logger.warning(
+                f"{df_todo.shape[0]} input rows have no result. Resubmitting them"
+                f" (retry {attempt + 1} of {max_retries})."
+            )
+
+    lost_rows_path = outdir / "lost_rows.tsv"
+    if df_todo.shape[0] > 0:
+        lost_rows_report(df_todo, schedule, progress["tasks"], attempt + 1).to_csv(
+            lost_rows_path, sep="\t", header=True, index=False
+        )
+        logger.error(
+            f"{df_todo.shape[0]} input rows have no result after {attempt + 1}"
+            f" attempts. See {lost_rows_path}"
+        )
+    elif lost_rows_path.is_file():
+        # report of an earlier run
+        lost_rows_path.unlink()
+
+    if type(runner) == MicroMinerSearch or type(runner) == MicroMinerPair:
+        is_sane = sanity_check_microminer_result_dir(
+            outdir / "results",
+            df,
+            nof_result_files=nof_result_files,
+        )
@@ -0,0 +1,153 @@
+"""Backends that execute the array jobs of distribute_csv."""
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from .monitor import JobMonitor
+from .sge import SGEJobRunner
+from helper.constants import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class SGEExecutor:
+    """Runs array jobs on the SGE cluster (ZBH in-house cluster).
+
+    Tasks run on cluster nodes in the conda environment and with the paths of the HPC
+    section of the config.
+    """
+
+    name = "sge"
+    # whether tasks need the preparation script that stages files on the node
+    stages_files = True
+
+    def __init__(self):
+        """Create a new executor with the settings of the HPC section of the config."""
+        self.working_dir = Path(CONFIG["HPC"]["HPC_WORKING_DIR"])
+        self.local_working_dir = CONFIG["HPC"]["HPC_LOCAL_WORKING_DIR"]
+        self.conda_bin_path = Path(CONFIG["HPC"]["CONDA_BIN_PATH"])
+        self.conda_env_name = CONFIG["HPC"]["CONDA_ENV_NAME"]
+        self.pythonpath = [Path(CONFIG["HPC"]["PYPATH_PATHS"])]
+        self.python_executable = "python"
+
+    def submit_and_wait(
+        self,
+        job_script: Path,
+        nof_tasks: int,
+        max_parallel_tasks: int,
+        marker_dir: Path,
+        log_dir: Path,
+        callback: Optional[Callable[[Dict], None]] = None,
+    ) -> Dict:
+        """Submits an array job and waits for completion.
+
+        :param job_script: Path to the job script.
+        :param nof_tasks: Number of array tasks.
+        :param max_parallel_tasks: Maximum number of concurrently running tasks. Set in
+                                   the job script for SGE.
+        :param marker_dir: Directory of the completion markers of the tasks.
+        :param log_dir: Directory for standard out and error of the tasks. Set in the job
+                        script for SGE.
+        :param callback: Function called with the progress of the job while waiting.
+        :return: Final progress summary of the job (see JobMonitor.progress).
+        """
+        return SGEJobRunner.submit_and_wait(
+            job_script, nof_tasks=nof_tasks, marker_dir=marker_dir, callback=callback
+        )
+
+
+class LocalExecutor:
+    """Runs array jobs with a pool of processes on the local machine.
+
+    Runs the same job script as on the cluster, with the SGE environment variables of
+    every task, so that chunking, per-task scratch dirs and result collection can be run
+    and benchmarked on a single machine. Tasks use the Python interpreter and helper
+    module of the calling process.
+    """
+
+    name = "local"
+    stages_files = False
+
+    def __init__(self, working_dir: Optional[Path] = None):
+        """Create a new executor.
+
+        :param working_dir: Directory for the working dirs of jobs and the scratch dirs of
+                            tasks. Default is a directory in the system temp dir.
+        """
+        if working_dir is None:
+            working_dir = Path(tempfile.gettempdir()) / "microminer_distributed"
+        working_dir.mkdir(parents=True, exist_ok=True)
+        self.working_dir = working_dir
+        self.local_working_dir = str(working_dir.resolve() / "local")
+        self.conda_bin_path = None
+        self.conda_env_name = None
+        self.pythonpath = [Path(__file__).resolve().parent.parent.parent]
+        self.python_executable = sys.executable
+
+    def submit_and_wait(
+        self,
+        job_script: Path,
+        nof_tasks: int,
+        max_parallel_tasks: int,
+        marker_dir: Path,
+        log_dir: Path,
+        callback: Optional[Callable[[Dict], None]] = None,
+    ) -> Dict:
+        """Runs all tasks of an array job and waits for completion.
+
+        :param job_script: Path to the job script.
+        :param nof_tasks: Number of array tasks.
+        :param max_parallel_tasks: Maximum number of concurrently running tasks.
+        :param marker_dir: Directory of the completion markers of the tasks.
+        :param log_dir: Directory for standard out and error of the tasks.
+        :param callback: Function called with the progress of the job while waiting.
+        :return: Final progress summary of the job (see JobMonitor.progress).
+        :raises OSError: If a task could not be run, e.g. because bash is missing.
+        """
+        # unique among all jobs, like SGE job ids
+        job_id = str(time.time_ns())
+        log_dir.mkdir(parents=True, exist_ok=True)
+
+        def run_task(task_id: int) -> int:
+            env = dict(os.environ, JOB_ID=job_id, SGE_TASK_ID=str(task_id))
+            log_prefix = log_dir / f"{job_script.name}"
+            with open(f"{log_prefix}.o{job_id}.{task_id}", "wb") as out, open(
+                f"{log_prefix}.e{job_id}.{task_id}", "wb"
+            ) as err:
+                return subprocess.run(
+                    ["bash", str(job_script.resolve())],
+                    cwd=job_script.parent,
+                    env=env,
+                    stdout=out,
+                    stderr=err,
+                ).returncode
+
+        logger.info(
+            f"Running {nof_tasks} tasks of {job_script} with {max_parallel_tasks}"
+            f" local processes"
+        )
+        with ThreadPoolExecutor(max(1, max_parallel_tasks)) as pool:
+            futures = [pool.submit(run_task, t) for t in range(1, nof_tasks + 1)]
+            progress = JobMonitor(
+                job_id,
+                nof_tasks,
+                marker_dir=marker_dir,
+                callback=callback,
+                is_alive=lambda: not all(f.done() for f in futures),
+            ).wait()
+        # tasks that could not be run at all would otherwise only look like lost tasks
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        for e in errors:
+            logger.error(f"Could not run task of {job_script}: {e}")
+        if len(errors) > 0:
+            raise errors[0]
+        return progress
+
+
+EXECUTORS = {SGEExecutor.name: SGEExecutor, LocalExecutor.name: LocalExecutor}
@@ -0,0 +1,87 @@
+"""Collection of result shards of HPC tasks while the job is running."""
+import logging
+import tarfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SHARD_SUFFIX = ".tar"
+# name of the MicroMiner result files counted during ingestion
+RESULT_CSV = "resultStatistic.csv"
+
+
+def generate_shard_script(results_dir: str, shard_dir: Path) -> str:
+    """Generates Bash code for a job script that packs the results of its task into a
+    single archive (shard) in the shard directory.
+
+    The shard is written under a temporary name and renamed when complete, so that
+    incomplete shards are never ingested.
+
+    :param results_dir: Results directory of the task (may reference shell variables).
+    :param shard_dir: Directory for the shards. Must be accessible from all nodes and
+                      the submitting host.
+    :return: The Bash code as string.
+    """
+    return f"""SHARD_DIR="{shard_dir.resolve()}"
+SHARD="${{SHARD_DIR}}/task_${{JOB_ID}}_${{SGE_TASK_ID}}{SHARD_SUFFIX}"
+mkdir -p "${{SHARD_DIR}}"
+tar -cf "${{SHARD}}.tmp" -C "{results_dir}" . && mv "${{SHARD}}.tmp" "${{SHARD}}"
+if [ $? -ne 0 ]; then
+  echo "$0: Can't write result shard!"
+  rm -f "${{SHARD}}.tmp"
+  RUNNER_EXIT_CODE=1
+fi
+"""
+
+
+class ShardIngester:
+    """Moves result shards of finished HPC tasks into the final result directory.
+
+    Each call of ingest() extracts all complete shards written since the last call and
+    removes them, so that results of a running job are available in the result
+    directory as soon as their task finished.
+    """
+
+    def __init__(self, shard_dir: Path, result_dir: Path):
+        """Create a new ingester.
+
+        :param shard_dir: Directory the tasks write their shards to.
+        :param result_dir: Directory to extract the shards to.
+        """
+        self.shard_dir = shard_dir
+        self.result_dir = result_dir
+        self.nof_shards = 0
+        self.nof_result_files = 0
+
+    def ingest(self, *args) -> int:
+        """Extract and remove all complete shards.
+
+        Takes (and ignores) arbitrary arguments, so that it can be used as callback of a
+        JobMonitor.
+
+        :return: Number of shards ingested by this call.
+        """
+        if not self.shard_dir.is_dir():
+            return 0
+        shards = sorted(self.shard_dir.glob(f"*{SHARD_SUFFIX}"))
+        if len(shards) == 0:
+            return 0
+        self.result_dir.mkdir(parents=True, exist_ok=True)
+        for shard in shards:
+            with tarfile.open(shard, "r") as tar:
+                members = tar.getmembers()
+                if hasattr(tarfile, "data_filter"):
+                    tar.extractall(self.result_dir, members=members, filter="data")
+                else:
+                    tar.extractall(self.result_dir, members=members)
+            self.nof_result_files += sum(
+                m.isfile() and Path(m.name).name == RESULT_CSV for m in members
+            )
+            # only remove after extraction, so that an interrupted ingest can be repeated
+            shard.unlink()
+        self.nof_shards += len(shards)
+        logger.info(
+            f"Ingested {len(shards)} result shards into {self.result_dir}"
+            f" ({self.nof_shards} shards, {self.nof_result_files} {RESULT_CSV} in total)"
+        )
+        return len(shards)
@@ -0,0 +1,295 @@
+"""Monitoring of SGE array jobs by per-task completion markers."""
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+START_MARKER_SUFFIX = ".start"
+DONE_MARKER_SUFFIX = ".done"
+# staging reports of tasks (see node_cache.write_staging_report)
+STAGING_REPORT_SUFFIX = ".stage"
+
+
+def generate_task_marker_script(marker_dir: Path) -> str:
+    """Generates Bash code for a job script that writes completion markers of its task.
+
+    A start marker (host and start time) is written immediately. The done marker (exit
+    code of the job script, host, start and end time) is written when the job script
+    exits for any reason. Markers are named by the SGE task id.
+
+    :param marker_dir: Directory for the markers. Must be accessible from all nodes.
+    :return: The Bash code as string.
+    """
+    return f"""TASK_MARKER_DIR="{marker_dir.resolve()}"
+TASK_START=$(date +%s.%N)
+mkdir -p "${{TASK_MARKER_DIR}}"
+echo -e "$(hostname)\\t${{TASK_START}}" > "${{TASK_MARKER_DIR}}/${{SGE_TASK_ID}}{START_MARKER_SUFFIX}"
+write_done_marker() {{
+  local exit_code=$?
+  local marker="${{TASK_MARKER_DIR}}/${{SGE_TASK_ID}}{DONE_MARKER_SUFFIX}"
+  echo -e "${{exit_code}}\\t$(hostname)\\t${{TASK_START}}\\t$(date +%s.%N)" > "${{marker}}.tmp"
+  mv "${{marker}}.tmp" "${{marker}}"
+}}
+trap write_done_marker EXIT
+"""
+
+
+def read_task_markers(marker_dir: Path) -> Dict[int, Dict]:
+    """Read the completion markers of all tasks of a job.
+
+    :param marker_dir: Directory of the markers (see generate_task_marker_script).
+    :return: Dict mapping task ids to the state of the task ("running" or "done"), its
+             host, start time and, for finished tasks, exit code and end time. Tasks that
+             staged files on their node also have a "staging" dict mapping the names of
+             the staged files to their source ("cached", "copied" or "network") and the
+             staging time in seconds.
+    """
+    tasks = {}
+    if not marker_dir.is_dir():
+        return tasks
+    with os.scandir(marker_dir) as it:
+        suffixes = [START_MARKER_SUFFIX, DONE_MARKER_SUFFIX, STAGING_REPORT_SUFFIX]
+        entries = sorted(
+            (e.name for e in it if "." + e.name.partition(".")[2] in suffixes),
+            # read start markers first, so that done markers overwrite them, and staging
+            # reports last to add them to the task states
+            key=lambda n: suffixes.index("." + n.partition(".")[2]),
+        )
+    for name in entries:
+        task, _, suffix = name.partition(".")
+        if not task.isdigit():
+            continue
+        try:
+            with open(marker_dir / name, "r") as f:
+                content = f.read()
+            fields = content.strip().split("\t")
+            if "." + suffix == STAGING_REPORT_SUFFIX:
+                if int(task) not in tasks:
+                    continue
+                staging = {}
+                for line in content.splitlines():
+                    fields = line.split("\t")
+                    staging[fields[0]] = {
+                        "source": fields[1],
+                        "seconds": float(fields[2]),
+                        "nof_files": int(fields[3]),
+                    }
+                tasks[int(task)]["staging"] = staging
+            elif "." + suffix == START_MARKER_SUFFIX:
+                tasks[int(task)] = {
+                    "state": "running",
+                    "host": fields[0],
+                    "start": float(fields[1]),
+                }
+            else:
+                tasks[int(task)] = {
+                    "state": "done",
+                    "exit_code": int(fields[0]),
+                    "host": fields[1],
+                    "start": float(fields[2]),
+                    "end": float(fields[3]),
+                }
+        except (OSError, IndexError, ValueError):
+            # marker removed or written meanwhile
+            continue
+    return tasks
+
+
+def summarize_progress(
+    tasks: Dict[int, Dict], nof_tasks: int, started_at: float, now: float
+) -> Dict:
+    """Summarizes the progress of a job from the states of its tasks.
+
+    :param tasks: Task states (see read_task_markers).
+    :param nof_tasks: Number of tasks of the job.
+    :param started_at: Time the job was submitted.
+    :param now: Current time.
+    :return: Dict with the number of done, failed and running tasks, the throughput in
+             finished tasks per hour, the estimated time to completion in seconds (None
+             if unknown), the median and maximum runtime of finished tasks in seconds and
+             the number of tasks per name and source of staged files.
+    """
+    done = [t for t in tasks.values() if t["state"] == "done"]
+    runtimes = np.array([t["end"] - t["start"] for t in done])
+    elapsed = max(now - started_at, 1e-9)
+    throughput = len(done) / elapsed * 3600
+    eta = None
+    if len(done) > 0:
+        eta = (nof_tasks - len(done)) / (len(done) / elapsed)
+    staging = {}
+    for task in tasks.values():
+        for name, staged in task.get("staging", {}).items():
+            sources = staging.setdefault(name, {})
+            sources[staged["source"]] = sources.get(staged["source"], 0) + 1
+    return {
+        "nof_tasks": nof_tasks,
+        "nof_done": len(done),
+        "nof_failed": sum(t["exit_code"] != 0 for t in done),
+        "nof_running": len(tasks) - len(done),
+        "throughput_per_hour": throughput,
+        "eta": eta,
+        "runtime_median": float(np.median(runtimes)) if len(done) > 0 else None,
+        "runtime_max": float(runtimes.max()) if len(done) > 0 else None,
+        "staging": staging,
+    }
+
+
+def _format_seconds(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    return time.strftime("%H:%M:%S", time.gmtime(seconds)) + (
+        f" +{int(seconds // 86400)}d" if seconds >= 86400 else ""
+    )
+
+
+def format_progress(progress: Dict) -> str:
+    """Formats a progress summary for logging.
+
+    :param progress: Progress summary (see summarize_progress).
+    :return: One line progress report.
+    """
+    return (
+        f"{progress['nof_done']}/{progress['nof_tasks']} tasks done"
+        f" ({progress['nof_failed']} failed, {progress['nof_running']} running),"
+        f" {progress['throughput_per_hour']:.1f} tasks/h,"
+        f" ETA {_format_seconds(progress['eta'])},"
+        f" task runtime median {_format_seconds(progress['runtime_median'])}"
+        f" max {_format_seconds(progress['runtime_max'])}"
+    )
+
+
+def is_job_alive(job_id: str) -> bool:
+    """Ask the scheduler whether a job still exists.
+
+    :param job_id: The job id.
+    :return: True if the job is queued or running.
+    """
+    res = subprocess.run(
+        ["qstat", "-j", job_id], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return res.returncode == 0
+
+
+class JobMonitor:
+    """Waits for an SGE array job and reports its progress.
+
+    Progress is read from the completion markers the tasks write (see
+    generate_task_marker_script). The scheduler is only asked whether the job still exists
+    to detect tasks that died without a marker. The polling interval grows exponentially
+    while nothing changes and is reset whenever tasks finish.
+    """
+
+    # default polling intervals in seconds
+    MIN_INTERVAL = 2.0
+    MAX_INTERVAL = 300.0
+
+    def __init__(
+        self,
+        job_id: str,
+        nof_tasks: int,
+        marker_dir: Optional[Path] = None,
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        backoff: float = 2.0,
+        callback: Optional[Callable[[Dict], None]] = None,
+        is_alive: Optional[Callable[[], bool]] = None,
+    ):
+        """Create a new monitor.
+
+        :param job_id: The job id.
+        :param nof_tasks: Number of tasks of the job.
+        :param marker_dir: Directory of the task markers. Without markers, only the
+                           scheduler is polled.
+        :param min_interval: Initial polling interval in seconds. Default is MIN_INTERVAL.
+        :param max_interval: Maximum polling interval in seconds. Default is MAX_INTERVAL.
+        :param backoff: Factor the polling interval grows by while nothing changes.
+        :param callback: Function called with the progress summary after every poll and
+                         once after the job finished, e.g. to collect results.
+        :param is_alive: Function telling whether the job is still running. Default asks
+                         the SGE scheduler (see is_job_alive).
+        """
+        self.job_id = job_id
+        self.nof_tasks = nof_tasks
+        self.marker_dir = marker_dir
+        self.min_interval = min_interval or JobMonitor.MIN_INTERVAL
+        self.max_interval = max_interval or JobMonitor.MAX_INTERVAL
+        self.backoff = backoff
+        self.callback = callback
+        self.is_alive = is_alive
+        if self.is_alive is None:
+            self.is_alive = lambda: is_job_alive(job_id)
+        self.started_at = time.time()
+
+    def progress(self) -> Dict:
+        """Get the current progress of the job.
+
+        :return: Progress summary (see summarize_progress) with the task states.
+        """
+        tasks = {}
+        if self.marker_dir is not None:
+            tasks = read_task_markers(self.marker_dir)
+        progress = summarize_progress(
+            tasks, self.nof_tasks, self.started_at, time.time()
+        )
+        progress["tasks"] = tasks
+        return progress
+
+    def wait(self) -> Dict:
+        """Wait until all tasks are done or the job disappeared from the scheduler.
+
+        :return: Final progress summary (see progress()).
+        """
+        interval = self.min_interval
+        nof_done = 0
+        while True:
+            time.sleep(interval)
+            progress = self.progress()
+            if progress["nof_done"] >= self.nof_tasks:
+                break
+            if not self.is_alive():
+                # the job might have finished between reading markers and qstat
+                progress = self.progress()
+                break
+            if progress["nof_done"] > nof_done:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            nof_done = progress["nof_done"]
+            logger.info(f"HPC job {self.job_id}: {format_progress(progress)}")
+            if self.callback is not None:
+                self.callback(progress)
+
+        logger.info(f"HPC job {self.job_id} finished: {format_progress(progress)}")
+        for name, sources in progress["staging"].items():
+            logger.info(
+                f"HPC job {self.job_id}: {name} per task from "
+                + ", ".join(f"{s}: {n}" for s, n in sorted(sources.items()))
+            )
+        if self.callback is not None:
+            self.callback(progress)
+        if self.marker_dir is not None:
+            missing = sorted(
+                set(range(1, self.nof_tasks + 1))
+                - {t for t, s in progress["tasks"].items() if s["state"] == "done"}
+            )
+            if len(missing) > 0:
+                logger.warning(
+                    f"HPC job {self.job_id}: {len(missing)} tasks ended without"
+                    f" completion marker: {missing[:20]}"
+                )
+            failed = sorted(
+                t
+                for t, s in progress["tasks"].items()
+                if s["state"] == "done" and s["exit_code"] != 0
+            )
+            if len(failed) > 0:
+                logger.warning(
+                    f"HPC job {self.job_id}: {len(failed)} tasks failed: {failed[:20]}"
+                )
+        return progress
@@ -0,0 +1,517 @@
+"""Cache of files staged from network storage on the local disc of HPC nodes.
+
+All tasks on a node share the cache. The first task that needs an entry copies it from
+network storage while holding a file lock, so that concurrent tasks wait for the copy
+instead of copying the same files again. Copies are verified by checksum. Entries stay on
+the node for later jobs and are evicted least recently used first when the cache grows
+beyond its maximum size or the disc runs low on free space.
+
+Run as script on the node to stage the MicroMiner k-mer index of the config, e.g.
+``python -m helper.hpc.node_cache index``. The path to the local copy of the index is
+printed to standard out. ``python -m helper.hpc.node_cache structures --input <tsv>``
+stages the structure files of a parameter table and rewrites their paths in the table.
+"""
+import argparse
+import contextlib
+import fcntl
+import getpass
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from helper.constants import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# how a task obtained a staged file (written to the staging reports of tasks)
+SOURCE_CACHED = "cached"
+SOURCE_COPIED = "copied"
+SOURCE_NETWORK = "network"
+
+# Number of threads for staging structure files. Copying small files is latency bound.
+STAGE_THREADS = 8
+
+
+@contextlib.contextmanager
+def _flock(path: Path, exclusive: bool = True, blocking: bool = True) -> Iterator[bool]:
+    """Holds a lock on a lock file while in the context.
+
+    :param path: Path to the lock file. Created if missing.
+    :param exclusive: Whether to take an exclusive or a shared lock.
+    :param blocking: Whether to wait for the lock.
+    :return: Whether the lock was acquired (always True if blocking).
+    """
+    with open(path, "a") as f:
+        op = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(f, op if blocking else op | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, but belongs to another user
+        return True
+    return True
+
+
+def _copy_with_digest(src: Path, dst: Path) -> str:
+    """Copies a file and hashes its content on the way.
+
+    :param src: Source file.
+    :param dst: Destination file.
+    :return: Hex digest of the content of the source file.
+    """
+    h = hashlib.sha256()
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        for chunk in iter(lambda: fin.read(1 << 24), b""):
+            h.update(chunk)
+            fout.write(chunk)
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+
+def _digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 24), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def entry_key(name: str, sources: List[Path]) -> str:
+    """Derives the key of a cache entry from the identity of its source files.
+
+    Source files are identified by path, size and modification time, so that a changed
+    source is staged again as a new entry.
+
+    :param name: Readable name of the entry.
+    :param sources: The source files.
+    :return: The key.
+    """
+    identity = []
+    for path in sorted(sources):
+        st = path.stat()
+        identity.append([str(path.resolve()), st.st_size, st.st_mtime_ns])
+    digest = hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+    return f"{name}_{digest[:16]}"
+
+
+class NodeCache:
+    """Cache of staged files on the local disc of a node.
+
+    Every entry is a directory with copies of its source files and a manifest with their
+    checksums. Entries are written atomically. Tasks that use an entry hold a lease on it
+    (a file named by the process id of the task), so that entries are not evicted while in
+    use. Leases of finished processes expire automatically.
+    """
+
+    MANIFEST_FILE = ".manifest.json"
+    LEASE_DIR = ".leases"
+    LOCK_FILE = ".cache.lock"
+
+    def __init__(self, directory: Path, max_size: int, min_free: int = 0):
+        """Create a new cache.
+
+        :param directory: Directory of the cache on the local disc.
+        :param max_size: Maximum size of the cache in bytes.
+        :param min_free: Minimum free space in bytes to leave on the disc.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.min_free = min_free
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.directory / key
+
+    def _entry_lock(self, key: str) -> Path:
+        return self.directory / f".{key}.lock"
+
+    def stage(
+        self,
+        key: str,
+        sources: List[Path],
+        lease_pid: Optional[int] = None,
+        make_room: bool = True,
+    ) -> Tuple[Path, bool]:
+        """Get an entry. The source files are copied if the entry is not cached yet.
+
+        Concurrent calls for the same entry wait until the first one finished copying.
+
+        :param key: Key of the entry (see entry_key).
+        :param sources: Files to copy into the entry. Copies have the same file name.
+        :param lease_pid: Process that uses the entry. The entry is not evicted while the
+                          process is running. Default is the parent process (e.g. the
+                          job script that called this module).
+        :param make_room: Whether to evict entries before copying. Callers staging many
+                          entries at once make room for all of them beforehand.
+        :return: Directory of the entry and whether it was already cached.
+        :raise OSError: If the files cannot be copied, e.g. because the disc is full.
+        :raise ValueError: If a copy does not match the checksum of its source.
+        """
+        if lease_pid is None:
+            lease_pid = os.getppid()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry_dir = self._entry_dir(key)
+        with _flock(self._entry_lock(key)):
+            cached = self.is_cached(key)
+            if not cached:
+                self._copy(key, sources, make_room)
+            lease_dir = entry_dir / NodeCache.LEASE_DIR
+            lease_dir.mkdir(exist_ok=True)
+            (lease_dir / str(lease_pid)).touch()
+            # mark as recently used
+            os.utime(entry_dir / NodeCache.MANIFEST_FILE)
+        return entry_dir, cached
+
+    def _copy(self, key: str, sources: List[Path], make_room: bool = True) -> None:
+        """Copies source files into a new entry. The entry lock must be held.
+
+        :param key: Key of the entry.
+        :param sources: Files to copy.
+        :param make_room: Whether to evict entries to make room for the new entry.
+        :return: None
+        """
+        entry_dir = self._entry_dir(key)
+        # left over from tasks that died while copying
+        for stale in self.directory.glob(f".tmp_{key}_*"):
+            shutil.rmtree(stale, ignore_errors=True)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+
+        size = sum(p.stat().st_size for p in sources)
+        if make_room:
+            self.make_room(size)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".tmp_{key}_", dir=self.directory))
+        try:
+            start = time.time()
+            checksums = {}
+            for src in sources:
+                dst = tmp_dir / src.name
+                checksums[src.name] = _copy_with_digest(src, dst)
+                if _digest(dst) != checksums[src.name]:
+                    raise ValueError(f"Checksum of copy does not match source: {src}")
+            with open(tmp_dir / NodeCache.MANIFEST_FILE, "w") as f:
+                json.dump(
+                    {
+                        "size": size,
+                        "sources": [str(p.resolve()) for p in sources],
+                        "sha256": checksums,
+                    },
+                    f,
+                )
+            tmp_dir.rename(entry_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        logger.debug(
+            f"Copied {len(sources)} files ({size / 1024**3:.2f} GB) to {entry_dir}"
+            f" in {time.time() - start:.1f}s"
+        )
+
+    def is_cached(self, key: str) -> bool:
+        """Check whether an entry is cached.
+
+        :param key: Key of the entry.
+        :return: Whether the entry is complete.
+        """
+        return (self._entry_dir(key) / NodeCache.MANIFEST_FILE).is_file()
+
+    def _entries(self) -> List:
+        """List all complete cache entries.
+
+        :return: List of (last use time, size, key) tuples.
+        """
+        entries = []
+        if not self.directory.is_dir():
+            return entries
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            manifest = Path(entry.path) / NodeCache.MANIFEST_FILE
+            try:
+                with open(manifest) as f:
+                    size = json.load(f)["size"]
+                entries.append((manifest.stat().st_mtime, size, entry.name))
+            except (OSError, ValueError, KeyError):
+                continue
+        return entries
+
+    def size(self) -> int:
+        """Get the size of all cache entries.
+
+        :return: The size in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def in_use(self, key: str) -> bool:
+        """Check whether a running process holds a lease on an entry.
+
+        Expired leases are removed.
+
+        :param key: Key of the entry.
+        :return: Whether the entry is in use.
+        """
+        lease_dir = self._entry_dir(key) / NodeCache.LEASE_DIR
+        if not lease_dir.is_dir():
+            return False
+        used = False
+        for lease in lease_dir.iterdir():
+            if lease.name.isdigit() and _pid_alive(int(lease.name)):
+                used = True
+            else:
+                lease.unlink(missing_ok=True)
+        return used
+
+    def evict(self, key: str) -> bool:
+        """Remove an entry unless it is in use or being copied.
+
+        :param key: Key of the entry.
+        :return: Whether the entry was removed.
+        """
+        with _flock(self._entry_lock(key), blocking=False) as locked:
+            if not locked or self.in_use(key):
+                return False
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        return True
+
+    def make_room(self, size: int) -> int:
+        """Evict least recently used entries until a new entry of a size fits.
+
+        Entries are evicted while the cache with the new entry would be larger than its
+        maximum size or the disc would have less than the minimum free space. Entries in
+        use are kept, so the new entry might still not fit afterwards.
+
+        :param size: Size of the new entry in bytes.
+        :return: Number of removed entries.
+        """
+        nof_removed = 0
+        with _flock(self.directory / NodeCache.LOCK_FILE):
+            entries = sorted(self._entries())
+            total_size = sum(s for _, s, _ in entries)
+            for _, entry_size, key in entries:
+                free = shutil.disk_usage(self.directory).free
+                if total_size + size <= self.max_size and free - size >= self.min_free:
+                    break
+                if self.evict(key):
+                    total_size -= entry_size
+                    nof_removed += 1
+        if nof_removed > 0:
+            logger.info(
+                f"Evicted {nof_removed} entries from node cache {self.directory}"
+            )
+        return nof_removed
+
+
+def get_node_cache() -> Optional[NodeCache]:
+    """Get the node cache configured in the HPC section of the config.
+
+    The cache is placed on the first existing disc of NODE_CACHE_DISCS.
+
+    :return: The node cache or None if the node has none of the discs.
+    """
+    for disc in json.loads(CONFIG["HPC"]["NODE_CACHE_DISCS"]):
+        if Path(disc).is_dir():
+            return NodeCache(
+                Path(disc) / getpass.getuser() / "microminer_node_cache",
+                max_size=int(
+                    float(CONFIG["HPC"]["NODE_CACHE_MAX_SIZE_GB"]) * 1024**3
+                ),
+                min_free=int(
+                    float(CONFIG["HPC"]["NODE_CACHE_MIN_FREE_GB"]) * 1024**3
+                ),
+            )
+    return None
+
+
+def write_staging_report(
+    report: Path, name: str, source: str, seconds: float, nof_files: int
+) -> None:
+    """Appends how a task obtained staged files to its staging report.
+
+    :param report: The report file (see read_task_markers).
+    :param name: Name of the staged files, e.g. "kmer_index".
+    :param source: SOURCE_CACHED, SOURCE_COPIED or SOURCE_NETWORK.
+    :param seconds: Time spent on staging.
+    :param nof_files: Number of staged files.
+    :return: None
+    """
+    with open(report, "a") as f:
+        f.write(f"{name}\t{source}\t{seconds:.3f}\t{nof_files}\n")
+
+
+def stage_kmer_index(
+    cache: Optional[NodeCache], kmer_index: Path
+) -> Tuple[Path, str, int]:
+    """Stage the MicroMiner k-mer index (all files of the index prefix) in a node cache.
+
+    Falls back to the index on network storage if it cannot be staged.
+
+    :param cache: The node cache or None to use the index on network storage.
+    :param kmer_index: Path (prefix) of the index, as SITE_SEARCH_DB in the config.
+    :return: Path (prefix) of the index to use, the source of the index (SOURCE_CACHED,
+             SOURCE_COPIED or SOURCE_NETWORK) and the number of index files.
+    """
+    sources = sorted(p for p in kmer_index.parent.glob(kmer_index.name + "*"))
+    if cache is None or len(sources) == 0:
+        logger.warning(f"Using k-mer index on network storage: {kmer_index}")
+        return kmer_index, SOURCE_NETWORK, len(sources)
+    try:
+        entry_dir, cached = cache.stage(entry_key(kmer_index.name, sources), sources)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not stage k-mer index, using network storage: {e}")
+        return kmer_index, SOURCE_NETWORK, len(sources)
+    return (
+        entry_dir / kmer_index.name,
+        SOURCE_CACHED if cached else SOURCE_COPIED,
+        len(sources),
+    )
+
+
+def stage_files(
+    cache: Optional[NodeCache], paths: List[Path], threads: int = STAGE_THREADS
+) -> Tuple[Dict[Path, Path], Counter]:
+    """Stage many single files in a node cache, e.g. the structure files of a task.
+
+    Every file is an entry of its own, so that tasks with overlapping files share them.
+    Room for all files that are not cached yet is made at once before copying. Files that
+    cannot be staged are used from network storage.
+
+    :param cache: The node cache or None to use all files from network storage.
+    :param paths: The files.
+    :param threads: Number of threads for copying.
+    :return: Dict mapping every file to the path to use and a Counter of the sources of
+             the files (SOURCE_CACHED, SOURCE_COPIED or SOURCE_NETWORK).
+    """
+    paths = list(dict.fromkeys(paths))
+    if cache is None:
+        return {p: p for p in paths}, Counter({SOURCE_NETWORK: len(paths)})
+
+    def key_and_size(path: Path) -> Tuple[Optional[str], int]:
+        try:
+            return entry_key(path.name, [path]), path.stat().st_size
+        except OSError:
+            return None, 0
+
+    def stage_file(path_key: Tuple[Path, Optional[str]]) -> Tuple[Path, str]:
+        path, key = path_key
+        if key is None:
+            return path, SOURCE_NETWORK
+        try:
+            entry_dir, cached = cache.stage(key, [path], make_room=False)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not stage {path}, using network storage: {e}")
+            return path, SOURCE_NETWORK
+        return entry_dir / path.name, SOURCE_CACHED if cached else SOURCE_COPIED
+
+    with ThreadPoolExecutor(threads) as pool:
+        keys, sizes = zip(*pool.map(key_and_size, paths)) if paths else ((), ())
+        cache.directory.mkdir(parents=True, exist_ok=True)
+        cache.make_room(
+            sum(
+                size
+                for key, size in zip(keys, sizes)
+                if key is not None and not cache.is_cached(key)
+            )
+        )
+        staged = list(pool.map(stage_file, zip(paths, keys)))
+    return (
+        {path: local for path, (local, _) in zip(paths, staged)},
+        Counter(source for _, source in staged),
+    )
+
+
+def stage_structure_files(
+    cache: Optional[NodeCache], param_tsv: Path
+) -> Tuple[str, int]:
+    """Stage the structure files of a parameter table and point the table to the copies.
+
+    All columns whose name starts with "structure_path" are staged and rewritten in place.
+
+    :param cache: The node cache or None to use all files from network storage.
+    :param param_tsv: The parameter table.
+    :return: The predominant source of the files (SOURCE_COPIED if any file was copied)
+             and the number of staged files.
+    """
+    # imported here, staging the k-mer index on every task start does not need pandas
+    import pandas as pd
+
+    df = pd.read_csv(param_tsv, sep="\t", header=0, dtype=str, keep_default_na=False)
+    path_cols = [c for c in df.columns if str(c).startswith("structure_path")]
+    paths = [Path(p) for col in path_cols for p in df[col] if p != ""]
+    local_paths, sources = stage_files(cache, paths)
+    local_paths = {str(p): str(local) for p, local in local_paths.items()}
+    for col in path_cols:
+        df[col] = df[col].map(lambda p: local_paths.get(p, p))
+    df.to_csv(param_tsv, sep="\t", header=True, index=False)
+    logger.info(
+        f"Staged {len(local_paths)} structure files: "
+        + ", ".join(f"{s}: {n}" for s, n in sorted(sources.items()))
+    )
+    for source in (SOURCE_COPIED, SOURCE_CACHED):
+        if sources[source] > 0:
+            return source, len(local_paths)
+    return SOURCE_NETWORK, len(local_paths)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Stage files in the cache on the local disc of this node."
+    )
+    parser.add_argument(
+        "what",
+        choices=["index", "structures"],
+        help="Files to stage: the k-mer index of the config or the structure files of a"
+        " parameter table.",
+    )
+    parser.add_argument(
+        "--input",
+        type=Path,
+        default=None,
+        help="Parameter table with the structure files to stage. Rewritten in place.",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        default=None,
+        help="File to append the source and staging time to.",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    start = time.time()
+    if args.what == "index":
+        path, source, nof_files = stage_kmer_index(
+            get_node_cache(), Path(CONFIG["DATABASES"]["SITE_SEARCH_DB"])
+        )
+        print(path)
+    else:
+        if args.input is None:
+            parser.error("structures requires --input")
+        source, nof_files = stage_structure_files(get_node_cache(), args.input)
+    if args.report is not None:
+        name = "kmer_index" if args.what == "index" else "structures"
+        write_staging_report(args.report, name, source, time.time() - start, nof_files)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Detection of lost input rows and failing nodes for resubmitting HPC array jobs."""
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable
+
+import pandas as pd
+
+from helper.journal import CompletionJournal
+
+logger = logging.getLogger(__name__)
+
+# Node clocks may be slightly behind the clock of the submitting host
+CLOCK_SLACK = 60.0
+
+
+def rows_without_result(
+    row_ids: pd.Series, journal_dir: Path, since: float
+) -> pd.Series:
+    """Find input rows that were not recorded in the completion journal since a time.
+
+    Rows with a journal entry were computed, successfully or not. Rows without one were
+    lost, e.g. because their task died with its node or was preempted.
+
+    :param row_ids: Job id of every input row (see row_ids of the runners).
+    :param journal_dir: Directory of the completion journals.
+    :param since: Time the computation of the rows was submitted.
+    :return: Boolean mask of the rows without journal entry with the index of row_ids.
+    """
+    recorded = {
+        job_id
+        for job_id, entry in CompletionJournal(journal_dir).read().items()
+        if entry["timestamp"] >= since - CLOCK_SLACK
+    }
+    return ~row_ids.astype(str).isin(recorded)
+
+
+def failing_hosts(tasks: Dict[int, Dict]) -> Counter:
+    """Count the failed tasks of every host of a finished job.
+
+    A task failed if its job script exited with an error or if it started but never
+    wrote a done marker.
+
+    :param tasks: Task states of the finished job (see read_task_markers).
+    :return: Counter of failed tasks per host.
+    """
+    return Counter(
+        task["host"]
+        for task in tasks.values()
+        if task["state"] != "done" or task["exit_code"] != 0
+    )
+
+
+def host_exclusion(hosts: Iterable[str]) -> str:
+    """Formats an SGE host resource request that excludes hosts.
+
+    :param hosts: Host names to exclude.
+    :return: Value for "-l h=" or an empty string if no host is excluded.
+    """
+    hosts = sorted(set(hosts))
+    if len(hosts) == 0:
+        return ""
+    if len(hosts) == 1:
+        return f"!{hosts[0]}"
+    return f"!({'|'.join(hosts)})"
+
+
+def lost_rows_report(
+    df_lost: pd.DataFrame, schedule: pd.Series, tasks: Dict[int, Dict], attempts: int
+) -> pd.DataFrame:
+    """Annotates permanently lost input rows with what is known about their last task.
+
+    :param df_lost: The lost input rows.
+    :param schedule: Task number (starting at 0) of every input row of the last attempt.
+    :param tasks: Task states of the last attempt (see read_task_markers).
+    :param attempts: Number of attempts to compute the rows.
+    :return: The lost rows with the number of attempts, the SGE task id, host and exit
+             code of their last task (NaN if unknown).
+    """
+    df_report = df_lost.copy()
+    df_report["attempts"] = attempts
+    task_ids = schedule.reindex(df_lost.index) + 1
+    df_report["last_task"] = task_ids
+    df_report["last_host"] = task_ids.map(
+        lambda t: tasks.get(t, {}).get("host") if pd.notna(t) else None
+    )
+    df_report["last_exit_code"] = task_ids.map(
+        lambda t: tasks.get(t, {}).get("exit_code") if pd.notna(t) else None
+    )
+    return df_report
@@ -0,0 +1,162 @@
+"""Cost-aware distribution of input rows to HPC array tasks."""
+import heapq
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Number of threads for reading structure file sizes. Stat calls are I/O bound.
+STAT_THREADS = 16
+
+# Prefix of files with parsed MicroMiner output of earlier runs (see run_to_tsv)
+PERF_FILE_PREFIX = "perf"
+# Column of the per-query timing in perf files
+PERF_TIME_COLUMN = "search_time"
+
+
+def _file_size(path: str) -> float:
+    """Get the size of a file.
+
+    :param path: Path to the file.
+    :return: The size in bytes or NaN if the file cannot be accessed.
+    """
+    try:
+        return float(os.stat(path).st_size)
+    except (OSError, TypeError, ValueError):
+        return np.nan
+
+
+def structure_file_sizes(df: pd.DataFrame) -> pd.Series:
+    """Get the summed size of the structure files of every row of a parameter table.
+
+    All columns whose name starts with "structure_path" are considered.
+
+    :param df: The parameter table.
+    :return: Summed file sizes in bytes (NaN if a file is missing) with the index of df.
+    """
+    path_cols = [c for c in df.columns if str(c).startswith("structure_path")]
+    sizes = pd.Series(0.0, index=df.index)
+    if len(path_cols) == 0:
+        return sizes * np.nan
+    with ThreadPoolExecutor(STAT_THREADS) as pool:
+        for col in path_cols:
+            sizes += np.fromiter(
+                pool.map(_file_size, df[col].astype(str)), float, count=df.shape[0]
+            )
+    return sizes
+
+
+def read_perf_timings(paths: List[Path]) -> pd.Series:
+    """Read the per-query timings of earlier runs from perf files.
+
+    :param paths: Perf TSV files (see MicroMinerSearch.run_to_tsv). Missing files are
+                  skipped.
+    :return: Timings in seconds indexed by query id. The latest timing of a query wins.
+    """
+    timings = []
+    for path in paths:
+        if not path.is_file() or path.stat().st_size == 0:
+            continue
+        try:
+            df = pd.read_csv(path, sep="\t", header=0, usecols=["id", PERF_TIME_COLUMN])
+        except ValueError:
+            logger.warning(f"No timings in perf file: {path}")
+            continue
+        timings.append(df.dropna())
+    if len(timings) == 0:
+        return pd.Series(dtype=float)
+    df = pd.concat(timings, ignore_index=True).drop_duplicates("id", keep="last")
+    return df.set_index(df["id"].astype(str))[PERF_TIME_COLUMN].astype(float)
+
+
+def find_perf_files(outdir: Path) -> List[Path]:
+    """Find the perf files of earlier local and HPC runs in an output directory.
+
+    :param outdir: Output directory of search.py.
+    :return: List of perf files.
+    """
+    paths = []
+    for directory in (outdir, outdir / "results"):
+        if directory.is_dir():
+            paths += sorted(directory.glob(f"{PERF_FILE_PREFIX}*.tsv"))
+    return paths
+
+
+def estimate_costs(
+    df: pd.DataFrame, perf_timings: Optional[pd.Series] = None
+) -> pd.Series:
+    """Estimate the computational cost of every row of a parameter table.
+
+    Rows with a timing from an earlier run cost that timing. All other rows cost the size
+    of their structure files, scaled to seconds with the median seconds per byte of the
+    rows with timings. Rows without any information cost the median of the known costs.
+
+    :param df: The parameter table.
+    :param perf_timings: Timings of earlier runs indexed by the values of the "id" column.
+    :return: Costs with the index of df. Only the relative magnitudes are meaningful.
+    """
+    sizes = structure_file_sizes(df)
+    costs = sizes.copy()
+    if perf_timings is not None and len(perf_timings) > 0 and "id" in df.columns:
+        timings = df["id"].astype(str).map(perf_timings)
+        timings.index = df.index
+        has_both = timings.notna() & sizes.notna() & (sizes > 0)
+        if has_both.any():
+            secs_per_byte = (timings[has_both] / sizes[has_both]).median()
+            costs = sizes * secs_per_byte
+        elif timings.notna().any():
+            costs = sizes * np.nan
+        costs = timings.fillna(costs)
+        logger.info(f"Found earlier timings for {timings.notna().sum()} input rows")
+    known = costs.dropna()
+    return costs.fillna(known.median() if len(known) > 0 else 1.0)
+
+
+def schedule_longest_first(costs: pd.Series, nof_tasks: int) -> pd.Series:
+    """Bin-packs rows into tasks of roughly equal total cost.
+
+    Uses the longest-processing-time-first rule: rows are assigned in order of decreasing
+    cost, each to the task with the lowest total cost so far. The most expensive rows of
+    every task therefore come first.
+
+    :param costs: Cost of every row.
+    :param nof_tasks: Number of tasks. At most the number of rows.
+    :return: Task number (starting at 0) of every row, ordered by task and decreasing cost.
+    """
+    if nof_tasks < 1:
+        raise ValueError(f"Invalid number of tasks: {nof_tasks}")
+    order = np.argsort(-costs.to_numpy(), kind="stable")
+    # ties of equal cost are broken by the number of rows, so that rows without cost
+    # (e.g. empty files) are still distributed evenly
+    loads = [(0.0, 0, task) for task in range(nof_tasks)]
+    tasks = np.empty(len(order), dtype=np.int64)
+    for i, cost in zip(order, costs.to_numpy()[order]):
+        load, nof_rows, task = heapq.heappop(loads)
+        tasks[i] = task
+        heapq.heappush(loads, (load + cost, nof_rows + 1, task))
+    schedule = pd.Series(tasks[order], index=costs.index[order])
+    schedule = schedule.iloc[np.argsort(schedule.to_numpy(), kind="stable")]
+    loads = sorted(load for load, _, _ in loads)
+    logger.info(
+        f"Scheduled {len(order)} rows in {nof_tasks} tasks. Estimated task cost:"
+        f" min={loads[0]:.3g} median={loads[len(loads) // 2]:.3g} max={loads[-1]:.3g}"
+    )
+    return schedule
+
+
+def task_ranges(schedule: pd.Series, nof_tasks: int) -> pd.DataFrame:
+    """Get the row ranges of all tasks in a table ordered by task.
+
+    :param schedule: Task number of every row ordered by task (see schedule_longest_first).
+    :param nof_tasks: Number of tasks.
+    :return: Table with the first row (0-based) and the number of rows of every task.
+    """
+    counts = np.bincount(schedule.to_numpy(), minlength=nof_tasks)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return pd.DataFrame({"start": starts, "count": counts})
@@ -1,7 +1,9 @@
 import logging
 import subprocess
-import time
 from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from .monitor import JobMonitor
 
 logger = logging.getLogger(__name__)
 
@@ -44,23 +46,27 @@ class SGEJobRunner:
     """Provides functionality to run and stop SGE jobs."""
 
     @staticmethod
-    def submit_and_wait(job_script: Path) -> None:
+    def submit_and_wait(
+        job_script: Path,
+        nof_tasks: int = 1,
+        marker_dir: Optional[Path] = None,
+        callback: Optional[Callable[[Dict], None]] = None,
+    ) -> Dict:
         """Submits the given job_script to SGE and waits for completion.
 
         :param job_script: Path to the job script.
-        :return: None
+        :param nof_tasks: Number of array tasks of the job.
+        :param marker_dir: Directory of the completion markers of the tasks (see
+                           generate_task_marker_script) for progress reports.
+        :param callback: Function called with the progress of the job while waiting (see
+                         JobMonitor).
+        :return: Final progress summary of the job (see JobMonitor.progress).
         """
         with SGEJobRunner.submit(job_script) as job:
             assert job.job_id is not None
-
-            # wait for jobs to complete
-            cmd_call = ["qstat", "-j", job.job_id]
-            while True:
-                time.sleep(2)
-                res = subprocess.run(cmd_call, stdout=subprocess.PIPE)
-                logger.info(f"WAITING FOR HPC JOBS. QSTAT: {res.returncode}")
-                if res.returncode != 0:
-                    break
+            return JobMonitor(
+                job.job_id, nof_tasks, marker_dir=marker_dir, callback=callback
+            ).wait()
 
     @staticmethod
     def submit(job_script: Path) -> SGEJob:
@@ -0,0 +1,99 @@
+"""Append-only journal of finished computations in a result directory."""
+import csv
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+def param_hash(params: dict) -> str:
+    """Hashes a dict of computation parameters.
+
+    :param params: Dict of JSON serializable parameters.
+    :return: Hex digest of the parameters.
+    """
+    return hashlib.sha1(
+        json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class CompletionJournal:
+    """Journal of finished computations (one row per finished job).
+
+    Each finished job is recorded with its exit code and a hash of its parameters. The
+    journal is a TSV file that is only ever appended to, so that it survives crashes of
+    the writing process. Several journal files (e.g. one per HPC task) can live in the
+    same directory. Reading considers all of them.
+    """
+
+    COLUMNS = ["id", "exit_code", "param_hash", "timestamp"]
+    FILE_PREFIX = "journal"
+
+    def __init__(self, directory: Path, name: str = "journal.tsv"):
+        """Create a new journal.
+
+        :param directory: Directory of the journal files (usually the result directory).
+        :param name: File name of the journal file to write to.
+        """
+        assert name.startswith(CompletionJournal.FILE_PREFIX)
+        self.directory = directory
+        self.path = directory / name
+
+    def record(self, job_id: str, exit_code: int, job_param_hash: str) -> None:
+        """Append a finished job to the journal.
+
+        :param job_id: Identifier of the job.
+        :param exit_code: The exit code of the job.
+        :param job_param_hash: Hash of the parameters of the job.
+        :return: None
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        is_new = not self.path.is_file()
+        with open(self.path, "a", newline="") as f:
+            writer = csv.writer(f, delimiter="\t")
+            if is_new:
+                writer.writerow(CompletionJournal.COLUMNS)
+            writer.writerow([job_id, exit_code, job_param_hash, f"{time.time():.6f}"])
+
+    def read(self) -> Dict[str, Dict]:
+        """Read the latest entry of every job from all journal files in the directory.
+
+        :return: Dict mapping job ids to their latest journal entry.
+        """
+        entries = {}
+        if not self.directory.is_dir():
+            return entries
+        for path in sorted(
+            self.directory.glob(f"{CompletionJournal.FILE_PREFIX}*.tsv")
+        ):
+            with open(path, "r", newline="") as f:
+                for row in csv.DictReader(f, delimiter="\t"):
+                    # skip rows truncated by a crash
+                    if None in row.values():
+                        continue
+                    try:
+                        row["exit_code"] = int(row["exit_code"])
+                        row["timestamp"] = float(row["timestamp"])
+                    except ValueError:
+                        continue
+                    if (
+                        row["id"] not in entries
+                        or entries[row["id"]]["timestamp"] <= row["timestamp"]
+                    ):
+                        entries[row["id"]] = row
+        return entries
+
+    def successful(self) -> Dict[str, str]:
+        """Get all jobs that finished successfully according to their latest entry.
+
+        :return: Dict mapping job ids to their parameter hash.
+        """
+        return {
+            job_id: entry["param_hash"]
+            for job_id, entry in self.read().items()
+            if entry["exit_code"] == 0
+        }
@@ -0,0 +1,246 @@
+"""Mock command line tools for testing the runners without the real executables."""
+import stat
+import sys
+from pathlib import Path
+
+_MOCK_MICROMINER = '''#!{python}
+"""Mock MicroMiner executable. Writes minimal results and logs every k-mer index load."""
+import sys
+from pathlib import Path
+
+BATCH = {batch}
+INDEX_LOAD_LOG = {index_load_log!r}
+
+args = sys.argv[1:]
+if len(args) == 0 or args[0] not in ("search", "site_align"):
+    print("usage: MicroMiner <search|site_align> [options]")
+    sys.exit(1)
+mode = args[0]
+if "--help" in args:
+    print("usage: MicroMiner " + mode + " -q <query> -s <db> -o <outdir>")
+    if BATCH and mode == "search":
+        print("  --query_list  TSV file with one query structure and result dir per line")
+    sys.exit(0)
+
+
+def get_arg(flag):
+    return args[args.index(flag) + 1] if flag in args else None
+
+
+queries = []
+if get_arg("--query_list") is not None:
+    if not BATCH:
+        print("unrecognised option --query_list", file=sys.stderr)
+        sys.exit(2)
+    with open(get_arg("--query_list")) as f:
+        queries = [line.rstrip("\\n").split("\\t") for line in f if line.strip()]
+else:
+    queries = [(get_arg("-q"), get_arg("-o"))]
+
+if mode == "search":
+    with open(INDEX_LOAD_LOG, "a") as f:
+        f.write("index loaded\\n")
+    print("Reading Kmer Index Files from disc | Took: 0.500 seconds")
+
+for query, outdir in queries:
+    print("Working on " + query)
+    if not Path(query).is_file():
+        print("Could not read query file: " + query, file=sys.stderr)
+        sys.exit(1)
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    name = Path(query).name.split(".")[0].upper()
+    with open(Path(outdir) / "resultStatistic.csv", "w") as f:
+        f.write("queryName\\tqueryAA\\tqueryChain\\tqueryPos\\thitName\\thitAA\\thitChain\\thitPos\\n")
+        f.write(name + "\\tALA\\tA\\t1\\tHIT1\\tVAL\\tA\\t1\\n")
+    print("Kmer search generated 3 candidates")
+    print("Successfully aligned candidates: 1 of 3")
+    print("Run search | Took: 0.100 seconds")
+'''
+
+
+def write_mock_microminer(path: Path, index_load_log: Path, batch: bool = True) -> Path:
+    """Writes an executable mock of MicroMiner.
+
+    The mock appends a line to index_load_log each time it "loads" the k-mer index, i.e. once
+    per search process. It writes a resultStatistic.csv with a single hit for every query.
+
+    :param path: File path for the mock executable.
+    :param index_load_log: File the mock appends a line to for every index load.
+    :param batch: Whether the mock supports the batched search mode (query list file).
+    :return: Path to the mock executable.
+    """
+    with open(path, "w") as f:
+        f.write(
+            _MOCK_MICROMINER.format(
+                python=sys.executable,
+                batch=batch,
+                index_load_log=str(index_load_log.resolve()),
+            )
+        )
+    path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+_MOCK_QSUB = '''#!{python}
+"""Mock SGE qsub. Runs the tasks of an array job one after another in the background."""
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+STATE_DIR = Path({state_dir!r})
+
+if len(sys.argv) == 4 and sys.argv[1] == "--run":
+    # background process that executes the job
+    job_id, job_script = sys.argv[2], sys.argv[3]
+    first, last = 1, 1
+    with open(job_script) as f:
+        for line in f:
+            m = re.match(r"#\\$ -t (\\d+)-(\\d+)", line)
+            if m:
+                first, last = int(m.group(1)), int(m.group(2))
+    for task in range(first, last + 1):
+        if (STATE_DIR / (job_id + ".deleted")).exists():
+            break
+        env = dict(os.environ, JOB_ID=job_id, SGE_TASK_ID=str(task))
+        subprocess.run(
+            ["bash", job_script],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    (STATE_DIR / (job_id + ".running")).unlink()
+    sys.exit(0)
+
+job_script = sys.argv[-1]
+STATE_DIR.mkdir(parents=True, exist_ok=True)
+job_id = str(len(list(STATE_DIR.glob("*.submitted"))) + 1)
+(STATE_DIR / (job_id + ".submitted")).touch()
+(STATE_DIR / (job_id + ".running")).touch()
+subprocess.Popen(
+    [sys.executable, __file__, "--run", job_id, job_script],
+    start_new_session=True,
+    stdout=subprocess.DEVNULL,
+    stderr=subprocess.DEVNULL,
+)
+print("Your job-array " + job_id + ".1-1:1 (\\"mock\\") has been submitted")
+'''
+
+_MOCK_QSTAT = '''#!{python}
+"""Mock SGE qstat. Only supports "qstat -j <job id>" and logs every call."""
+import sys
+from pathlib import Path
+
+STATE_DIR = Path({state_dir!r})
+
+job_id = sys.argv[sys.argv.index("-j") + 1]
+with open(STATE_DIR / "qstat_calls.log", "a") as f:
+    f.write(job_id + "\\n")
+if (STATE_DIR / (job_id + ".running")).exists():
+    print("job_number: " + job_id)
+    sys.exit(0)
+print("Following jobs do not exist: " + job_id)
+sys.exit(1)
+'''
+
+_MOCK_QDEL = '''#!{python}
+"""Mock SGE qdel. Pending tasks of deleted jobs are not started anymore."""
+import sys
+from pathlib import Path
+
+STATE_DIR = Path({state_dir!r})
+
+(STATE_DIR / (sys.argv[-1] + ".deleted")).touch()
+'''
+
+
+def write_mock_sge(bin_dir: Path, state_dir: Path) -> Path:
+    """Writes executable mocks of the SGE commands qsub, qstat and qdel.
+
+    The mock qsub runs all tasks of an array job one after another in a background
+    process. The state of jobs is kept in state_dir. Calls of qstat are logged to
+    state_dir/qstat_calls.log. Put bin_dir first in PATH to use the mocks.
+
+    :param bin_dir: Directory for the mock executables.
+    :param state_dir: Directory for the state of the mock scheduler.
+    :return: bin_dir.
+    """
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for name, template in [
+        ("qsub", _MOCK_QSUB),
+        ("qstat", _MOCK_QSTAT),
+        ("qdel", _MOCK_QDEL),
+    ]:
+        path = bin_dir / name
+        with open(path, "w") as f:
+            f.write(
+                template.format(
+                    python=sys.executable, state_dir=str(state_dir.resolve())
+                )
+            )
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir
+
+
+_MOCK_TMALIGN = '''#!{python}
+"""Mock TM-align. Logs every input file and prints the output of one alignment."""
+import sys
+from pathlib import Path
+
+READ_LOG = {read_log!r}
+
+query, target = sys.argv[1], sys.argv[2]
+lengths = []
+for path in (query, target):
+    with open(READ_LOG, "a") as f:
+        f.write(path + "\\n")
+    try:
+        with open(path) as f:
+            lengths.append(sum(1 for line in f if line[12:16] == " CA "))
+    except UnicodeDecodeError:
+        # like TM-align, the mock cannot read gzipped files
+        print("Cannot parse file: " + path, file=sys.stderr)
+        sys.exit(1)
+align_len = min(lengths)
+print()
+print(" " + "*" * 69)
+print(" * TM-align (Version 20190822): protein structure alignment          *")
+print(" " + "*" * 69)
+print()
+print("Name of Chain_1: " + query + " (to be superimposed onto Chain_2)")
+print("Name of Chain_2: " + target)
+print("Length of Chain_1: " + str(lengths[0]) + " residues")
+print("Length of Chain_2: " + str(lengths[1]) + " residues")
+print()
+print("Aligned length= " + str(align_len) + ", RMSD=   1.00, Seq_ID=n_identical/n_aligned= 1.000")
+print("TM-score= 0.90000 (if normalized by length of Chain_1, i.e., LN=1, d0=0.50)")
+print("TM-score= 0.80000 (if normalized by length of Chain_2, i.e., LN=1, d0=0.50)")
+print("(You should use TM-score normalized by length of the reference structure)")
+print()
+print('(":" denotes residue pairs of d <  5.0 Angstrom, "." denotes other aligned residues)')
+print("A" * align_len)
+print(":" * align_len)
+print("A" * align_len)
+print()
+'''
+
+
+def write_mock_tmalign(path: Path, read_log: Path) -> Path:
+    """Writes an executable mock of TM-align.
+
+    The mock appends the paths of both input structures to read_log and fails for gzipped
+    input like TM-align. The chain lengths are the numbers of CA records of the inputs.
+
+    :param path: File path for the mock executable.
+    :param read_log: File the mock appends the path of every input structure to.
+    :return: Path to the mock executable.
+    """
+    with open(path, "w") as f:
+        f.write(
+            _MOCK_TMALIGN.format(
+                python=sys.executable, read_log=str(read_log.resolve())
+            )
+        )
+    path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
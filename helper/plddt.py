@@ -0,0 +1,323 @@
+"""Bulk extraction of per-residue pLDDT values from AlphaFold structure files.
+
+Files are decompressed as a stream and only the CA records are parsed with a byte-level
+pattern. Batches of files are processed in a process pool and written to a Parquet
+dataset with compact dtypes (categorical name, chain and residue, 16 bit position and
+pLDDT). Each Parquet part lists its source files in a sidecar file, so that an
+interrupted extraction resumes with the files not written yet.
+"""
+import logging
+import multiprocessing
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Iterator, List, Set, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# CA record of a PDB file, e.g.
+# ATOM      2  CA  MET A   1     -33.337   4.131 -10.180  1.00 40.18           C
+# Groups: residue name, chain, residue number and B-factor (the pLDDT in AlphaFold files)
+_CA_RECORD = re.compile(rb"\nATOM  .{6} CA .(.{3}).(.)(.{4}).{34}(.{6})")
+# Groups: alternate location, chain, residue number and insertion code
+_CA_RESIDUE = re.compile(rb"\nATOM  .{6} CA (.).{3}.(.)(.{4})(.)")
+
+# Bytes read from a file at once
+CHUNK_SIZE = 1 << 20
+
+PART_PREFIX = "part-"
+# Sidecar of a Parquet part with the source files of its rows, one per line. Readers of
+# the dataset ignore files starting with an underscore.
+FILES_PREFIX = "_"
+FILES_SUFFIX = ".files"
+
+PLDDT_DTYPES = {"float16": pa.float16(), "uint8": pa.uint8()}
+
+
+def plddt_schema(plddt_dtype: str = "float16") -> pa.Schema:
+    """Get the schema of extracted pLDDT values.
+
+    :param plddt_dtype: Type of the pLDDT column. float16 is precise to about 0.03,
+                        uint8 stores the rounded values.
+    :return: The schema.
+    """
+    if plddt_dtype not in PLDDT_DTYPES:
+        raise ValueError(f"Invalid pLDDT dtype: {plddt_dtype}")
+    return pa.schema(
+        [
+            pa.field("name", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("aa", pa.dictionary(pa.int8(), pa.string())),
+            pa.field("chain", pa.dictionary(pa.int8(), pa.string())),
+            pa.field("pos", pa.int16()),
+            pa.field("plddt", PLDDT_DTYPES[plddt_dtype]),
+        ]
+    )
+
+
+def _read_chunks(path: Path) -> Iterator[bytes]:
+    """Read a possibly gzipped file in chunks.
+
+    Decompresses with zlib directly, which is considerably faster than the gzip module.
+
+    :param path: Path to the file.
+    :return: Yields decompressed chunks.
+    """
+    with open(path, "rb") as f:
+        if path.suffix != ".gz":
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        started = False
+        while True:
+            data = f.read(CHUNK_SIZE)
+            if not data:
+                break
+            while data:
+                started = True
+                yield decompressor.decompress(data)
+                if not decompressor.eof:
+                    break
+                # next member of a multi-member gzip file
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+                started = False
+        if started:
+            raise EOFError(f"Truncated gzip file: {path}")
+
+
+def _find_records(path: Path, pattern: re.Pattern) -> List[Tuple]:
+    """Find the records of a structure file matching a pattern.
+
+    :param path: Path to a PDB file (.pdb or .pdb.gz).
+    :param pattern: Pattern of a record including its preceding line break.
+    :return: List with the groups of every matching record as raw bytes.
+    """
+    records = []
+    # records are matched with their preceding line break, a literal prefix is fast
+    tail = b"\n"
+    for chunk in _read_chunks(path):
+        buffer = tail + chunk
+        last_line = buffer.rfind(b"\n")
+        # complete lines only, the last line might continue in the next chunk
+        records += pattern.findall(buffer, 0, last_line)
+        tail = buffer[last_line:]
+    records += pattern.findall(tail)
+    return records
+
+
+def parse_ca_records(path: Path) -> List[Tuple[bytes, bytes, bytes, bytes]]:
+    """Parse the CA records of a structure file.
+
+    :param path: Path to a PDB file (.pdb or .pdb.gz).
+    :return: List with residue name, chain, residue number and B-factor of every CA
+             record as raw bytes.
+    """
+    return _find_records(path, _CA_RECORD)
+
+
+def parse_ca_residues(path: Path) -> List[Tuple[bytes, bytes, bytes, bytes]]:
+    """Parse the residue identifiers of the CA records of a structure file.
+
+    :param path: Path to a PDB file (.pdb or .pdb.gz).
+    :return: List with alternate location, chain, residue number and insertion code of
+             every CA record as raw bytes.
+    """
+    return _find_records(path, _CA_RESIDUE)
+
+
+def structure_name(path: Path) -> str:
+    """Get the name of a structure from its file name, e.g. AF-Q5VSL9-F1-model_v4.
+
+    :param path: Path to the structure file.
+    :return: The name (file name up to the first dot).
+    """
+    return path.name.split(".")[0]
+
+
+def _dictionary_array(values: np.ndarray, index_type) -> pa.DictionaryArray:
+    """Dictionary encode an array of byte strings.
+
+    :param values: Array of byte strings.
+    :param index_type: Numpy type of the indices.
+    :return: The dictionary array.
+    """
+    dictionary, indices = np.unique(values, return_inverse=True)
+    return pa.DictionaryArray.from_arrays(
+        pa.array(indices.astype(index_type)),
+        pa.array([v.decode("ascii").strip() for v in dictionary], pa.string()),
+    )
+
+
+def extract_plddt_table(
+    paths: List[Path], plddt_dtype: str = "float16"
+) -> Tuple[pa.Table, List[Path], List[Path]]:
+    """Extract the per-residue pLDDT values of structure files.
+
+    :param paths: Paths to AlphaFold PDB files.
+    :param plddt_dtype: Type of the pLDDT column (see plddt_schema).
+    :return: Table of the residues of all readable files, the readable files and the
+             unreadable files.
+    """
+    schema = plddt_schema(plddt_dtype)
+    records = []
+    names = []
+    counts = []
+    done = []
+    failed = []
+    for path in paths:
+        try:
+            file_records = parse_ca_records(path)
+        except (OSError, EOFError, zlib.error) as e:
+            logger.warning(f"Could not read {path}: {e}")
+            failed.append(path)
+            continue
+        records += file_records
+        names.append(structure_name(path))
+        counts.append(len(file_records))
+        done.append(path)
+
+    if len(records) == 0:
+        return schema.empty_table(), done, failed
+    aa, chain, pos, plddt = zip(*records)
+    plddt = np.array(plddt, dtype="S6").astype(np.float32)
+    if plddt_dtype == "uint8":
+        plddt = np.clip(np.rint(plddt), 0, 255)
+    table = pa.Table.from_arrays(
+        [
+            pa.DictionaryArray.from_arrays(
+                pa.array(np.repeat(np.arange(len(names), dtype=np.int32), counts)),
+                pa.array(names, pa.string()),
+            ),
+            _dictionary_array(np.array(aa, dtype="S3"), np.int8),
+            _dictionary_array(np.array(chain, dtype="S1"), np.int8),
+            pa.array(np.array(pos, dtype="S4").astype(np.int16)),
+            pa.array(plddt.astype(schema.field("plddt").type.to_pandas_dtype())),
+        ],
+        schema=schema,
+    )
+    return table, done, failed
+
+
+def _extract_batch(args: Tuple[List[Path], str]) -> Tuple[pa.Table, List, List]:
+    return extract_plddt_table(*args)
+
+
+def finished_files(outdir: Path) -> Set[str]:
+    """Get the source files of all completely written parts of a pLDDT dataset.
+
+    :param outdir: Directory of the Parquet dataset.
+    :return: The paths of the source files as strings.
+    """
+    files = set()
+    for sidecar in outdir.glob(f"{FILES_PREFIX}{PART_PREFIX}*{FILES_SUFFIX}"):
+        part = sidecar.name[len(FILES_PREFIX) : -len(FILES_SUFFIX)] + ".parquet"
+        # a sidecar without its part is left over from an interrupted write
+        if (outdir / part).is_file():
+            with open(sidecar) as f:
+                files.update(line.rstrip("\n") for line in f if line.strip())
+    return files
+
+
+def _next_part_number(outdir: Path) -> int:
+    numbers = [
+        int(p.name.lstrip(FILES_PREFIX)[len(PART_PREFIX) :].split(".")[0])
+        for pattern in (f"{PART_PREFIX}*", f"{FILES_PREFIX}{PART_PREFIX}*")
+        for p in outdir.glob(pattern)
+    ]
+    return max(numbers, default=-1) + 1
+
+
+def extract_plddt(
+    paths: List[Path],
+    outdir: Path,
+    cpus: int = 1,
+    files_per_batch: int = 256,
+    rows_per_part: int = 50_000_000,
+    plddt_dtype: str = "float16",
+) -> int:
+    """Extract the per-residue pLDDT values of many structure files to a Parquet dataset.
+
+    Files that are already in the dataset are skipped, so that an interrupted extraction
+    can be resumed by running it again. Unreadable files are skipped with a warning and
+    retried in the next run. Read the dataset with pd.read_parquet(outdir).
+
+    :param paths: Paths to AlphaFold PDB files (.pdb or .pdb.gz).
+    :param outdir: Directory of the Parquet dataset.
+    :param cpus: Number of processes.
+    :param files_per_batch: Number of files processed by a process at once.
+    :param rows_per_part: Number of residues after which a new Parquet file is started.
+    :param plddt_dtype: Type of the pLDDT column (see plddt_schema).
+    :return: Number of files extracted in this run.
+    """
+    schema = plddt_schema(plddt_dtype)
+    outdir.mkdir(parents=True, exist_ok=True)
+    for tmp in outdir.glob(f".{PART_PREFIX}*"):
+        tmp.unlink()
+    finished = finished_files(outdir)
+    todo = [p for p in paths if str(p) not in finished]
+    logger.info(
+        f"Extracting pLDDT values of {len(todo)} files"
+        f" ({len(paths) - len(todo)} already extracted)"
+    )
+    batches = [
+        (todo[i : i + files_per_batch], plddt_dtype)
+        for i in range(0, len(todo), files_per_batch)
+    ]
+
+    part_number = _next_part_number(outdir)
+    part = {"writer": None, "files": [], "rows": 0}
+
+    def close_part():
+        name = f"{PART_PREFIX}{part_number:05d}"
+        part["writer"].close()
+        # the sidecar first, it only counts once the part exists
+        with open(outdir / f"{FILES_PREFIX}{name}{FILES_SUFFIX}", "w") as f:
+            f.writelines(f"{p}\n" for p in part["files"])
+        (outdir / f".{name}.parquet").rename(outdir / f"{name}.parquet")
+        part.update(writer=None, files=[], rows=0)
+
+    nof_files = 0
+    nof_failed = 0
+    tic = time.time()
+    pool = multiprocessing.Pool(cpus) if cpus > 1 else None
+    try:
+        if pool is None:
+            results = map(_extract_batch, batches)
+        else:
+            results = pool.imap_unordered(_extract_batch, batches)
+        for table, done, failed in results:
+            if part["writer"] is None:
+                part["writer"] = pq.ParquetWriter(
+                    outdir / f".{PART_PREFIX}{part_number:05d}.parquet", schema
+                )
+            part["writer"].write_table(table)
+            part["files"] += done
+            part["rows"] += table.num_rows
+            if part["rows"] >= rows_per_part:
+                close_part()
+                part_number += 1
+            nof_files += len(done)
+            nof_failed += len(failed)
+        if part["writer"] is not None:
+            close_part()
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if part["writer"] is not None:
+            part["writer"].close()
+
+    toc = time.time() - tic
+    logger.info(
+        f"Extracted pLDDT values of {nof_files} files in {toc:.1f} seconds"
+        f" ({nof_files / max(toc, 1e-9) * 3600:.0f} files per hour)."
+        f" Unreadable files: {nof_failed}"
+    )
+    return nof_files
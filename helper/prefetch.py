@@ -0,0 +1,227 @@
+"""Prefetching of input files into a memory-backed directory ahead of their use."""
+import collections
+import logging
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from .constants import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Memory-backed file system of Linux
+SHM_DIR = Path("/dev/shm")
+
+
+class Prefetcher:
+    """Copies the input files of upcoming jobs to a memory-backed directory while the
+    current jobs are running.
+
+    Jobs are parameter tuples with the path to an input file, or a list of paths to the
+    input files (e.g. of a batch), at a fixed position. The prefetcher yields the jobs in
+    order with the paths replaced by the paths to copies in memory. The copies of the next
+    jobs are made by background threads. The copies of a job are removed when the consumer
+    releases the job after computing it.
+
+    Memory is bounded: the copies of at most depth + consumers jobs and at most max_size
+    bytes are held at once. Jobs with files larger than max_size are copied only if
+    nothing else is held. Jobs whose files cannot be copied are yielded unchanged.
+    """
+
+    def __init__(
+        self,
+        depth: int,
+        max_size: int,
+        consumers: int = 1,
+        directory: Optional[Path] = None,
+        threads: int = 4,
+    ):
+        """Create a new prefetcher.
+
+        :param depth: Number of jobs to prefetch ahead of the jobs being computed.
+        :param max_size: Maximum size of all held copies in bytes.
+        :param consumers: Number of jobs computed at the same time.
+        :param directory: Directory for the copies. Default is /dev/shm if it exists,
+                          the system temp dir otherwise.
+        :param threads: Number of threads for copying.
+        """
+        if depth < 1:
+            raise ValueError(f"Invalid prefetch depth: {depth}")
+        if directory is None:
+            directory = SHM_DIR if SHM_DIR.is_dir() else Path(tempfile.gettempdir())
+        self.depth = depth
+        self.max_size = max_size
+        self.max_files = depth + consumers
+        self.directory = directory
+        self.threads = threads
+        self._held: Dict[str, Tuple[Path, int]] = {}
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def _try_reserve(self, key: str, job_dir: Path, size: int, wait: bool) -> bool:
+        """Reserve memory for the copies of a job.
+
+        :param key: Key of the job.
+        :param job_dir: Directory of the copies.
+        :param size: Size of the files in bytes.
+        :param wait: Whether to wait until held copies are released.
+        :return: Whether the memory was reserved.
+        """
+
+        def fits():
+            return len(self._held) == 0 or (
+                len(self._held) < self.max_files and self._size + size <= self.max_size
+            )
+
+        with self._cond:
+            if wait:
+                self._cond.wait_for(fits)
+            elif not fits():
+                return False
+            self._held[key] = (job_dir, size)
+            self._size += size
+            return True
+
+    def release(self, key: str) -> None:
+        """Remove the copies of the input files of a computed job.
+
+        :param key: Key of the job (see prefetch).
+        :return: None
+        """
+        with self._cond:
+            if key not in self._held:
+                return
+            job_dir, size = self._held.pop(key)
+            self._size -= size
+            self._cond.notify_all()
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _copy(self, job: Tuple, path_index: int, key: str, job_dir: Path) -> Tuple:
+        """Copy the input files of a job.
+
+        :param job: Parameter tuple of the job.
+        :param path_index: Position of the path or list of paths to the input files in
+                           the tuple.
+        :param key: Key of the job.
+        :param job_dir: Directory for the copies.
+        :return: The job with the paths to the copies or the unchanged job if a file
+                 could not be copied.
+        """
+        is_list = isinstance(job[path_index], (list, tuple))
+        srcs = (
+            [Path(p) for p in job[path_index]] if is_list else [Path(job[path_index])]
+        )
+        # a directory per file, file names may not be unique
+        dsts = [job_dir / str(i) / src.name for i, src in enumerate(srcs)]
+        try:
+            for src, dst in zip(srcs, dsts):
+                dst.parent.mkdir(parents=True)
+                shutil.copyfile(src, dst)
+        except OSError as e:
+            logger.warning(f"Could not prefetch {src}: {e}")
+            self.release(key)
+            return job
+        return (
+            job[:path_index] + (dsts if is_list else dsts[0],) + job[path_index + 1 :]
+        )
+
+    def prefetch(
+        self, jobs: Iterable[Tuple], path_index: int, key_index: int = 0
+    ) -> Iterator[Tuple]:
+        """Prefetch the input files of jobs.
+
+        Release every yielded job after computing it, otherwise the prefetcher waits
+        forever for memory. The copies are removed when the generator is exhausted, which
+        waits until all jobs are released, or closed.
+
+        :param jobs: Parameter tuples of the jobs.
+        :param path_index: Position of the path or list of paths to the input files in
+                           the tuples.
+        :param key_index: Position of the unique key of a job (for release).
+        :return: Yields the jobs in order with the paths to the copies.
+        """
+        tmp_dir = Path(tempfile.mkdtemp(prefix="prefetch_", dir=self.directory))
+        window = collections.deque()
+        jobs = iter(jobs)
+        pending = None
+        nof_jobs = 0
+        try:
+            with ThreadPoolExecutor(self.threads) as pool:
+                while True:
+                    # keep depth copies in flight, waiting for memory only if none is
+                    while len(window) < self.depth:
+                        if pending is None:
+                            pending = self._next(jobs, path_index)
+                            if pending is None:
+                                break
+                        job, size = pending
+                        key = str(job[key_index])
+                        job_dir = tmp_dir / str(nof_jobs)
+                        if size is None:
+                            window.append((job, None))
+                        elif self._try_reserve(
+                            key, job_dir, size, wait=len(window) == 0
+                        ):
+                            window.append(
+                                (
+                                    job,
+                                    pool.submit(
+                                        self._copy, job, path_index, key, job_dir
+                                    ),
+                                )
+                            )
+                        else:
+                            break
+                        pending = None
+                        nof_jobs += 1
+                    if len(window) == 0:
+                        break
+                    job, future = window.popleft()
+                    yield job if future is None else future.result()
+            # consumers in other threads might still be computing the last jobs
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._held) == 0)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _next(jobs: Iterator[Tuple], path_index: int) -> Optional[Tuple]:
+        """Get the next job and the size of its input files.
+
+        :param jobs: Iterator of parameter tuples.
+        :param path_index: Position of the path or list of paths to the input files in
+                           the tuples.
+        :return: Tuple of the job and the size of its files (None if a file is not
+                 readable) or None if there are no more jobs.
+        """
+        job = next(jobs, None)
+        if job is None:
+            return None
+        paths = job[path_index]
+        if not isinstance(paths, (list, tuple)):
+            paths = [paths]
+        try:
+            return job, sum(Path(p).stat().st_size for p in paths)
+        except OSError:
+            return job, None
+
+
+def get_prefetcher(consumers: int = 1) -> Optional[Prefetcher]:
+    """Get a prefetcher with the settings of the CACHE section of the config.
+
+    :param consumers: Number of jobs computed at the same time.
+    :return: The prefetcher or None if prefetching is disabled.
+    """
+    depth = int(CONFIG["CACHE"]["PREFETCH_DEPTH"])
+    if depth < 1:
+        return None
+    directory = CONFIG["CACHE"]["PREFETCH_DIR"].strip()
+    return Prefetcher(
+        depth,
+        max_size=int(float(CONFIG["CACHE"]["PREFETCH_MAX_SIZE_MB"]) * 1024**2),
+        consumers=consumers,
+        directory=Path(directory) if directory != "" else None,
+    )
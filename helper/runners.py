@@ -1,31 +1,432 @@
+import csv
+import itertools
 import logging
 import multiprocessing
+import queue
+import tempfile
 from pathlib import Path
-from typing import List, Dict
+from typing import TYPE_CHECKING, List, Dict, Tuple, Iterable, Iterator
 
-import pandas as pd
+from .cache import file_digest, get_result_cache
+from .cmdl_calls import (
+    cache_microminer_search,
+    call_tmalign,
+    call_microminer_search,
+    call_microminer_pair,
+    call_microminer_search_batch,
+    get_cached_microminer_search,
+    microminer_supports_batch,
+)
+from .constants import CONFIG
+from .journal import CompletionJournal, param_hash
+from .prefetch import SHM_DIR, Prefetcher, get_prefetcher
+from .tmalign import parse_stdout_records
+from .utils import (
+    TsvWriter,
+    parse_microminer_search_stdout,
+    split_microminer_batch_stdout,
+    unpack_gz,
+)
 
-from .cmdl_calls import call_microminer_search, call_microminer_pair
-from .utils import parse_microminer_search_stdout
+if TYPE_CHECKING:
+    # imported where needed, the runner scripts of HPC tasks must not import pandas
+    import numpy as np
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
 
-def _run_parallel(func, parameter_set, cpus: int):
-    """Helper function to run a function with sets of parameters in parallel.
+def _star_call(func_and_params: Tuple):
+    """Helper function to call a function with a tuple of parameters.
+
+    :param func_and_params: Tuple of the function and its parameter tuple.
+    :return: The return value of the function.
+    """
+    func, params = func_and_params
+    return func(*params)
+
+
+def _run_parallel_unordered(func, parameter_set, cpus: int) -> Iterator:
+    """Helper function to run a function with sets of parameters in parallel and to yield
+    the results as soon as they are finished.
 
     :param func: Compute function.
     :param parameter_set: Parameters.
     :param cpus: Number of CPU cores.
-    :return:
+    :return: Yields the return values in order of completion.
     """
+    with multiprocessing.Pool(cpus) as pool:
+        yield from pool.imap_unordered(
+            _star_call, ((func, params) for params in parameter_set)
+        )
+
+
+def _run_prefetched_unordered(
+    func, parameter_set, cpus: int, prefetcher: Prefetcher
+) -> Iterator:
+    """Helper function to run a function with sets of parameters in parallel, while the
+    input files of the next parameter sets are prefetched, and to yield the results as
+    soon as they are finished.
+
+    Parameter sets are only submitted when their input file is prefetched, so that memory
+    stays bounded. Copies are released as soon as their computation finished.
+
+    :param func: Compute function.
+    :param parameter_set: Parameters. The first entry is a unique key, the second one
+                          the path to the input file.
+    :param cpus: Number of CPU cores.
+    :param prefetcher: Prefetcher for the input files.
+    :return: Yields the return values in order of completion.
+    """
+    finished = queue.Queue()
+
+    def on_finished(key: str, ok: bool):
+        def callback(value):
+            prefetcher.release(key)
+            finished.put((ok, value))
+
+        return callback
 
-    # parallel execution with each parameter set separately
     with multiprocessing.Pool(cpus) as pool:
-        return pool.starmap(
-            func,
-            parameter_set,
+        nof_pending = 0
+        for params in itertools.chain(
+            prefetcher.prefetch(parameter_set, path_index=1), [None]
+        ):
+            if params is not None:
+                key = str(params[0])
+                pool.apply_async(
+                    func,
+                    params,
+                    callback=on_finished(key, True),
+                    error_callback=on_finished(key, False),
+                )
+                nof_pending += 1
+            # yield what finished meanwhile, wait for the rest after the last submission
+            while nof_pending > 0 and (params is None or not finished.empty()):
+                ok, value = finished.get()
+                nof_pending -= 1
+                if not ok:
+                    raise value
+                yield value
+
+
+def _search(
+    query_id: str,
+    pdb_query_path: Path,
+    outdir: Path,
+    mm_mode: str,
+    mm_repr: str,
+    raise_error: bool,
+) -> Dict:
+    """Runs a single MicroMiner search and parses its standard out.
+
+    Parsing happens here, in the worker, so that the raw standard out never has to be sent
+    to the parent process.
+
+    :param query_id: Identifier of the query.
+    :param pdb_query_path: Path to query structure file.
+    :param outdir: Result dir path.
+    :param mm_mode: The search mode of MicroMiner.
+    :param mm_repr: The structure represention mode for MicroMiner.
+    :param raise_error: Whether to raise an error when a MicroMiner call fails.
+    :return: Dict with the query id, exit code, whether the result came from the result
+             cache and parsed MicroMiner standard out.
+    """
+    out = call_microminer_search(pdb_query_path, outdir, mm_mode, mm_repr, raise_error)
+    return {
+        "id": query_id,
+        "exit_code": out["exit_code"],
+        "cache_hit": out["cache_hit"],
+        **parse_microminer_search_stdout(out["stdout"].decode("utf-8")),
+    }
+
+
+def _search_batch(
+    batch_id: str,
+    query_paths: List[Path],
+    query_ids: List[str],
+    outdirs: List[Path],
+    mm_mode: str,
+    mm_repr: str,
+    raise_error: bool,
+) -> List[Dict]:
+    """Runs a batch of MicroMiner searches in a single MicroMiner invocation.
+
+    Queries in the result cache are served from there. If the batch call fails, queries
+    whose section of the standard out does not report the search time (i.e. the failed
+    query and the ones never reached) are searched again one by one. Only these searches
+    raise an error if raise_error is set.
+
+    :param batch_id: Identifier of the batch.
+    :param query_paths: Paths to the query structure files.
+    :param query_ids: Identifiers of the queries.
+    :param outdirs: Result dir paths of the queries.
+    :param mm_mode: The search mode of MicroMiner.
+    :param mm_repr: The structure represention mode for MicroMiner.
+    :param raise_error: Whether to raise an error when a MicroMiner call fails.
+    :return: List of dicts with the query id, exit code, whether the result came from the
+             result cache and parsed MicroMiner standard out. One dict per query.
+    """
+    out_parsed_list = []
+    uncached_queries = []
+    for query_id, pdb_query_path, outdir in zip(query_ids, query_paths, outdirs):
+        out = get_cached_microminer_search(pdb_query_path, outdir, mm_mode, mm_repr)
+        if out is None:
+            uncached_queries.append((query_id, pdb_query_path, outdir))
+        else:
+            out_parsed_list.append(
+                {
+                    "id": query_id,
+                    "exit_code": out["exit_code"],
+                    "cache_hit": True,
+                    **parse_microminer_search_stdout(out["stdout"].decode("utf-8")),
+                }
+            )
+    if len(uncached_queries) == 0:
+        return out_parsed_list
+
+    with tempfile.TemporaryDirectory() as t:
+        # failed queries are searched again alone, which raises the error if requested
+        out = call_microminer_search_batch(
+            [(q[1], q[2]) for q in uncached_queries],
+            Path(t) / "query_list.tsv",
+            mm_mode,
+            mm_repr,
+            raise_error=False,
+        )
+    sections = split_microminer_batch_stdout(out["stdout"].decode("utf-8"))
+
+    for query_id, pdb_query_path, outdir in uncached_queries:
+        section = sections.get(str(pdb_query_path.resolve()), "")
+        out_parsed = parse_microminer_search_stdout(section)
+        if out["exit_code"] != 0 and out_parsed["search_time"] is None:
+            logger.warning(
+                f"Batch search failed for {pdb_query_path}. Searching alone."
+            )
+            out_parsed_list.append(
+                _search(query_id, pdb_query_path, outdir, mm_mode, mm_repr, raise_error)
+            )
+            continue
+        cache_microminer_search(
+            pdb_query_path,
+            outdir,
+            mm_mode,
+            mm_repr,
+            section.encode("utf-8"),
+            b"",
+        )
+        out_parsed_list.append(
+            {"id": query_id, "exit_code": 0, "cache_hit": False, **out_parsed}
+        )
+    return out_parsed_list
+
+
+def _pair(
+    pair_id: str,
+    pdb_query_path: Path,
+    pdb_target_path: Path,
+    outdir: Path,
+    raise_error: bool,
+) -> Dict:
+    """Runs a single MicroMiner pair alignment.
+
+    :param pair_id: Identifier of the structure pair.
+    :param pdb_query_path: Path to query structure file.
+    :param pdb_target_path: Path to target structure file.
+    :param outdir: Result dir path.
+    :param raise_error: Whether to raise an error when a MicroMiner call fails.
+    :return: Dict with the pair id, the exit code of MicroMiner and whether the result
+             came from the result cache.
+    """
+    out = call_microminer_pair(pdb_query_path, pdb_target_path, outdir, raise_error)
+    return {"id": pair_id, "exit_code": out["exit_code"], "cache_hit": out["cache_hit"]}
+
+
+def _unpack_structure(structure_path: Path, local_path: Path) -> Path:
+    """Decompresses a structure file.
+
+    :param structure_path: Path to the gzipped structure file.
+    :param local_path: Path for the decompressed file.
+    :return: local_path.
+    """
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    unpack_gz(structure_path, local_path)
+    return local_path
+
+
+def _unpack_structures(structure_paths: "pd.Series", tmpdir: Path, cpus: int) -> Dict:
+    """Decompresses every unique gzipped structure file once.
+
+    :param structure_paths: Paths to the structure files.
+    :param tmpdir: Directory for the decompressed files.
+    :param cpus: Number CPU cores to use.
+    :return: Dict mapping the given paths (as str) to paths readable by TM-align.
+    """
+    local_paths = {}
+    parameter_set = []
+    for i, path in enumerate(structure_paths.astype(str).unique()):
+        if path.endswith(".gz"):
+            # a directory per file, file names might not be unique
+            local_path = tmpdir / "structures" / str(i) / Path(path).stem
+            parameter_set.append((Path(path), local_path))
+            local_paths[path] = local_path
+        else:
+            local_paths[path] = Path(path)
+    logger.info(f"Decompressing {len(parameter_set)} structure files")
+    if cpus > 1:
+        for _ in _run_parallel_unordered(_unpack_structure, parameter_set, cpus):
+            pass
+    else:
+        for param_set in parameter_set:
+            _unpack_structure(*param_set)
+    return local_paths
+
+
+def _tmalign(
+    id1: str,
+    pdb_query_path: Path,
+    id2: str,
+    pdb_target_path: Path,
+    scratch_dir: Path,
+    read_alignment: bool,
+    split_flag: int,
+    ter_flag: int,
+    raise_error: bool,
+) -> List[Dict]:
+    """Runs a single TM-align alignment and parses its output.
+
+    :param id1: Identifier of the query.
+    :param pdb_query_path: Path to the decompressed query structure file.
+    :param id2: Identifier of the target.
+    :param pdb_target_path: Path to the decompressed target structure file.
+    :param scratch_dir: Directory for the output files of TM-align.
+    :param read_alignment: Whether to parse the alignment.
+    :param split_flag: Split strategy of TM-align.
+    :param ter_flag: Ter-flag of TM-align.
+    :param raise_error: Whether to raise an error when a TM-align call fails.
+    :return: Parsed alignments (see tmalign.parse_stdout_records) with the exit code of
+             TM-align. A single record without alignment if TM-align failed.
+    """
+    with tempfile.TemporaryDirectory(dir=scratch_dir) as t:
+        out = call_tmalign(
+            pdb_query_path,
+            pdb_target_path,
+            Path(t) / "out",
+            "out",
+            write_rotation=False,
+            split_flag=split_flag,
+            ter_flag=ter_flag,
+            raise_error=raise_error,
+        )
+    records = []
+    if out["exit_code"] == 0 and out["stdout"]:
+        records = parse_stdout_records(out["stdout"], read_alignment=read_alignment)
+    if len(records) == 0:
+        return [{"id1": id1, "id2": id2, "exit_code": out["exit_code"]}]
+    # TM-align uses the file names as ids, which might differ from our identifiers
+    return [
+        {**record._asdict(), "id1": id1, "id2": id2, "exit_code": out["exit_code"]}
+        for record in records
+    ]
+
+
+def _log_result_cache_usage(nof_hits: int, nof_jobs: int) -> None:
+    """Logs the usage of the result cache and evicts old results if it grew too large.
+
+    :param nof_hits: Number of jobs served from the result cache.
+    :param nof_jobs: Number of jobs.
+    :return: None
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return
+    logger.info(
+        f"Result cache: {nof_hits} hits, {nof_jobs - nof_hits} misses"
+        f" ({cache.directory})"
+    )
+    cache.evict()
+
+
+def _microminer_params(**params) -> dict:
+    """Collects the parameters that determine a MicroMiner result.
+
+    Structure files should enter the parameters by file name only, because HPC tasks may
+    read node-local copies of the same files.
+
+    :param params: Further job specific parameters.
+    :return: Dict of the parameters.
+    """
+    exe = Path(CONFIG["EXECUTABLES"]["MICROMINER"])
+    try:
+        exe_stat = exe.stat()
+        exe_identity = [str(exe.resolve()), exe_stat.st_size, exe_stat.st_mtime_ns]
+    except OSError:
+        exe_identity = [str(exe)]
+    return {
+        "algo": dict(CONFIG["MICROMINER_ALGO"]),
+        "exe": exe_identity,
+        **params,
+    }
+
+
+def _read_param_tsv(param_tsv: Path, columns: List[str]) -> List[Tuple[str, ...]]:
+    """Read columns of a parameter file without pandas.
+
+    The values are read verbatim as str. Duplicate rows are dropped.
+
+    :param param_tsv: The parameter file (TSV with header).
+    :param columns: Columns to read.
+    :return: List of value tuples in order of the file.
+    """
+    with open(param_tsv, "r", newline="") as f:
+        reader = csv.DictReader(f, delimiter="\t")
+        if reader.fieldnames is None or not all(
+            c in reader.fieldnames for c in columns
+        ):
+            raise ValueError(f"Missing mandatory fields in TSV: {param_tsv}")
+        rows = [tuple(row[c] for c in columns) for row in reader]
+    logger.info(f"Read {len(rows)} parameter records for computation")
+    return list(dict.fromkeys(rows))
+
+
+def _table_rows(df: "pd.DataFrame", columns: List[str]) -> List[Tuple[str, ...]]:
+    """Get columns of a parameter table as rows of str like _read_param_tsv.
+
+    :param df: The parameter table.
+    :param columns: Columns to get.
+    :return: List of value tuples in order of the table.
+    """
+    rows = df[columns].astype(str).itertuples(index=False, name=None)
+    return list(dict.fromkeys(rows))
+
+
+def _filter_finished(
+    parameter_set: List[Tuple], param_hashes: Dict[str, str], outdir: Path
+) -> List[Tuple]:
+    """Removes jobs from a parameter set that finished successfully in an earlier run.
+
+    A job is finished if the journal in outdir has a successful entry with identical
+    parameters and its result file exists.
+
+    :param parameter_set: Parameter tuples. The first entry is the job id, which is also
+                          the name of the job's result dir.
+    :param param_hashes: Dict mapping job ids to parameter hashes.
+    :param outdir: Directory of results and the completion journal.
+    :return: The parameter tuples of unfinished jobs.
+    """
+    successful = CompletionJournal(outdir).successful()
+    unfinished = [
+        params
+        for params in parameter_set
+        if successful.get(params[0]) != param_hashes[params[0]]
+        or not (outdir / params[0] / "resultStatistic.csv").is_file()
+    ]
+    if len(unfinished) < len(parameter_set):
+        logger.info(
+            f"Skipping {len(parameter_set) - len(unfinished)} of {len(parameter_set)}"
+            f" jobs that finished in an earlier run"
         )
+    return unfinished
 
 
 class MicroMinerSearch:
@@ -34,7 +435,14 @@ class MicroMinerSearch:
     MANDATORY_TSV_COLUMNS = ["id", "structure_path"]
 
     def __init__(
-        self, mm_mode: str, mm_repr: str, cpus: int = 1, raise_error: bool = True
+        self,
+        mm_mode: str,
+        mm_repr: str,
+        cpus: int = 1,
+        raise_error: bool = True,
+        batch: bool = True,
+        resume: bool = True,
+        batch_size: int = 16,
     ):
         """Create a new runner.
 
@@ -42,52 +450,211 @@ class MicroMinerSearch:
         :param mm_repr: The structure represention mode for MicroMiner.
         :param cpus: Number CPU cores to use.
         :param raise_error: Whether to raise an error when a MicroMiner call fails.
+        :param batch: Whether to search many queries per MicroMiner invocation, so that the
+                      k-mer index is read once per batch instead of once per query. Only
+                      used if the MicroMiner executable supports it.
+        :param resume: Whether to skip queries that finished successfully in an earlier run
+                       with the same parameters (according to the journal in the outdir).
+        :param batch_size: Number of queries per MicroMiner invocation in batch mode.
+                           Results are available when their batch finished, so smaller
+                           batches stream results earlier at the cost of more index reads.
         """
+        if batch_size < 1:
+            raise ValueError(f"Invalid batch size: {batch_size}")
         self.cpus = cpus
         self.raise_error = raise_error
         self.mm_mode = mm_mode
         self.mm_repr = mm_repr
+        self.batch = batch
+        self.resume = resume
+        self.batch_size = batch_size
 
     def run(self, param_tsv: Path, outdir: Path) -> List[Dict]:
         """Run MicroMiner searches.
 
         :param param_tsv: The parameter file with input to MicroMiner.
         :param outdir: Directory for writing results.
-        :return: List of detailed MicroMiner output (return code, standard out, standard error)
+        :return: List of parsed MicroMiner output (query id, exit code and timings).
         """
-        df = pd.read_csv(param_tsv, sep="\t", header=0)
-        logger.info(f"Read {df.shape[0]} parameter records for computation")
+        return list(self.iter_run(param_tsv, outdir))
 
-        if not all(c in df.columns for c in MicroMinerSearch.MANDATORY_TSV_COLUMNS):
-            raise ValueError(f"Missing mandatory fields in TSV: {param_tsv}")
+    def run_to_tsv(self, param_tsv: Path, outdir: Path, perf_tsv: Path) -> int:
+        """Run MicroMiner searches and write the parsed output of each search to a TSV file
+        as soon as the search is finished.
 
-        # generate a list of parameter tuple containing the PDB pairs to be aligned.
-        parameter_set = [
+        Memory stays flat for arbitrarily large inputs and an interrupted run leaves a
+        readable TSV file of all finished searches.
+
+        :param param_tsv: The parameter file with input to MicroMiner.
+        :param outdir: Directory for writing results.
+        :param perf_tsv: TSV file for the parsed MicroMiner output (query id, exit code
+                         and timings). Appended to when resuming.
+        :return: Number of finished searches.
+        """
+        nof_finished = 0
+        with TsvWriter(perf_tsv, append=self.resume) as writer:
+            for out_parsed in self.iter_run(param_tsv, outdir):
+                writer.write(out_parsed)
+                nof_finished += 1
+        return nof_finished
+
+    def iter_run(self, param_tsv: Path, outdir: Path) -> Iterator[Dict]:
+        """Run MicroMiner searches and yield the parsed output of each search as soon as it
+        is finished (in order of completion).
+
+        Every finished search is recorded in the completion journal of the outdir.
+
+        :param param_tsv: The parameter file with input to MicroMiner.
+        :param outdir: Directory for writing results.
+        :return: Yields parsed MicroMiner output (query id, exit code and timings).
+        """
+        rows = _read_param_tsv(param_tsv, MicroMinerSearch.MANDATORY_TSV_COLUMNS)
+        parameter_set = self._parameter_set(rows, outdir)
+        del rows
+
+        param_hashes = self.param_hashes(parameter_set)
+        if self.resume:
+            parameter_set = _filter_finished(parameter_set, param_hashes, outdir)
+
+        journal = CompletionJournal(outdir)
+        nof_hits = 0
+        for out_parsed in self._iter_search(parameter_set):
+            journal.record(
+                out_parsed["id"],
+                out_parsed["exit_code"],
+                param_hashes[out_parsed["id"]],
+            )
+            nof_hits += out_parsed["cache_hit"]
+            yield out_parsed
+        _log_result_cache_usage(nof_hits, len(parameter_set))
+
+    def _parameter_set(self, rows: Iterable[Tuple], outdir: Path) -> List[Tuple]:
+        """Generate a list of parameter tuples for _search from the parameter rows.
+
+        :param rows: Values of the MANDATORY_TSV_COLUMNS of the parameter rows.
+        :param outdir: Directory for writing results.
+        :return: List of parameter tuples.
+        """
+        return [
             (
-                Path(getattr(row, MicroMinerSearch.MANDATORY_TSV_COLUMNS[1])),
-                outdir
-                / "{}".format(getattr(row, MicroMinerSearch.MANDATORY_TSV_COLUMNS[0])),
+                str(query_id),
+                Path(query_path),
+                outdir / str(query_id),
                 self.mm_mode,
                 self.mm_repr,
                 self.raise_error,
             )
-            for row in df.drop_duplicates().itertuples(index=False)
+            for query_id, query_path in rows
         ]
 
-        out_list = []
-        if self.cpus > 1:
-            out_list = _run_parallel(call_microminer_search, parameter_set, self.cpus)
+    def unfinished_rows(self, df: "pd.DataFrame", outdir: Path) -> "pd.DataFrame":
+        """Get the rows of a parameter table that did not finish successfully in an
+        earlier run with the same parameters.
+
+        :param df: The parameter table.
+        :param outdir: Directory of results and the completion journal.
+        :return: The parameter table rows that still need to be computed.
+        """
+        parameter_set = self._parameter_set(
+            _table_rows(df, MicroMinerSearch.MANDATORY_TSV_COLUMNS), outdir
+        )
+        unfinished_ids = {
+            p[0]
+            for p in _filter_finished(
+                parameter_set, self.param_hashes(parameter_set), outdir
+            )
+        }
+        return df[self.row_ids(df).isin(unfinished_ids)]
+
+    def row_ids(self, df: "pd.DataFrame") -> "pd.Series":
+        """Get the job id (query id) of every row of a parameter table.
+
+        :param df: The parameter table.
+        :return: The job ids with the index of df.
+        """
+        return df[MicroMinerSearch.MANDATORY_TSV_COLUMNS[0]].astype(str)
+
+    def param_hashes(self, parameter_set: List[Tuple]) -> Dict[str, str]:
+        """Hash the parameters of each search for the completion journal.
+
+        :param parameter_set: List of parameter tuples as for _search.
+        :return: Dict mapping query ids to parameter hashes.
+        """
+        run_params = _microminer_params(
+            mode=self.mm_mode,
+            repr=self.mm_repr,
+            index=Path(CONFIG["DATABASES"]["SITE_SEARCH_DB"]).name,
+        )
+        return {
+            p[0]: param_hash({**run_params, "query": p[1].name}) for p in parameter_set
+        }
+
+    def _iter_search(self, parameter_set: List[Tuple]) -> Iterator[Dict]:
+        """Run MicroMiner searches for a parameter set.
+
+        Query structures are read from copies in memory that are prefetched while earlier
+        searches run (see PREFETCH_DEPTH in the config). In batch mode, the query
+        structures of a batch are prefetched together.
+
+        :param parameter_set: List of parameter tuples as for _search.
+        :return: Yields parsed MicroMiner output (one dict per query).
+        """
+        batched = self.batch and microminer_supports_batch(
+            str(Path(CONFIG["EXECUTABLES"]["MICROMINER"]).resolve())
+        )
+        if batched:
+            func, job_set = _search_batch, self._batch_set(parameter_set)
+        else:
+            func, job_set = _search, parameter_set
+        # copy the next query structures to memory while the current searches run
+        prefetcher = get_prefetcher(consumers=self.cpus)
+        if prefetcher is not None and self.cpus > 1:
+            out_iter = _run_prefetched_unordered(func, job_set, self.cpus, prefetcher)
+        elif prefetcher is not None:
+
+            def prefetched():
+                for job in prefetcher.prefetch(job_set, path_index=1):
+                    out = func(*job)
+                    prefetcher.release(job[0])
+                    yield out
+
+            out_iter = prefetched()
+        elif self.cpus > 1:
+            out_iter = _run_parallel_unordered(func, job_set, self.cpus)
         else:
-            for param_set in parameter_set:
-                out = call_microminer_search(*param_set)
-                out_list.append(out)
-        out_parsed_list = []
-        for out in out_list:
-            parsed_stdout = parse_microminer_search_stdout(
-                out["stdout"].decode("utf-8")
+            out_iter = (func(*job) for job in job_set)
+        for out in out_iter:
+            if batched:
+                yield from out
+            else:
+                yield out
+
+    def _batch_set(self, parameter_set: List[Tuple]) -> List[Tuple]:
+        """Split a parameter set into batches of batch_size queries per MicroMiner
+        invocation. The results of a batch are available as soon as the batch finished.
+
+        :param parameter_set: List of parameter tuples as for _search.
+        :return: List of parameter tuples as for _search_batch.
+        """
+        batch_set = []
+        for i in range(0, len(parameter_set), self.batch_size):
+            batch = parameter_set[i : i + self.batch_size]
+            batch_set.append(
+                (
+                    f"batch_{i // self.batch_size}",
+                    [p[1] for p in batch],
+                    [p[0] for p in batch],
+                    [p[2] for p in batch],
+                    self.mm_mode,
+                    self.mm_repr,
+                    self.raise_error,
+                )
             )
-            out_parsed_list.append(parsed_stdout)
-        return out_parsed_list
+        logger.info(
+            f"Searching {len(parameter_set)} queries in {len(batch_set)} MicroMiner"
+            f" batches"
+        )
+        return batch_set
 
 
 class MicroMinerPair:
@@ -95,45 +662,464 @@ class MicroMinerPair:
 
     MANDATORY_TSV_COLUMNS = ["id1", "structure_path1", "id2", "structure_path2"]
 
-    def __init__(self, cpus: int = 1, raise_error: bool = True):
+    def __init__(self, cpus: int = 1, raise_error: bool = True, resume: bool = True):
         """Construct a new runner.
 
         :param cpus: Number CPU cores to use.
         :param raise_error: Whether to raise an error when a MicroMiner call fails.
+        :param resume: Whether to skip pairs that finished successfully in an earlier run
+                       with the same parameters (according to the journal in the outdir).
         """
         self.cpus = cpus
         self.raise_error = raise_error
+        self.resume = resume
 
     def run(self, param_tsv: Path, outdir: Path):
         """Run MicroMiner pair alignment.
 
+        Every finished alignment is recorded in the completion journal of the outdir.
+
         :param param_tsv: The parameter file with input to MicroMiner.
         :param outdir: Directory for writing results.
         :return: None
         """
+        rows = _read_param_tsv(param_tsv, MicroMinerPair.MANDATORY_TSV_COLUMNS)
+        parameter_set = self._parameter_set(rows, outdir)
+
+        param_hashes = self.param_hashes(parameter_set)
+        if self.resume:
+            parameter_set = _filter_finished(parameter_set, param_hashes, outdir)
+
+        journal = CompletionJournal(outdir)
+        if self.cpus > 1:
+            out_iter = _run_parallel_unordered(_pair, parameter_set, self.cpus)
+        else:
+            out_iter = (_pair(*param_set) for param_set in parameter_set)
+        nof_hits = 0
+        for out in out_iter:
+            journal.record(out["id"], out["exit_code"], param_hashes[out["id"]])
+            nof_hits += out["cache_hit"]
+        _log_result_cache_usage(nof_hits, len(parameter_set))
+
+    def _parameter_set(self, rows: Iterable[Tuple], outdir: Path) -> List[Tuple]:
+        """Generate a list of parameter tuples for _pair from the parameter rows.
+
+        :param rows: Values of the MANDATORY_TSV_COLUMNS of the parameter rows.
+        :param outdir: Directory for writing results.
+        :return: List of parameter tuples.
+        """
+        return [
+            (
+                f"{id1}_{id2}",
+                Path(path1),
+                Path(path2),
+                outdir / f"{id1}_{id2}",
+                self.raise_error,
+            )
+            for id1, path1, id2, path2 in rows
+        ]
+
+    def unfinished_rows(self, df: "pd.DataFrame", outdir: Path) -> "pd.DataFrame":
+        """Get the rows of a parameter table that did not finish successfully in an
+        earlier run with the same parameters.
+
+        :param df: The parameter table.
+        :param outdir: Directory of results and the completion journal.
+        :return: The parameter table rows that still need to be computed.
+        """
+        parameter_set = self._parameter_set(
+            _table_rows(df, MicroMinerPair.MANDATORY_TSV_COLUMNS), outdir
+        )
+        unfinished_ids = {
+            p[0]
+            for p in _filter_finished(
+                parameter_set, self.param_hashes(parameter_set), outdir
+            )
+        }
+        return df[self.row_ids(df).isin(unfinished_ids)]
+
+    def row_ids(self, df: "pd.DataFrame") -> "pd.Series":
+        """Get the job id (pair id) of every row of a parameter table.
+
+        :param df: The parameter table.
+        :return: The job ids with the index of df.
+        """
+        return (
+            df[MicroMinerPair.MANDATORY_TSV_COLUMNS[0]].astype(str)
+            + "_"
+            + df[MicroMinerPair.MANDATORY_TSV_COLUMNS[2]].astype(str)
+        )
+
+    def param_hashes(self, parameter_set: List[Tuple]) -> Dict[str, str]:
+        """Hash the parameters of each pair alignment for the completion journal.
+
+        :param parameter_set: List of parameter tuples as for _pair.
+        :return: Dict mapping pair ids to parameter hashes.
+        """
+        run_params = _microminer_params(mode="site_align")
+        return {
+            p[0]: param_hash({**run_params, "query": p[1].name, "target": p[2].name})
+            for p in parameter_set
+        }
+
+
+class TMAlignBatch:
+    """Manages execution of TM-align pair alignments in parallel.
+
+    TM-align cannot read gzipped files. Every gzipped structure of the pair table is
+    decompressed once to a memory-backed directory and reused by all pairs it is part of.
+    """
+
+    MANDATORY_TSV_COLUMNS = ["id1", "structure_path1", "id2", "structure_path2"]
+    RESULT_COLUMNS = [
+        "id1",
+        "chain_id1",
+        "id2",
+        "chain_id2",
+        "exit_code",
+        "chain1_len",
+        "chain2_len",
+        "align_len",
+        "rmsd",
+        "seqid",
+        "tm_score1",
+        "tm_score2",
+    ]
+    ALIGNMENT_COLUMNS = ["refseq", "matching", "targetseq"]
+
+    def __init__(
+        self,
+        cpus: int = 1,
+        read_alignment: bool = False,
+        split_flag: int = 0,
+        ter_flag: int = None,
+        raise_error: bool = True,
+        cache_dir: Path = None,
+    ):
+        """Create a new runner.
+
+        :param cpus: Number CPU cores to use.
+        :param read_alignment: Whether to parse the alignments.
+        :param split_flag: Split strategy of TM-align (see call_tmalign).
+        :param ter_flag: Ter-flag of TM-align (see call_tmalign).
+        :param raise_error: Whether to raise an error when a TM-align call fails.
+        :param cache_dir: Directory for the decompressed structures. Default is /dev/shm if
+                          it exists, the system temp dir otherwise. Needs space for all
+                          structures of the pair table.
+        """
+        self.cpus = cpus
+        self.read_alignment = read_alignment
+        self.split_flag = split_flag
+        self.ter_flag = ter_flag
+        self.raise_error = raise_error
+        if cache_dir is None:
+            cache_dir = SHM_DIR if SHM_DIR.is_dir() else Path(tempfile.gettempdir())
+        self.cache_dir = cache_dir
+
+    @property
+    def columns(self) -> List[str]:
+        """Columns of the result table.
+
+        :return: List of column names.
+        """
+        if self.read_alignment:
+            return TMAlignBatch.RESULT_COLUMNS + TMAlignBatch.ALIGNMENT_COLUMNS
+        return TMAlignBatch.RESULT_COLUMNS
+
+    def run(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        """Run TM-align for all pairs of a pair table.
+
+        :param df: The pair table with the columns MANDATORY_TSV_COLUMNS.
+        :return: Table with one row per parsed alignment (several per pair with split
+                 flag 2) in order of completion.
+        """
+        import pandas as pd
+
+        return pd.DataFrame(list(self.iter_run(df)), columns=self.columns)
+
+    def run_to_tsv(self, param_tsv: Path, out_tsv: Path) -> int:
+        """Run TM-align for all pairs of a parameter file and write every parsed
+        alignment to a TSV file as soon as it is finished.
+
+        :param param_tsv: The parameter file with the pairs.
+        :param out_tsv: TSV file for the parsed alignments.
+        :return: Number of written alignments.
+        """
+        import pandas as pd
+
+        df = pd.read_csv(param_tsv, sep="\t", header=0)
+        logger.info(f"Read {df.shape[0]} parameter records for computation")
+        nof_records = 0
+        with TsvWriter(out_tsv) as writer:
+            for record in self.iter_run(df):
+                writer.write(record)
+                nof_records += 1
+        return nof_records
+
+    def iter_run(self, df: "pd.DataFrame") -> Iterator[Dict]:
+        """Run TM-align for all pairs of a pair table and yield the parsed alignments as
+        soon as they are finished (in order of completion).
+
+        :param df: The pair table with the columns MANDATORY_TSV_COLUMNS.
+        :return: Yields dicts with the columns of the result table.
+        """
+        import pandas as pd
+
+        if not all(c in df.columns for c in TMAlignBatch.MANDATORY_TSV_COLUMNS):
+            raise ValueError("Missing mandatory fields in pair table")
+        df = df[TMAlignBatch.MANDATORY_TSV_COLUMNS].drop_duplicates()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="tmalign_", dir=self.cache_dir) as t:
+            tmpdir = Path(t)
+            local_paths = _unpack_structures(
+                pd.concat([df["structure_path1"], df["structure_path2"]]),
+                tmpdir,
+                self.cpus,
+            )
+            parameter_set = [
+                (
+                    str(id1),
+                    local_paths[str(path1)],
+                    str(id2),
+                    local_paths[str(path2)],
+                    tmpdir,
+                    self.read_alignment,
+                    self.split_flag,
+                    self.ter_flag,
+                    self.raise_error,
+                )
+                for id1, path1, id2, path2 in df.itertuples(index=False)
+            ]
+            if self.cpus > 1:
+                out_iter = _run_parallel_unordered(_tmalign, parameter_set, self.cpus)
+            else:
+                out_iter = (_tmalign(*param_set) for param_set in parameter_set)
+            for records in out_iter:
+                for record in records:
+                    yield {c: record.get(c) for c in self.columns}
+
+
+class TMAlignAllVsAll:
+    """Manages execution of the TM-align alignments of the blocks of an all-vs-all
+    comparison in parallel (see all_vs_all).
+
+    The input rows are blocks of rows of the TM-score matrix (see all_vs_all.prepare).
+    The scores of every finished block are written to a block file in the outdir and
+    recorded in the completion journal. Gzipped structures are decompressed once per run
+    and reused by all blocks.
+    """
+
+    MANDATORY_TSV_COLUMNS = ["block", "first_row", "last_row", "min_tm_score"]
+
+    def __init__(
+        self,
+        index_dir: Path,
+        cpus: int = 1,
+        split_flag: int = 0,
+        ter_flag: int = None,
+        raise_error: bool = False,
+        resume: bool = True,
+        cache_dir: Path = None,
+    ):
+        """Create a new runner.
+
+        :param index_dir: Output directory of the comparison with the index of the
+                          structures. Must be accessible from all HPC nodes.
+        :param cpus: Number CPU cores to use.
+        :param split_flag: Split strategy of TM-align (see call_tmalign).
+        :param ter_flag: Ter-flag of TM-align (see call_tmalign).
+        :param raise_error: Whether to raise an error when a TM-align call fails.
+                            Otherwise, the scores of failed alignments are NaN.
+        :param resume: Whether to skip blocks that finished in an earlier run with the
+                       same parameters (according to the journal in the outdir).
+        :param cache_dir: Directory for the decompressed structures. Default is /dev/shm
+                          if it exists, the system temp dir otherwise.
+        """
+        self.index_dir = index_dir.resolve()
+        self.cpus = cpus
+        self.split_flag = split_flag
+        self.ter_flag = ter_flag
+        self.raise_error = raise_error
+        self.resume = resume
+        if cache_dir is None:
+            cache_dir = SHM_DIR if SHM_DIR.is_dir() else Path(tempfile.gettempdir())
+        self.cache_dir = cache_dir
+
+    def run(self, param_tsv: Path, outdir: Path) -> None:
+        """Run TM-align for all pairs of the blocks of a parameter file.
+
+        :param param_tsv: The parameter file with the blocks.
+        :param outdir: Directory for the block files and the completion journal.
+        :return: None
+        """
+        import numpy as np
+        import pandas as pd
+
+        from . import all_vs_all
+
         df = pd.read_csv(param_tsv, sep="\t", header=0)
         logger.info(f"Read {df.shape[0]} parameter records for computation")
 
-        if not all(c in df.columns for c in MicroMinerPair.MANDATORY_TSV_COLUMNS):
+        if not all(c in df.columns for c in TMAlignAllVsAll.MANDATORY_TSV_COLUMNS):
             raise ValueError(f"Missing mandatory fields in TSV: {param_tsv}")
 
-        # generate a list of parameter tuple containing the PDB pairs to be aligned.
+        if self.resume:
+            df = self.unfinished_rows(df, outdir)
+        param_hashes = self.param_hashes(df)
+        block_ids = self.row_ids(df)
+
+        df_index = all_vs_all.read_index(self.index_dir)
+        index_digest = file_digest(self.index_dir / all_vs_all.INDEX_TSV)
+        lengths = df_index["length"].to_numpy()
+        pairs = [
+            all_vs_all.block_pairs(
+                lengths, row.first_row, row.last_row, row.min_tm_score
+            )
+            for row in df.itertuples(index=False)
+        ]
+        # structures of the pairs of all blocks
+        rows = np.unique(
+            np.concatenate([np.empty(0, np.int32)] + [r for p in pairs for r in p])
+        )
+
+        journal = CompletionJournal(outdir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="tmalign_", dir=self.cache_dir) as t:
+            tmpdir = Path(t)
+            paths = df_index["structure_path"]
+            local_paths = _unpack_structures(paths.iloc[rows], tmpdir, self.cpus)
+            for row, block_id, (rows_i, rows_j) in zip(
+                df.itertuples(index=False), block_ids, pairs
+            ):
+                scores = self._align_block(rows_i, rows_j, paths, local_paths, tmpdir)
+                all_vs_all.write_block(
+                    all_vs_all.block_file(outdir, row.block),
+                    {
+                        "first_row": row.first_row,
+                        "last_row": row.last_row,
+                        "min_tm_score": row.min_tm_score,
+                        "index_digest": index_digest,
+                    },
+                    scores,
+                )
+                journal.record(block_id, 0, param_hashes[block_id])
+
+    def _align_block(
+        self,
+        rows_i: "np.ndarray",
+        rows_j: "np.ndarray",
+        paths: "pd.Series",
+        local_paths: Dict,
+        tmpdir: Path,
+    ) -> Dict[str, "np.ndarray"]:
+        """Align the pairs of a block.
+
+        :param rows_i: Rows of the first structures of the pairs.
+        :param rows_j: Rows of the second structures of the pairs.
+        :param paths: Paths to the structure files of all rows.
+        :param local_paths: Dict mapping the paths to paths readable by TM-align.
+        :param tmpdir: Directory for the output files of TM-align.
+        :return: Dict with the rows i and j of the pairs and their tm_score1 and
+                 tm_score2 (NaN for failed alignments).
+        """
+        import numpy as np
+
         parameter_set = [
             (
-                Path(getattr(row, MicroMinerPair.MANDATORY_TSV_COLUMNS[1])),
-                Path(getattr(row, MicroMinerPair.MANDATORY_TSV_COLUMNS[3])),
-                outdir
-                / "{}_{}".format(
-                    getattr(row, MicroMinerPair.MANDATORY_TSV_COLUMNS[0]),
-                    getattr(row, MicroMinerPair.MANDATORY_TSV_COLUMNS[2]),
-                ),
+                str(k),
+                local_paths[paths.iat[i]],
+                str(k),
+                local_paths[paths.iat[j]],
+                tmpdir,
+                False,
+                self.split_flag,
+                self.ter_flag,
                 self.raise_error,
             )
-            for row in df.drop_duplicates().itertuples(index=False)
+            for k, (i, j) in enumerate(zip(rows_i, rows_j))
         ]
-
         if self.cpus > 1:
-            _run_parallel(call_microminer_pair, parameter_set, self.cpus)
+            out_iter = _run_parallel_unordered(_tmalign, parameter_set, self.cpus)
         else:
-            for param_set in parameter_set:
-                call_microminer_pair(*param_set)
+            out_iter = (_tmalign(*param_set) for param_set in parameter_set)
+        tm_score1 = np.full(rows_i.shape[0], np.nan, dtype=np.float32)
+        tm_score2 = np.full(rows_i.shape[0], np.nan, dtype=np.float32)
+        nof_failed = 0
+        for records in out_iter:
+            # the first alignment, the only one without split
+            record = records[0]
+            if record.get("tm_score1") is None:
+                nof_failed += 1
+                continue
+            k = int(record["id1"])
+            tm_score1[k] = record["tm_score1"]
+            tm_score2[k] = record["tm_score2"]
+        if nof_failed > 0:
+            logger.warning(f"{nof_failed} of {len(parameter_set)} alignments failed")
+        return {
+            "i": rows_i,
+            "j": rows_j,
+            "tm_score1": tm_score1,
+            "tm_score2": tm_score2,
+        }
+
+    def unfinished_rows(self, df: "pd.DataFrame", outdir: Path) -> "pd.DataFrame":
+        """Get the blocks of a parameter table that did not finish in an earlier run
+        with the same parameters.
+
+        :param df: The parameter table.
+        :param outdir: Directory of the block files and the completion journal.
+        :return: The parameter table rows that still need to be computed.
+        """
+        from . import all_vs_all
+
+        successful = CompletionJournal(outdir).successful()
+        param_hashes = self.param_hashes(df)
+        finished = [
+            successful.get(block_id) == param_hashes[block_id]
+            and all_vs_all.block_file(outdir, block).is_file()
+            for block_id, block in zip(self.row_ids(df), df["block"])
+        ]
+        if any(finished):
+            logger.info(
+                f"Skipping {sum(finished)} of {df.shape[0]} blocks that finished in an"
+                f" earlier run"
+            )
+        return df[[not f for f in finished]]
+
+    def row_ids(self, df: "pd.DataFrame") -> "pd.Series":
+        """Get the job id (block name) of every row of a parameter table.
+
+        :param df: The parameter table.
+        :return: The job ids with the index of df.
+        """
+        from . import all_vs_all
+
+        return df["block"].map(lambda block: f"{all_vs_all.BLOCK_PREFIX}{block:05d}")
+
+    def param_hashes(self, df: "pd.DataFrame") -> Dict[str, str]:
+        """Hash the parameters of each block for the completion journal.
+
+        :param df: The parameter table.
+        :return: Dict mapping job ids to parameter hashes.
+        """
+        from . import all_vs_all
+
+        run_params = {
+            "tool": "tmalign",
+            "index": file_digest(self.index_dir / all_vs_all.INDEX_TSV),
+            "split_flag": self.split_flag,
+            "ter_flag": self.ter_flag,
+        }
+        return {
+            block_id: param_hash(
+                {
+                    **run_params,
+                    "first_row": row.first_row,
+                    "last_row": row.last_row,
+                    "min_tm_score": row.min_tm_score,
+                }
+            )
+            for block_id, row in zip(self.row_ids(df), df.itertuples(index=False))
+        }
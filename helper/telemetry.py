@@ -0,0 +1,226 @@
+"""Structured timing telemetry of the external tool invocations.
+
+Every invocation of MicroMiner and TM-align appends an event to a JSONL file: the tool,
+wall time, CPU time and peak memory of the tool process, the per-phase timings and
+candidate counts MicroMiner reports, the identity of the executable, a hash of the
+algorithm settings and the context of the run (e.g. dataset and representation). Every
+process writes its own file, so that processes on HPC nodes do not contend for a file.
+
+Summarize the events of runs, e.g. to find regressions after a MicroMiner update:
+``python -m helper.telemetry <outdir> --by dataset repr exe_version``
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from .constants import CONFIG
+
+if TYPE_CHECKING:
+    # imported where needed, recording events must not import pandas
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# environment variables, so that worker processes and tasks inherit the settings
+DIR_ENV = "MICROMINER_TELEMETRY_DIR"
+CONTEXT_ENV = "MICROMINER_TELEMETRY_CONTEXT"
+
+EVENT_FILE_PREFIX = "events_"
+
+# MicroMiner phases reported in its standard out (see parse_microminer_search_stdout)
+PHASE_COLUMNS = [
+    "index_read_time",
+    "query_site_build_time",
+    "kmer_search_int_time",
+    "complex_read_time",
+    "align_time",
+]
+
+# event file of this process. Reset in forked processes.
+_event_file = {"pid": None, "path": None}
+
+
+def enable(directory: Path, **context) -> None:
+    """Record events of this process and its child processes.
+
+    :param directory: Directory for the event files.
+    :param context: Fields added to every event, e.g. dataset="...".
+    :return: None
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    os.environ[DIR_ENV] = str(directory.resolve())
+    os.environ[CONTEXT_ENV] = json.dumps({**get_context(), **context})
+    _event_file["pid"] = None
+
+
+def telemetry_dir() -> Optional[Path]:
+    """Get the directory for the event files.
+
+    :return: The directory set by enable(), the TELEMETRY_DIR of the config or None if
+             telemetry is disabled.
+    """
+    directory = os.environ.get(DIR_ENV, CONFIG["TELEMETRY"]["TELEMETRY_DIR"]).strip()
+    if directory == "":
+        return None
+    return Path(directory).expanduser()
+
+
+def get_context() -> Dict:
+    """Get the fields added to every event.
+
+    :return: The context set by enable().
+    """
+    try:
+        return json.loads(os.environ.get(CONTEXT_ENV, "{}"))
+    except ValueError:
+        return {}
+
+
+def _event_path(directory: Path) -> Path:
+    """Get the event file of this process.
+
+    :param directory: Directory for the event files.
+    :return: Path to the event file.
+    """
+    if _event_file["pid"] != os.getpid():
+        # unique among all processes of all hosts and over time
+        _event_file["pid"] = os.getpid()
+        _event_file["path"] = directory / (
+            f"{EVENT_FILE_PREFIX}{socket.gethostname()}_{os.getpid()}_{time.time_ns()}"
+            f".jsonl"
+        )
+    return _event_file["path"]
+
+
+def record(tool: str, **fields) -> None:
+    """Append an event to the event file of this process if telemetry is enabled.
+
+    :param tool: Name of the invoked tool, e.g. "microminer_search".
+    :param fields: JSON serializable fields of the event.
+    :return: None
+    """
+    directory = telemetry_dir()
+    if directory is None:
+        return
+    event = {
+        "time": time.time(),
+        "host": socket.gethostname(),
+        "tool": tool,
+        **get_context(),
+        **fields,
+    }
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(_event_path(directory), "a") as f:
+            f.write(json.dumps(event, default=str) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not record telemetry event: {e}")
+
+
+def read_events(paths: List[Path]) -> "pd.DataFrame":
+    """Read events from event files.
+
+    :param paths: Event files or directories to search for event files recursively.
+    :return: Table with one row per event.
+    """
+    import pandas as pd
+
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files += sorted(path.rglob(f"{EVENT_FILE_PREFIX}*.jsonl"))
+        elif path.is_file():
+            files.append(path)
+    events = []
+    for file in files:
+        with open(file) as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # truncated by an interrupted process
+                    continue
+    return pd.DataFrame(events)
+
+
+def summarize(df: "pd.DataFrame", by: List[str]) -> "pd.DataFrame":
+    """Break down where time goes per tool and group.
+
+    :param df: The events (see read_events).
+    :param by: Event fields to group by in addition to the tool. Missing fields are
+               skipped.
+    :return: Table with the number of calls, wall and CPU time, CPU utilization, peak
+             memory and the share of the MicroMiner phases in the wall time per group.
+    """
+    import pandas as pd
+
+    by = ["tool"] + [c for c in by if c in df.columns and c != "tool"]
+    df = df.copy()
+    for col in ["wall_time", "cpu_time", "max_rss_mb", "nof_queries"] + PHASE_COLUMNS:
+        if col not in df.columns:
+            df[col] = float("nan")
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["nof_queries"] = df["nof_queries"].fillna(1)
+    groups = df.groupby(by, dropna=False)
+    summary = pd.DataFrame(
+        {
+            "calls": groups.size(),
+            "queries": groups["nof_queries"].sum(),
+            "wall_time": groups["wall_time"].sum(),
+            "wall_time_median": groups["wall_time"].median(),
+            "cpu_time": groups["cpu_time"].sum(),
+            "max_rss_mb": groups["max_rss_mb"].max(),
+        }
+    )
+    summary["cpu_utilization"] = summary["cpu_time"] / summary["wall_time"]
+    for col in PHASE_COLUMNS:
+        summary[col.replace("_time", "_share")] = (
+            groups[col].sum(min_count=1) / summary["wall_time"]
+        )
+    return summary.reset_index()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(
+        description="Summarize the telemetry of MicroMiner and TM-align invocations."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        type=Path,
+        help="Event files or directories with event files (e.g. output dirs of search.py).",
+    )
+    parser.add_argument(
+        "--by",
+        nargs="*",
+        default=["dataset", "repr"],
+        help="Event fields to group by, e.g. dataset, mode, repr, exe_version, algo_hash,"
+        " host.",
+    )
+    parser.add_argument(
+        "--out", type=Path, default=None, help="Write the summary to a TSV file."
+    )
+    args = parser.parse_args(argv)
+
+    df = read_events(args.paths)
+    if df.empty:
+        print("No telemetry events found.")
+        return 1
+    summary = summarize(df, args.by)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(summary.to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+    if args.out is not None:
+        summary.to_csv(args.out, sep="\t", index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
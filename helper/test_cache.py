@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from helper.cache import ResultCache, file_digest
+
+
+class CacheTests(unittest.TestCase):
+    def test_file_digest(self):
+        with tempfile.TemporaryDirectory() as t:
+            path1 = Path(t) / "a.pdb"
+            path2 = Path(t) / "b.pdb"
+            path1.write_text("ATOM")
+            path2.write_text("ATOM")
+            self.assertEqual(file_digest(path1), file_digest(path2))
+            path2.write_text("HETATM")
+            self.assertNotEqual(file_digest(path1), file_digest(path2))
+
+    def test_result_cache(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            cache = ResultCache(tmpdir / "cache", max_size=10000)
+            key = ResultCache.key(structures=["abc"], mode="search")
+            self.assertNotEqual(key, ResultCache.key(structures=["abc"], mode="pair"))
+
+            self.assertIsNone(cache.get(key, tmpdir / "out1"))
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+            result_dir = tmpdir / "result"
+            result_dir.mkdir()
+            (result_dir / "resultStatistic.csv").write_text("queryName\n1ABC\n")
+            cache.put(key, result_dir, b"stdout", b"")
+            # storing twice is fine
+            cache.put(key, result_dir, b"stdout", b"")
+
+            response = cache.get(key, tmpdir / "out2")
+            self.assertEqual(response["stdout"], b"stdout")
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            self.assertEqual(
+                (tmpdir / "out2" / "resultStatistic.csv").read_text(),
+                "queryName\n1ABC\n",
+            )
+            self.assertEqual(cache.size(), len("queryName\n1ABC\n") + len("stdout"))
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            result_dir = tmpdir / "result"
+            result_dir.mkdir()
+            (result_dir / "resultStatistic.csv").write_bytes(b"x" * 100)
+
+            cache = ResultCache(tmpdir / "cache", max_size=250)
+            keys = [ResultCache.key(i=i) for i in range(3)]
+            for i, key in enumerate(keys):
+                cache.put(key, result_dir, b"", b"")
+                entry_dir = cache._entry_dir(key)
+                os.utime(entry_dir, (1000 + i, 1000 + i))
+            # using the oldest entry makes it the most recently used one
+            self.assertIsNotNone(cache.get(keys[0], tmpdir / "out"))
+
+            self.assertEqual(cache.evict(), 1)
+            self.assertIsNotNone(cache.get(keys[0], tmpdir / "out"))
+            self.assertIsNone(cache.get(keys[1], tmpdir / "out"))
+            self.assertIsNotNone(cache.get(keys[2], tmpdir / "out"))
+            self.assertEqual(cache.evict(), 0)
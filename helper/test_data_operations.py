@@ -1,3 +1,4 @@
+import os
 import unittest
 import tempfile
 from pathlib import Path
@@ -15,6 +16,7 @@ from helper.constants import (
     MM_HIT_AA,
     MM_HIT_CHAIN,
     MM_HIT_POS,
+    MM_SITE_RESIDUES,
     CONFIG,
 )
 from helper.data_operations import (
@@ -22,7 +24,11 @@ from helper.data_operations import (
     make_pair_parameter_table,
     read_microminer_csv,
     merge_results_for_pair_eval,
+    consolidate_microminer_results,
+    find_microminer_results,
+    MM_RESULT_PARQUET,
 )
+from helper.journal import CompletionJournal
 from helper.datasets import PDB
 from helper.datasets.dataset import MockDataset, MockMutationDataset
 
@@ -193,6 +199,88 @@ class DataOperationsTests(unittest.TestCase):
             self.assertEqual(df[MM_HIT_POS].iloc[0], "-32a")
             self.assertEqual(df[MM_HIT_POS].iloc[1], "99")
 
+            # parallel reading in chunks gives the same result
+            for cpus, chunk_size in [(1, 1), (2, 1)]:
+                df_chunked = read_microminer_csv(
+                    [Path(mm_csv1.name), Path(mm_csv2.name)],
+                    cpus=cpus,
+                    chunk_size=chunk_size,
+                )
+                self.assertEqual(df_chunked[MM_HIT_NAME].dtype, "category")
+                pd.testing.assert_frame_equal(
+                    df_chunked.reset_index(drop=True),
+                    df.reset_index(drop=True),
+                    check_categorical=False,
+                )
+
+    def test_consolidate_microminer_results(self):
+        with tempfile.TemporaryDirectory() as t:
+            resultdir = Path(t)
+            for i, query_name in enumerate(["1G9V", "1E23", "2RN2"]):
+                (resultdir / query_name).mkdir()
+                pd.DataFrame(
+                    {
+                        MM_QUERY_NAME: [query_name] * 2,
+                        MM_QUERY_AA: ["ALA", "ILE"],
+                        MM_QUERY_CHAIN: ["A", "1"],
+                        MM_QUERY_POS: ["23", "-32a"],
+                        MM_HIT_NAME: ["8ABC", "1E10"],
+                        MM_HIT_AA: ["VAL", "TYR"],
+                        MM_HIT_CHAIN: ["B", "B"],
+                        MM_HIT_POS: ["23", "-32a"],
+                        MM_SITE_RESIDUES: [10 + i, 20],
+                        "fullSeqId": [0.3, 0.9],
+                    }
+                ).to_csv(
+                    resultdir / query_name / "resultStatistic.csv",
+                    sep="\t",
+                    index=False,
+                )
+            CompletionJournal(resultdir).record("1G9V", 0, "h")
+
+            csv_files = find_microminer_results([resultdir])
+            self.assertEqual(len(csv_files), 3)
+            df_csv = read_microminer_csv(csv_files)
+
+            dataset_path = consolidate_microminer_results(resultdir, rows_per_file=3)
+            self.assertEqual(dataset_path, resultdir / MM_RESULT_PARQUET)
+            self.assertEqual(len(list(dataset_path.glob("*.parquet"))), 2)
+            self.assertEqual(find_microminer_results([resultdir]), [dataset_path])
+
+            df = read_microminer_csv([dataset_path])
+            self.assertEqual(df[MM_SITE_RESIDUES].dtype, np.int32)
+            self.assertEqual(df[MM_HIT_NAME].dtype, "category")
+            # categories of both tables differ in order
+            df, df_csv = df.astype(str), df_csv.astype(str)
+            pd.testing.assert_frame_equal(
+                df.sort_values(df.columns.tolist()).reset_index(drop=True),
+                df_csv.sort_values(df.columns.tolist()).reset_index(drop=True),
+            )
+
+            # projection and filters give the same results for CSV and Parquet
+            columns = [MM_QUERY_NAME, MM_HIT_NAME, "fullSeqId"]
+            filters = [(MM_QUERY_NAME, "in", ["1G9V", "2RN2"]), ("fullSeqId", ">", 0.5)]
+            for files in [csv_files, [dataset_path]]:
+                df = read_microminer_csv(files, columns=columns, filters=filters)
+                self.assertEqual(df.columns.tolist(), columns)
+                self.assertEqual(sorted(df[MM_QUERY_NAME]), ["1G9V", "2RN2"])
+                self.assertEqual(set(df[MM_HIT_NAME]), {"1E10"})
+
+            # results finished after the consolidation are not ignored, also those of
+            # distributed runs with journals in the results subdir
+            journal_mtime = dataset_path.stat().st_mtime + 10
+            task_journal = CompletionJournal(
+                resultdir / "results", name="journal_1_1.tsv"
+            )
+            task_journal.record("2RN2", 0, "hash")
+            os.utime(task_journal.path, (journal_mtime, journal_mtime))
+            self.assertNotIn(dataset_path, find_microminer_results([resultdir]))
+            task_journal.path.unlink()
+            self.assertEqual(find_microminer_results([resultdir]), [dataset_path])
+
+            os.utime(CompletionJournal(resultdir).path, (journal_mtime, journal_mtime))
+            self.assertEqual(len(find_microminer_results([resultdir])), 3)
+
     def test_merge_results_for_pair_eval(self):
         # setup mutation dataset table
         df_dataset = pd.DataFrame(
@@ -337,9 +425,39 @@ class DataOperationsTests(unittest.TestCase):
         exp_df_anno.index = [0]
         self.assertTrue(df_anno.equals(exp_df_anno))
 
+        # categorical MicroMiner results (as read by read_microminer_csv) match the same rows
+        df_anno_cat, _, _ = merge_results_for_pair_eval(
+            df_dataset, df_mm.astype("category"), backward=True
+        )
+        self.assertEqual(df_anno_cat["some_col"].tolist(), ["some_val3"])
+
         df_dataset[WILD_CHAIN] = ["NotAChainID", "NotAChainID", "NotAChainID"]
 
         df_anno, df_not_found, df_merged = merge_results_for_pair_eval(
             df_dataset, df_mm, backward=False
         )
         self.assertEqual(df_anno.shape[0], 0)
+
+    def test_merge_results_for_pair_eval_reference(self):
+        """Test merge_results_for_pair_eval against its reference implementation"""
+        from benchmarks.merge_results_for_pair_eval import (
+            make_synthetic_tables,
+            merge_results_for_pair_eval_reference,
+        )
+
+        df_dataset, df_mm = make_synthetic_tables(nof_mutations=500, nof_hits=2000)
+        for df_ref, df_hits in [
+            (df_dataset, df_mm),
+            (df_dataset.drop(columns=[WILD_CHAIN]), df_mm),
+            (df_dataset, df_mm.astype({MM_QUERY_NAME: "category"})),
+        ]:
+            for backward in [False, True]:
+                expected = merge_results_for_pair_eval_reference(
+                    df_ref, df_hits, backward
+                )
+                actual = merge_results_for_pair_eval(df_ref, df_hits, backward)
+                self.assertGreater(actual[0].shape[0], 0)
+                for df_expected, df_actual in zip(expected, actual):
+                    pd.testing.assert_frame_equal(
+                        df_actual, df_expected, check_exact=True
+                    )
@@ -0,0 +1,157 @@
+import getpass
+import json
+import os
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+from helper.constants import CONFIG
+from helper.hpc import LocalExecutor, distribute_csv
+from helper.hpc.monitor import JobMonitor, read_task_markers
+from helper.hpc.node_cache import NodeCache
+from helper.journal import CompletionJournal
+from helper.mock_executables import write_mock_microminer
+from helper.runners import MicroMinerSearch
+from helper.test_runner import write_mock_search_input
+
+
+class ExecutorsTests(unittest.TestCase):
+    def test_distribute_csv_local(self):
+        """Test the distributed pipeline (chunking, tasks, result collection) locally"""
+
+        nof_queries = 6
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            exe = write_mock_microminer(
+                tmpdir / "MicroMiner", tmpdir / "index_loads.txt"
+            )
+            param_tsv = write_mock_search_input(tmpdir, nof_queries)
+            outdir = tmpdir / "out"
+            outdir.mkdir()
+
+            # tasks run in new processes that read the executable from the environment
+            with mock.patch.dict(os.environ, {"MICROMINER": str(exe)}), mock.patch.dict(
+                CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}
+            ), mock.patch.multiple(JobMonitor, MIN_INTERVAL=0.05, MAX_INTERVAL=0.2):
+                runner = MicroMinerSearch(
+                    cpus=1,
+                    mm_mode="single_mutation",
+                    mm_repr="monomer",
+                    raise_error=False,
+                )
+                executor = LocalExecutor(working_dir=tmpdir / "work")
+                distribute_csv(
+                    param_tsv, runner, outdir, "search", cpus=2, executor=executor
+                )
+
+                exp_ids = [f"q{i:03d}" for i in range(nof_queries)]
+                for query_id in exp_ids:
+                    self.assertTrue(
+                        (
+                            outdir / "results" / query_id / "resultStatistic.csv"
+                        ).is_file()
+                    )
+                self.assertEqual(
+                    sorted(CompletionJournal(outdir / "results").successful()),
+                    exp_ids,
+                )
+                # one journal and perf file per task, task logs and markers
+                nof_tasks = len(list((outdir / "results").glob("journal_*.tsv")))
+                self.assertGreater(nof_tasks, 1)
+                self.assertEqual(
+                    len(list((outdir / "results").glob("perf_*.tsv"))), nof_tasks
+                )
+                self.assertEqual(
+                    len(list((outdir / "cluster_out" / "task_status").glob("*.done"))),
+                    nof_tasks,
+                )
+                self.assertFalse((outdir / "lost_rows.tsv").exists())
+                # shards and scratch dirs are cleaned up
+                self.assertEqual(list((tmpdir / "work").glob("*/shards/*")), [])
+
+                # everything finished, nothing is submitted again
+                with mock.patch.object(executor, "submit_and_wait") as submit:
+                    distribute_csv(
+                        param_tsv, runner, outdir, "search", cpus=2, executor=executor
+                    )
+                    submit.assert_not_called()
+
+    def test_distribute_csv_local_node_cache(self):
+        """Test staging the index and structure files in the node cache in tasks"""
+
+        nof_queries = 6
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            exe = write_mock_microminer(
+                tmpdir / "MicroMiner", tmpdir / "index_loads.txt"
+            )
+            param_tsv = write_mock_search_input(tmpdir, nof_queries)
+            (tmpdir / "index").mkdir()
+            (tmpdir / "index" / "db").write_text("kmers")
+            (tmpdir / "node").mkdir()
+            outdir = tmpdir / "out"
+            outdir.mkdir()
+
+            env = {
+                "MICROMINER": str(exe),
+                "SITE_SEARCH_DB": str(tmpdir / "index" / "db"),
+                "NODE_CACHE_DISCS": json.dumps([str(tmpdir / "node")]),
+            }
+            with mock.patch.dict(os.environ, env), mock.patch.dict(
+                CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}
+            ), mock.patch.multiple(JobMonitor, MIN_INTERVAL=0.05, MAX_INTERVAL=0.2):
+                runner = MicroMinerSearch(
+                    cpus=1,
+                    mm_mode="single_mutation",
+                    mm_repr="monomer",
+                    raise_error=False,
+                )
+                executor = LocalExecutor(working_dir=tmpdir / "work")
+                executor.stages_files = True
+                distribute_csv(
+                    param_tsv, runner, outdir, "search", cpus=2, executor=executor
+                )
+
+            self.assertEqual(
+                len(CompletionJournal(outdir / "results").successful()), nof_queries
+            )
+            tasks = read_task_markers(outdir / "cluster_out" / "task_status")
+            sources = Counter(
+                (name, staged["source"])
+                for task in tasks.values()
+                for name, staged in task["staging"].items()
+            )
+            self.assertEqual(sources[("kmer_index", "copied")], 1)
+            self.assertEqual(
+                sources[("kmer_index", "cached")] + 1,
+                sources[("structures", "copied")],
+            )
+            # the index and every structure file are copied once to the node
+            cache_dir = tmpdir / "node" / getpass.getuser() / "microminer_node_cache"
+            self.assertEqual(
+                len(list(cache_dir.glob("*/" + NodeCache.MANIFEST_FILE))),
+                nof_queries + 1,
+            )
+
+    def test_local_executor_task_error(self):
+        """Test that tasks the local executor cannot run raise instead of getting lost"""
+
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            job_script = tmpdir / "job.sh"
+            job_script.write_text("exit 0\n")
+
+            with mock.patch(
+                "helper.hpc.executors.subprocess.run",
+                side_effect=FileNotFoundError("bash"),
+            ), mock.patch.multiple(JobMonitor, MIN_INTERVAL=0.05, MAX_INTERVAL=0.2):
+                with self.assertRaises(FileNotFoundError):
+                    LocalExecutor(working_dir=tmpdir / "work").submit_and_wait(
+                        job_script,
+                        nof_tasks=2,
+                        max_parallel_tasks=2,
+                        marker_dir=tmpdir / "markers",
+                        log_dir=tmpdir / "logs",
+                    )
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import unittest
+
+from helper import ROOT_DIR
+
+
+class ImportTests(unittest.TestCase):
+    """Test that importing the helper module is fast"""
+
+    def test_lazy_imports(self):
+        """Test that submodules and pandas are imported on first access only"""
+        code = (
+            "import sys\n"
+            "import helper\n"
+            "import helper.hpc.node_cache\n"
+            "assert 'pandas' not in sys.modules, 'pandas'\n"
+            "assert 'helper.datasets' not in sys.modules, 'helper.datasets'\n"
+            "assert 'helper.hpc.distribute_csv' not in sys.modules, 'distribute_csv'\n"
+            "from helper.hpc import distribute_csv\n"
+            "assert callable(distribute_csv)\n"
+            "assert callable(helper.utils.scantree)\n"
+            "assert 'pandas' in sys.modules\n"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=ROOT_DIR.parent,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(out.returncode, 0, out.stderr)
+
+    def test_runner_imports(self):
+        """Test that the runner scripts of HPC tasks do not import pandas and numpy"""
+        code = (
+            "import sys\n"
+            "from helper.runners import MicroMinerSearch, MicroMinerPair\n"
+            "import helper.telemetry\n"
+            "assert 'pandas' not in sys.modules, 'pandas'\n"
+            "assert 'numpy' not in sys.modules, 'numpy'\n"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=ROOT_DIR.parent,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(out.returncode, 0, out.stderr)
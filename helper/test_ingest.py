@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from helper.hpc.ingest import ShardIngester, generate_shard_script
+from helper.hpc.monitor import JobMonitor, generate_task_marker_script
+from helper.hpc.sge import SGEJobRunner
+from helper.mock_executables import write_mock_sge
+
+
+class IngestTests(unittest.TestCase):
+    def test_ingest_while_running(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            bin_dir = write_mock_sge(tmpdir / "bin", tmpdir / "sge_state")
+            marker_dir = tmpdir / "task_status"
+            shard_dir = tmpdir / "shards"
+            # every task writes the results of two queries
+            job_script = tmpdir / "job_script"
+            with open(job_script, "w") as f:
+                f.write(
+                    "#! /bin/bash\n#$ -t 1-3\n"
+                    + generate_task_marker_script(marker_dir)
+                    + f'THIS_RESULTS_DIR="{tmpdir}/node_${{SGE_TASK_ID}}"\n'
+                    + "for q in a b; do\n"
+                    + '  mkdir -p "${THIS_RESULTS_DIR}/${q}${SGE_TASK_ID}"\n'
+                    + '  echo "queryName" > "${THIS_RESULTS_DIR}/${q}${SGE_TASK_ID}/resultStatistic.csv"\n'
+                    + "done\n"
+                    + "RUNNER_EXIT_CODE=0\n"
+                    + generate_shard_script("${THIS_RESULTS_DIR}", shard_dir)
+                    + "exit ${RUNNER_EXIT_CODE}\n"
+                )
+
+            result_dir = tmpdir / "out" / "results"
+            ingester = ShardIngester(shard_dir, result_dir)
+            nof_ingested = []
+
+            def ingest(progress):
+                nof_ingested.append(ingester.ingest(progress))
+
+            path = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+            with mock.patch.dict(os.environ, {"PATH": path}), mock.patch.multiple(
+                JobMonitor, MIN_INTERVAL=0.01, MAX_INTERVAL=0.1
+            ):
+                progress = SGEJobRunner.submit_and_wait(
+                    job_script, nof_tasks=3, marker_dir=marker_dir, callback=ingest
+                )
+
+            self.assertEqual(progress["nof_failed"], 0)
+            self.assertEqual(sum(nof_ingested), 3)
+            self.assertEqual(ingester.nof_shards, 3)
+            self.assertEqual(ingester.nof_result_files, 6)
+            self.assertEqual(
+                sorted(p.parent.name for p in result_dir.glob("*/resultStatistic.csv")),
+                ["a1", "a2", "a3", "b1", "b2", "b3"],
+            )
+            self.assertEqual(list(shard_dir.iterdir()), [])
+
+    def test_ignore_incomplete_shards(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            (tmpdir / "shards").mkdir()
+            (tmpdir / "shards" / "task_1_1.tar.tmp").write_bytes(b"incomplete")
+            ingester = ShardIngester(tmpdir / "shards", tmpdir / "results")
+            self.assertEqual(ingester.ingest(), 0)
+            self.assertTrue((tmpdir / "shards" / "task_1_1.tar.tmp").is_file())
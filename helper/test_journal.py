@@ -0,0 +1,31 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from helper.journal import CompletionJournal, param_hash
+
+
+class JournalTests(unittest.TestCase):
+    def test_param_hash(self):
+        self.assertEqual(param_hash({"a": 1, "b": "x"}), param_hash({"b": "x", "a": 1}))
+        self.assertNotEqual(param_hash({"a": 1}), param_hash({"a": 2}))
+
+    def test_journal(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t) / "results"
+            journal = CompletionJournal(tmpdir)
+            self.assertEqual(journal.successful(), {})
+
+            journal.record("1abc", 0, "h1")
+            journal.record("2abc", 1, "h1")
+            journal.record("3abc", 0, "h1")
+            journal.record("3abc", 1, "h2")
+            # second journal of another task in the same directory
+            CompletionJournal(tmpdir, name="journal_1_2.tsv").record("2abc", 0, "h1")
+            # row truncated by a crash
+            with open(journal.path, "a") as f:
+                f.write("4abc\t0")
+
+            self.assertEqual(journal.successful(), {"1abc": "h1", "2abc": "h1"})
+            self.assertEqual(journal.read()["3abc"]["exit_code"], 1)
+            self.assertNotIn("4abc", journal.read())
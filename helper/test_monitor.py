@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from helper.hpc.monitor import (
+    JobMonitor,
+    format_progress,
+    generate_task_marker_script,
+    read_task_markers,
+    summarize_progress,
+)
+from helper.hpc.sge import SGEJobRunner
+from helper.mock_executables import write_mock_sge
+
+
+class MonitorTests(unittest.TestCase):
+    def test_summarize_progress(self):
+        tasks = {
+            1: {"state": "done", "exit_code": 0, "host": "n1", "start": 0, "end": 60},
+            2: {"state": "done", "exit_code": 1, "host": "n2", "start": 0, "end": 180},
+            3: {"state": "running", "host": "n1", "start": 60},
+        }
+        progress = summarize_progress(tasks, 4, started_at=0, now=3600)
+        self.assertEqual(progress["nof_done"], 2)
+        self.assertEqual(progress["nof_failed"], 1)
+        self.assertEqual(progress["nof_running"], 1)
+        self.assertAlmostEqual(progress["throughput_per_hour"], 2.0)
+        self.assertAlmostEqual(progress["eta"], 3600.0)
+        self.assertAlmostEqual(progress["runtime_median"], 120.0)
+        self.assertAlmostEqual(progress["runtime_max"], 180.0)
+        self.assertIn("2/4 tasks done (1 failed, 1 running)", format_progress(progress))
+
+        progress = summarize_progress({}, 4, started_at=0, now=10)
+        self.assertIsNone(progress["eta"])
+        self.assertIn("ETA ?", format_progress(progress))
+
+    def test_submit_and_wait(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            bin_dir = write_mock_sge(tmpdir / "bin", tmpdir / "sge_state")
+            marker_dir = tmpdir / "task_status"
+            job_script = tmpdir / "job_script"
+            with open(job_script, "w") as f:
+                f.write(
+                    "#! /bin/bash\n#$ -t 1-3\n"
+                    + generate_task_marker_script(marker_dir)
+                    + 'sleep 0.2\nif [ "${SGE_TASK_ID}" -eq 2 ]; then exit 3; fi\n'
+                )
+
+            path = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+            with mock.patch.dict(os.environ, {"PATH": path}), mock.patch.multiple(
+                JobMonitor, MIN_INTERVAL=0.01, MAX_INTERVAL=0.1
+            ):
+                progress = SGEJobRunner.submit_and_wait(
+                    job_script, nof_tasks=3, marker_dir=marker_dir
+                )
+
+            self.assertEqual(progress["nof_done"], 3)
+            self.assertEqual(progress["nof_failed"], 1)
+            self.assertEqual(progress["tasks"][2]["exit_code"], 3)
+            self.assertEqual(read_task_markers(marker_dir), progress["tasks"])
+            # qstat is not called after the last completion marker appeared
+            with open(tmpdir / "sge_state" / "qstat_calls.log") as f:
+                nof_qstat_calls = len(f.readlines())
+            self.assertLess(nof_qstat_calls, 30)
@@ -0,0 +1,167 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from helper.hpc.monitor import read_task_markers, summarize_progress
+from helper.hpc.node_cache import (
+    SOURCE_CACHED,
+    SOURCE_COPIED,
+    NodeCache,
+    entry_key,
+    stage_files,
+    stage_structure_files,
+)
+
+
+def write_mock_index(directory: Path, name: str, size: int = 1000) -> list:
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for suffix in ["", ".index", ".dbtype"]:
+        path = directory / f"{name}{suffix}"
+        path.write_bytes(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+class NodeCacheTests(unittest.TestCase):
+    def test_stage(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            sources = write_mock_index(tmpdir / "network", "db")
+            cache = NodeCache(tmpdir / "node", max_size=10**6)
+
+            key = entry_key("db", sources)
+            entry_dir, cached = cache.stage(key, sources)
+            self.assertFalse(cached)
+            for src in sources:
+                self.assertEqual((entry_dir / src.name).read_bytes(), src.read_bytes())
+            with open(entry_dir / NodeCache.MANIFEST_FILE) as f:
+                self.assertEqual(
+                    sorted(json.load(f)["sha256"]), sorted(p.name for p in sources)
+                )
+
+            self.assertEqual(cache.stage(key, sources), (entry_dir, True))
+            self.assertEqual(cache.size(), 3000)
+            # the calling process holds a lease
+            self.assertTrue(cache.in_use(key))
+
+            # a changed source is a new entry
+            sources[0].write_bytes(b"changed")
+            self.assertNotEqual(entry_key("db", sources), key)
+
+    def test_evict_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            cache = NodeCache(tmpdir / "node", max_size=7000)
+            keys = []
+            for name in ["a", "b"]:
+                sources = write_mock_index(tmpdir / "network", name)
+                keys.append(entry_key(name, sources))
+                # a finished process does not keep entries in use
+                cache.stage(keys[-1], sources, lease_pid=2**22 + 1)
+            # a was used more recently than b
+            for key, mtime in zip(keys, [2000, 1000]):
+                os.utime(
+                    tmpdir / "node" / key / NodeCache.MANIFEST_FILE, (mtime, mtime)
+                )
+            sources = write_mock_index(tmpdir / "network", "c")
+            keys.append(entry_key("c", sources))
+            cache.stage(keys[-1], sources)
+            entries = sorted(k for _, _, k in cache._entries())
+            self.assertEqual(entries, sorted([keys[0], keys[2]]))
+
+            # entries in use are not evicted
+            cache.max_size = 0
+            self.assertEqual(cache.make_room(0), 1)
+            self.assertEqual([k for _, _, k in cache._entries()], [keys[2]])
+
+    def test_concurrent_tasks(self):
+        """Tasks on the same node copy the index once"""
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            write_mock_index(tmpdir / "network", "db", size=10**7)
+            (tmpdir / "local").mkdir()
+            env = dict(
+                os.environ,
+                SITE_SEARCH_DB=str(tmpdir / "network" / "db"),
+                NODE_CACHE_DISCS=json.dumps(
+                    [str(tmpdir / "ssd"), str(tmpdir / "local")]
+                ),
+                PYTHONPATH=str(Path(__file__).resolve().parent.parent),
+            )
+            procs = [
+                subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "helper.hpc.node_cache",
+                        "index",
+                        "--report",
+                        str(tmpdir / f"{task}.stage"),
+                    ],
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                )
+                for task in range(1, 5)
+            ]
+            paths = {p.communicate()[0].decode().strip() for p in procs}
+            self.assertTrue(all(p.returncode == 0 for p in procs))
+
+            self.assertEqual(len(paths), 1)
+            path = Path(paths.pop())
+            self.assertTrue(path.is_relative_to(tmpdir / "local"))
+            self.assertEqual(path.name, "db")
+            self.assertEqual(
+                path.read_bytes(), (tmpdir / "network" / "db").read_bytes()
+            )
+
+            # the staging reports end up in the task states
+            for task in range(1, 5):
+                (tmpdir / f"{task}.start").write_text(f"n1\t{task}\n")
+            tasks = read_task_markers(tmpdir)
+            self.assertEqual(tasks[1]["staging"]["kmer_index"]["nof_files"], 3)
+            progress = summarize_progress(tasks, 4, started_at=0, now=10)
+            self.assertEqual(
+                progress["staging"],
+                {"kmer_index": {SOURCE_COPIED: 1, SOURCE_CACHED: 3}},
+            )
+
+    def test_stage_structure_files(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            structures = write_mock_index(tmpdir / "network", "pdb1abc.ent")
+            param_tsv = tmpdir / "input.tsv"
+            pd.DataFrame(
+                {
+                    "id": ["1abc", "2abc", "3abc", "4abc"],
+                    "structure_path": [*map(str, structures), str(tmpdir / "missing")],
+                }
+            ).to_csv(param_tsv, sep="\t", index=False)
+            cache = NodeCache(tmpdir / "node", max_size=10**6)
+
+            self.assertEqual(
+                stage_structure_files(cache, param_tsv), (SOURCE_COPIED, 4)
+            )
+            df = pd.read_csv(param_tsv, sep="\t")
+            self.assertEqual(df["id"].tolist(), ["1abc", "2abc", "3abc", "4abc"])
+            for path, local in zip(structures, df["structure_path"]):
+                self.assertTrue(Path(local).is_relative_to(tmpdir / "node"))
+                self.assertEqual(Path(local).name, path.name)
+                self.assertEqual(Path(local).read_bytes(), path.read_bytes())
+            # files that cannot be staged are used from network storage
+            self.assertEqual(df["structure_path"].iloc[3], str(tmpdir / "missing"))
+
+            # another task on the same node reads no structure from network storage
+            local_paths, sources = stage_files(cache, structures)
+            self.assertEqual(sources, {SOURCE_CACHED: 3})
+            self.assertEqual(
+                [str(local_paths[p]) for p in structures],
+                df["structure_path"].iloc[:3].tolist(),
+            )
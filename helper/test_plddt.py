@@ -0,0 +1,81 @@
+import gzip
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from helper.mol_utils import read_plddt_values
+from helper.plddt import extract_plddt, finished_files, parse_ca_records
+from helper import test_mol_utils
+
+
+def write_structure(path: Path, pdb_str: str) -> Path:
+    with gzip.open(path, "wt") as f:
+        f.write(pdb_str + "\n")
+    return path
+
+
+class PlddtTests(unittest.TestCase):
+    """Test bulk pLDDT extraction"""
+
+    def test_extract_plddt(self):
+        """Test extraction to Parquet and resuming an interrupted extraction"""
+
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            paths = [
+                write_structure(
+                    tmpdir / f"AF-P{i:05d}-F1-model_v4.pdb.gz",
+                    test_mol_utils.MolUtilsTests.pdb_str,
+                )
+                for i in range(3)
+            ]
+            outdir = tmpdir / "plddt"
+
+            self.assertEqual(extract_plddt(paths[:2], outdir, files_per_batch=1), 2)
+            # unreadable files are retried in the next run
+            broken = tmpdir / "AF-BROKEN-F1-model_v4.pdb.gz"
+            broken.write_bytes(b"no gzip")
+            self.assertEqual(extract_plddt(paths + [broken], outdir, cpus=2), 1)
+            self.assertEqual(finished_files(outdir), set(str(p) for p in paths))
+            self.assertEqual(extract_plddt(paths, outdir), 0)
+
+            df = pd.read_parquet(outdir).sort_values(["name", "pos"])
+            self.assertEqual(df.shape[0], 9)
+            self.assertEqual(df["plddt"].dtype, np.float16)
+            self.assertIsInstance(df["aa"].dtype, pd.CategoricalDtype)
+
+            # same residues as read_plddt_values
+            exp_df = read_plddt_values(paths[0])
+            df = df[df["name"] == exp_df["name"].iloc[0]]
+            self.assertEqual(df["aa"].tolist(), exp_df["aa"].tolist())
+            self.assertEqual(df["chain"].tolist(), exp_df["chain"].tolist())
+            self.assertEqual(df["pos"].tolist(), exp_df["pos"].astype(int).tolist())
+            np.testing.assert_allclose(
+                df["plddt"].astype(float), exp_df["plddt"].astype(float), atol=0.05
+            )
+
+    def test_parse_ca_records_chunks(self):
+        """Test parsing records split across chunks and truncated files"""
+
+        with tempfile.TemporaryDirectory() as t:
+            path = write_structure(
+                Path(t) / "AF-P00000-F1-model_v4.pdb.gz",
+                test_mol_utils.MolUtilsTests.pdb_str,
+            )
+            exp_records = [
+                (b"ASP", b"A", b"  16", b" 94.55"),
+                (b"ALA", b"A", b"  17", b" 93.02"),
+                (b"SER", b"A", b"  18", b" 94.50"),
+            ]
+            self.assertEqual(parse_ca_records(path), exp_records)
+            for chunk_size in (1, 7, 80, 81):
+                with mock.patch("helper.plddt.CHUNK_SIZE", chunk_size):
+                    self.assertEqual(parse_ca_records(path), exp_records)
+
+            path.write_bytes(path.read_bytes()[:-20])
+            with self.assertRaises(EOFError):
+                parse_ca_records(path)
@@ -0,0 +1,82 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from helper.prefetch import Prefetcher
+
+
+class PrefetchTests(unittest.TestCase):
+    def test_prefetch(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            (tmpdir / "shm").mkdir()
+            jobs = []
+            for i in range(10):
+                path = tmpdir / f"pdb{i}.ent.gz"
+                path.write_bytes(bytes([i]) * 100)
+                jobs.append((f"q{i}", path, "x"))
+            # missing files are used as they are
+            jobs.append(("missing", tmpdir / "missing.ent.gz", "x"))
+
+            prefetcher = Prefetcher(
+                depth=3, max_size=250, consumers=1, directory=tmpdir / "shm"
+            )
+            prefetched = []
+            for job in prefetcher.prefetch(jobs, path_index=1):
+                # at most two copies of 100 bytes fit at once
+                self.assertLessEqual(len(list((tmpdir / "shm").rglob("*.gz"))), 2)
+                if job[0] != "missing":
+                    self.assertTrue(job[1].is_relative_to(tmpdir / "shm"))
+                    self.assertEqual(job[1].name, f"pdb{job[0][1]}.ent.gz")
+                    self.assertEqual(job[1].read_bytes(), bytes([int(job[0][1])]) * 100)
+                prefetched.append(job)
+                prefetcher.release(job[0])
+                if job[0] != "missing":
+                    self.assertFalse(job[1].exists())
+            self.assertEqual([j[0] for j in prefetched], [j[0] for j in jobs])
+            self.assertEqual(prefetched[-1], jobs[-1])
+            self.assertEqual([j[2] for j in prefetched], ["x"] * len(jobs))
+            self.assertEqual(list((tmpdir / "shm").iterdir()), [])
+
+    def test_prefetch_large_file(self):
+        """Files larger than the memory limit are copied when nothing else is held"""
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            (tmpdir / "big").write_bytes(b"x" * 1000)
+            prefetcher = Prefetcher(depth=2, max_size=10, directory=tmpdir)
+            for job in prefetcher.prefetch([("big", tmpdir / "big")], path_index=1):
+                self.assertNotEqual(job[1], tmpdir / "big")
+                self.assertEqual(job[1].stat().st_size, 1000)
+                prefetcher.release(job[0])
+
+    def test_prefetch_concurrent_consumers(self):
+        """The number of held copies is bounded with consumers in other threads"""
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            jobs = []
+            for i in range(30):
+                (tmpdir / f"s{i}").write_bytes(b"x")
+                jobs.append((str(i), tmpdir / f"s{i}"))
+            prefetcher = Prefetcher(depth=2, max_size=10**6, consumers=2)
+            max_held = 0
+            lock = threading.Lock()
+            job_iter = prefetcher.prefetch(jobs, path_index=1)
+
+            def consume():
+                nonlocal max_held
+                while True:
+                    with lock:
+                        job = next(job_iter, None)
+                        max_held = max(max_held, len(prefetcher._held))
+                    if job is None:
+                        return
+                    prefetcher.release(job[0])
+
+            threads = [threading.Thread(target=consume) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertLessEqual(max_held, 4)
+            self.assertEqual(prefetcher._held, {})
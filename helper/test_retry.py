@@ -0,0 +1,76 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from helper.hpc.retry import (
+    failing_hosts,
+    host_exclusion,
+    lost_rows_report,
+    rows_without_result,
+)
+from helper.journal import CompletionJournal
+from helper.runners import MicroMinerPair, MicroMinerSearch
+
+
+class RetryTests(unittest.TestCase):
+    def test_rows_without_result(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            journal = CompletionJournal(tmpdir)
+            # entry of an earlier run
+            with mock.patch("helper.journal.time.time", return_value=0.0):
+                journal.record("1ABC", 0, "h")
+            submitted_at = time.time()
+            # recorded in this run (one successful, one failed)
+            journal.record("2ABC", 0, "h")
+            journal.record("3ABC", 1, "h")
+            df = pd.DataFrame(
+                {
+                    "id": ["1ABC", "2ABC", "3ABC", "4ABC"],
+                    "structure_path": ["a", "b", "c", "d"],
+                },
+                index=[10, 11, 12, 13],
+            )
+            lost = rows_without_result(
+                MicroMinerSearch("single_mutation", "monomer").row_ids(df),
+                tmpdir,
+                since=submitted_at,
+            )
+            self.assertEqual(df[lost]["id"].tolist(), ["1ABC", "4ABC"])
+
+    def test_row_ids(self):
+        df = pd.DataFrame(
+            {
+                "id1": ["1ABC"],
+                "structure_path1": ["a"],
+                "id2": ["2ABC"],
+                "structure_path2": ["b"],
+            }
+        )
+        self.assertEqual(MicroMinerPair().row_ids(df).tolist(), ["1ABC_2ABC"])
+
+    def test_failing_hosts(self):
+        tasks = {
+            1: {"state": "done", "exit_code": 0, "host": "n1", "start": 0, "end": 1},
+            2: {"state": "done", "exit_code": 1, "host": "n2", "start": 0, "end": 1},
+            3: {"state": "running", "host": "n2", "start": 0},
+            4: {"state": "running", "host": "n3", "start": 0},
+        }
+        self.assertEqual(failing_hosts(tasks), {"n2": 2, "n3": 1})
+
+        self.assertEqual(host_exclusion([]), "")
+        self.assertEqual(host_exclusion(["n2"]), "!n2")
+        self.assertEqual(host_exclusion(["n3", "n2", "n3"]), "!(n2|n3)")
+
+        df_lost = pd.DataFrame({"id": ["a", "b"]}, index=[5, 7])
+        schedule = pd.Series([0, 1, 2], index=[3, 5, 7])
+        df_report = lost_rows_report(df_lost, schedule, tasks, attempts=3)
+        self.assertEqual(df_report["attempts"].tolist(), [3, 3])
+        self.assertEqual(df_report["last_task"].tolist(), [2, 3])
+        self.assertEqual(df_report["last_host"].tolist(), ["n2", "n2"])
+        self.assertEqual(df_report["last_exit_code"].iloc[0], 1)
+        self.assertTrue(pd.isna(df_report["last_exit_code"].iloc[1]))
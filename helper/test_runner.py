@@ -1,13 +1,41 @@
+import gzip
 import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
+import numpy as np
 import pandas as pd
 
-from helper import WILD_COL, WILD_AA, WILD_SEQ_NUM, MUTANT_COL, MUT_AA
+from helper import CONFIG, WILD_COL, WILD_AA, WILD_SEQ_NUM, MUTANT_COL, MUT_AA
 from helper.data_operations import make_search_parameter_table
 from helper.datasets.dataset import MockMutationDataset
-from helper.runners import MicroMinerSearch
+from helper.mock_executables import write_mock_microminer, write_mock_tmalign
+from helper import all_vs_all
+from helper.cache import file_digest
+from helper.runners import MicroMinerSearch, TMAlignAllVsAll, TMAlignBatch
+
+
+def write_mock_search_input(tmpdir: Path, nof_queries: int) -> Path:
+    """Writes dummy query structures and a search parameter TSV for them.
+
+    :param tmpdir: Directory to write to.
+    :param nof_queries: Number of queries.
+    :return: Path to the search parameter TSV.
+    """
+    structure_paths = []
+    for i in range(nof_queries):
+        structure_path = tmpdir / f"pdbq{i:03d}.ent"
+        structure_path.touch()
+        structure_paths.append(structure_path)
+    param_tsv = tmpdir / "input.tsv"
+    pd.DataFrame(
+        {
+            "id": [p.name[3:7] for p in structure_paths],
+            "structure_path": structure_paths,
+        }
+    ).to_csv(param_tsv, sep="\t", index=False)
+    return param_tsv
 
 
 class RunnersTests(unittest.TestCase):
@@ -75,3 +103,424 @@ class RunnersTests(unittest.TestCase):
             self.assertGreater(len(files), 0)
             files = list(outdir_path.glob("3loe/*resultStatistic.csv"))
             self.assertGreater(len(files), 0)
+
+    def test_MicroMinerSearch_batch(self):
+        """Test MM search runner reads the k-mer index once per batch in batch mode"""
+
+        nof_queries = 7
+        for cpus, batch, exe_batch, batch_size, exp_index_loads in [
+            (1, True, True, 16, 1),
+            (3, True, True, 3, 3),
+            (2, True, True, 2, 4),
+            (3, True, False, 3, nof_queries),  # executable can not batch
+            (3, False, True, 3, nof_queries),
+        ]:
+            with tempfile.TemporaryDirectory() as t:
+                tmpdir = Path(t)
+                index_load_log = tmpdir / "index_loads.txt"
+                exe = write_mock_microminer(
+                    tmpdir / "MicroMiner", index_load_log, batch=exe_batch
+                )
+                param_tsv = write_mock_search_input(tmpdir, nof_queries)
+                outdir = tmpdir / "out"
+
+                with mock.patch.dict(CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}):
+                    runner = MicroMinerSearch(
+                        cpus=cpus,
+                        raise_error=True,
+                        mm_mode="single_mutation",
+                        mm_repr="monomer",
+                        batch=batch,
+                        batch_size=batch_size,
+                    )
+                    info_dict_list = runner.run(param_tsv, outdir=outdir)
+
+                self.assertEqual(len(info_dict_list), nof_queries)
+                with open(index_load_log) as f:
+                    self.assertEqual(len(f.readlines()), exp_index_loads)
+                for info_dict in info_dict_list:
+                    self.assertIsNotNone(info_dict["input_file"])
+                    self.assertEqual(info_dict["nof_candidates"], 3)
+                self.assertEqual(
+                    sum(d["index_read_time"] is not None for d in info_dict_list),
+                    exp_index_loads,
+                )
+                for i in range(nof_queries):
+                    self.assertTrue(
+                        (outdir / f"q{i:03d}" / "resultStatistic.csv").is_file()
+                    )
+
+    def test_MicroMinerSearch_batch_streaming(self):
+        """Test MM search runner yields the results of a batch before the next one runs"""
+
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            index_load_log = tmpdir / "index_loads.txt"
+            exe = write_mock_microminer(tmpdir / "MicroMiner", index_load_log)
+            param_tsv = write_mock_search_input(tmpdir, 5)
+
+            with mock.patch.dict(CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}):
+                runner = MicroMinerSearch(
+                    cpus=1,
+                    raise_error=True,
+                    mm_mode="single_mutation",
+                    mm_repr="monomer",
+                    batch_size=2,
+                )
+                out_iter = runner.iter_run(param_tsv, outdir=tmpdir / "out")
+                self.assertEqual(next(out_iter)["id"], "q000")
+                self.assertEqual(len(index_load_log.read_text().splitlines()), 1)
+                self.assertEqual(len(list(out_iter)), 4)
+                self.assertEqual(len(index_load_log.read_text().splitlines()), 3)
+
+        with self.assertRaises(ValueError):
+            MicroMinerSearch(mm_mode="single_mutation", mm_repr="monomer", batch_size=0)
+
+    def test_MicroMinerSearch_batch_prefetch(self):
+        """Test MM search runner reads the queries of batches from prefetched copies"""
+
+        nof_queries = 5
+        for cpus in [1, 2]:
+            with tempfile.TemporaryDirectory() as t:
+                tmpdir = Path(t)
+                exe = write_mock_microminer(
+                    tmpdir / "MicroMiner", tmpdir / "index_loads.txt"
+                )
+                param_tsv = write_mock_search_input(tmpdir, nof_queries)
+                prefetch_dir = tmpdir / "shm"
+                prefetch_dir.mkdir()
+
+                with mock.patch.dict(
+                    CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}
+                ), mock.patch.dict(
+                    CONFIG["CACHE"],
+                    {"PREFETCH_DEPTH": "2", "PREFETCH_DIR": str(prefetch_dir)},
+                ):
+                    runner = MicroMinerSearch(
+                        cpus=cpus,
+                        raise_error=True,
+                        mm_mode="single_mutation",
+                        mm_repr="monomer",
+                        batch_size=2,
+                    )
+                    info_dict_list = runner.run(param_tsv, outdir=tmpdir / "out")
+
+                self.assertEqual(len(info_dict_list), nof_queries)
+                for info_dict in info_dict_list:
+                    self.assertTrue(
+                        Path(info_dict["input_file"]).is_relative_to(prefetch_dir)
+                    )
+                # copies are removed after their batch finished
+                self.assertEqual(list(prefetch_dir.rglob("*.ent")), [])
+
+    def test_MicroMinerSearch_batch_failure(self):
+        """Test MM search runner searches only the failed queries of a batch again"""
+
+        nof_queries = 4
+        for raise_error in [False, True]:
+            with tempfile.TemporaryDirectory() as t:
+                tmpdir = Path(t)
+                index_load_log = tmpdir / "index_loads.txt"
+                exe = write_mock_microminer(tmpdir / "MicroMiner", index_load_log)
+                param_tsv = write_mock_search_input(tmpdir, nof_queries)
+                # MicroMiner fails for the second query and stops the batch
+                (tmpdir / "pdbq001.ent").unlink()
+
+                with mock.patch.dict(CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}):
+                    runner = MicroMinerSearch(
+                        cpus=1,
+                        raise_error=raise_error,
+                        mm_mode="single_mutation",
+                        mm_repr="monomer",
+                        batch=True,
+                    )
+                    if raise_error:
+                        with self.assertRaises(ValueError):
+                            runner.run(param_tsv, outdir=tmpdir / "out")
+                        continue
+                    info_dict_list = runner.run(param_tsv, outdir=tmpdir / "out")
+
+                self.assertEqual(
+                    {d["id"]: d["exit_code"] for d in info_dict_list},
+                    {"q000": 0, "q001": 1, "q002": 0, "q003": 0},
+                )
+                # the batch and the failed and unreached queries alone
+                self.assertEqual(len(index_load_log.read_text().splitlines()), 4)
+
+    def test_MicroMinerSearch_run_to_tsv(self):
+        """Test MM search runner streams parsed output to a TSV file"""
+
+        nof_queries = 5
+        for cpus, batch in [(1, False), (2, False), (2, True)]:
+            with tempfile.TemporaryDirectory() as t:
+                tmpdir = Path(t)
+                exe = write_mock_microminer(
+                    tmpdir / "MicroMiner", tmpdir / "index_loads.txt"
+                )
+                param_tsv = write_mock_search_input(tmpdir, nof_queries)
+                perf_tsv = tmpdir / "perf.tsv"
+
+                with mock.patch.dict(CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}):
+                    runner = MicroMinerSearch(
+                        cpus=cpus,
+                        raise_error=True,
+                        mm_mode="single_mutation",
+                        mm_repr="monomer",
+                        batch=batch,
+                    )
+                    nof_finished = runner.run_to_tsv(
+                        param_tsv, outdir=tmpdir / "out", perf_tsv=perf_tsv
+                    )
+
+                self.assertEqual(nof_finished, nof_queries)
+                df_perf = pd.read_csv(perf_tsv, sep="\t")
+                self.assertEqual(df_perf.shape[0], nof_queries)
+                self.assertEqual(
+                    sorted(df_perf["id"].tolist()),
+                    [f"q{i:03d}" for i in range(nof_queries)],
+                )
+                self.assertTrue((df_perf["exit_code"] == 0).all())
+                self.assertTrue((df_perf["nof_candidates"] == 3).all())
+
+    def test_MicroMinerSearch_resume(self):
+        """Test MM search runner skips queries that finished in an earlier run"""
+
+        nof_queries = 4
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            index_load_log = tmpdir / "index_loads.txt"
+            exe = write_mock_microminer(tmpdir / "MicroMiner", index_load_log)
+            param_tsv = write_mock_search_input(tmpdir, nof_queries)
+            outdir = tmpdir / "out"
+
+            def run(**config):
+                with mock.patch.dict(
+                    CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}
+                ), mock.patch.dict(CONFIG["MICROMINER_ALGO"], config):
+                    runner = MicroMinerSearch(
+                        cpus=1,
+                        raise_error=True,
+                        mm_mode="single_mutation",
+                        mm_repr="monomer",
+                        batch=False,
+                    )
+                    return runner.run(param_tsv, outdir=outdir)
+
+            self.assertEqual(len(run()), nof_queries)
+            self.assertEqual(len(index_load_log.read_text().splitlines()), 4)
+
+            # nothing left to do
+            self.assertEqual(run(), [])
+            self.assertEqual(len(index_load_log.read_text().splitlines()), 4)
+
+            # a lost result is computed again
+            (outdir / "q001" / "resultStatistic.csv").unlink()
+            with mock.patch.dict(CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}):
+                runner = MicroMinerSearch(
+                    cpus=1, mm_mode="single_mutation", mm_repr="monomer", batch=False
+                )
+                # the head node of distributed runs reads the table with pandas
+                df = pd.read_csv(param_tsv, sep="\t", header=0)
+                self.assertEqual(
+                    runner.row_ids(runner.unfinished_rows(df, outdir)).tolist(),
+                    ["q001"],
+                )
+            self.assertEqual([r["id"] for r in run()], ["q001"])
+
+            # changed parameters invalidate all earlier results
+            self.assertEqual(len(run(MIN_SITE_RESIDUES="7")), nof_queries)
+
+    def test_MicroMinerSearch_result_cache(self):
+        """Test MM search runner serves repeated searches from the result cache"""
+
+        nof_queries = 3
+        for batch in [False, True]:
+            with tempfile.TemporaryDirectory() as t:
+                tmpdir = Path(t)
+                index_load_log = tmpdir / "index_loads.txt"
+                exe = write_mock_microminer(tmpdir / "MicroMiner", index_load_log)
+                param_tsv = write_mock_search_input(tmpdir, nof_queries)
+
+                def run(outdir):
+                    with mock.patch.dict(
+                        CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}
+                    ), mock.patch.dict(
+                        CONFIG["CACHE"], {"RESULT_CACHE_DIR": str(tmpdir / "cache")}
+                    ):
+                        runner = MicroMinerSearch(
+                            cpus=1,
+                            raise_error=True,
+                            mm_mode="single_mutation",
+                            mm_repr="monomer",
+                            batch=batch,
+                        )
+                        return runner.run(param_tsv, outdir=outdir)
+
+                res1 = run(tmpdir / "out1")
+                nof_index_loads = len(index_load_log.read_text().splitlines())
+                res2 = run(tmpdir / "out2")
+
+                # no further MicroMiner calls
+                self.assertEqual(
+                    len(index_load_log.read_text().splitlines()), nof_index_loads
+                )
+                self.assertFalse(any(r["cache_hit"] for r in res1))
+                self.assertTrue(all(r["cache_hit"] for r in res2))
+                self.assertEqual(
+                    [r["nof_candidates"] for r in res1],
+                    [r["nof_candidates"] for r in res2],
+                )
+                for i in range(nof_queries):
+                    self.assertEqual(
+                        (
+                            tmpdir / "out1" / f"q{i:03d}" / "resultStatistic.csv"
+                        ).read_text(),
+                        (
+                            tmpdir / "out2" / f"q{i:03d}" / "resultStatistic.csv"
+                        ).read_text(),
+                    )
+
+    def test_TMAlignBatch(self):
+        """Test TM-align pairs with structures decompressed once"""
+
+        ca_line = "ATOM      2  CA  ALA A   1       0.000   0.000   0.000  1.00 90.00\n"
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            exe = write_mock_tmalign(tmpdir / "TMalign", tmpdir / "reads.txt")
+            paths = []
+            for i in range(3):
+                # same file names in different dirs
+                path = tmpdir / f"d{i}" / "pdb1abc.ent.gz"
+                path.parent.mkdir()
+                with gzip.open(path, "wt") as f:
+                    f.write(ca_line * (i + 1))
+                paths.append(path)
+            df = pd.DataFrame(
+                {
+                    "id1": ["a", "a", "b", "a"],
+                    "structure_path1": [paths[0], paths[0], paths[1], paths[0]],
+                    "id2": ["b", "c", "c", "b"],
+                    "structure_path2": [paths[1], paths[2], paths[2], paths[1]],
+                }
+            )
+
+            with mock.patch.dict(CONFIG["EXECUTABLES"], {"TMALIGN": str(exe)}):
+                for cpus in (1, 2):
+                    runner = TMAlignBatch(
+                        cpus=cpus, read_alignment=True, cache_dir=tmpdir / "shm"
+                    )
+                    df_res = runner.run(df).sort_values(["id1", "id2"])
+                    self.assertEqual(df_res.columns.tolist(), runner.columns)
+                    self.assertEqual(
+                        list(zip(df_res["id1"], df_res["id2"])),
+                        [("a", "b"), ("a", "c"), ("b", "c")],
+                    )
+                    self.assertEqual(df_res["exit_code"].tolist(), [0, 0, 0])
+                    self.assertEqual(df_res["chain1_len"].tolist(), [1, 1, 2])
+                    self.assertEqual(df_res["chain2_len"].tolist(), [2, 3, 3])
+                    self.assertEqual(df_res["refseq"].tolist(), ["A", "A", "AA"])
+                    # the decompressed structures are removed
+                    self.assertEqual(list((tmpdir / "shm").iterdir()), [])
+
+            # every structure was decompressed once and reused by all its pairs
+            with open(tmpdir / "reads.txt") as f:
+                reads = [line.strip() for line in f]
+            self.assertEqual(len(reads), 12)
+            self.assertEqual(len(set(reads)), 6)
+            self.assertFalse(any(r.endswith(".gz") for r in reads))
+
+            # failing alignments are reported with their exit code
+            with mock.patch.dict(CONFIG["EXECUTABLES"], {"TMALIGN": "/bin/false"}):
+                df_res = TMAlignBatch(raise_error=False).run(df)
+                self.assertEqual(df_res["exit_code"].tolist(), [1, 1, 1])
+                self.assertTrue(df_res["tm_score1"].isna().all())
+
+    def test_structure_length(self):
+        """Test that structure lengths count residues like TM-align"""
+
+        def ca_line(alt_loc, chain, res_seq, i_code):
+            return (
+                f"ATOM      2  CA {alt_loc}ALA {chain}{res_seq:4d}{i_code}"
+                f"       0.000   0.000   0.000  1.00 90.00\n"
+            )
+
+        with tempfile.TemporaryDirectory() as t:
+            path = Path(t) / "pdb1abc.ent"
+            for records, exp_length in [
+                # insertion codes
+                ([" A52 ", " A52A", " A52B", " A53 "], 4),
+                # alternate locations, only the first one of a residue counts
+                ([" A1 ", "AA2 ", "BA2 ", "BA3 ", "CA3 ", " A4 "], 4),
+                # first chain only
+                ([" A1 ", " A2 ", " B1 ", " B2 ", " B3 "], 2),
+            ]:
+                with open(path, "w") as f:
+                    f.writelines(
+                        ca_line(r[0], r[1], int(r[2:-1]), r[-1]) for r in records
+                    )
+                self.assertEqual(all_vs_all.structure_length(path), exp_length)
+            self.assertEqual(all_vs_all.structure_length(Path(t) / "missing.ent"), 0)
+
+    def test_TMAlignAllVsAll(self):
+        """Test all-vs-all TM-align with length ratio pruning and resumption"""
+
+        ca_line = (
+            "ATOM      2  CA  ALA A{:4d}       0.000   0.000   0.000  1.00 90.00\n"
+        )
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            exe = write_mock_tmalign(tmpdir / "TMalign", tmpdir / "reads.txt")
+            paths = []
+            for i, length in enumerate([2, 6, 3, 4]):
+                path = tmpdir / f"pdb{i}abc.ent.gz"
+                with gzip.open(path, "wt") as f:
+                    f.writelines(ca_line.format(r + 1) for r in range(length))
+                paths.append(path)
+            df = pd.DataFrame({"id": ["a", "b", "c", "d"], "structure_path": paths})
+            outdir = tmpdir / "out"
+
+            # pairs with a length ratio below 0.6 are not aligned
+            blocks_tsv = all_vs_all.prepare(
+                df, outdir, min_tm_score=0.6, pairs_per_block=2
+            )
+            df_blocks = pd.read_csv(blocks_tsv, sep="\t")
+            self.assertEqual(df_blocks["first_row"].tolist(), [0, 2])
+            self.assertEqual(df_blocks["nof_pairs"].tolist(), [2, 1])
+            self.assertEqual(
+                all_vs_all.read_index(outdir)["length"].tolist(), [2, 6, 3, 4]
+            )
+
+            with mock.patch.dict(CONFIG["EXECUTABLES"], {"TMALIGN": str(exe)}):
+                runner = TMAlignAllVsAll(outdir, cpus=2, cache_dir=tmpdir / "shm")
+                # an interrupted run finished the first block only
+                df_blocks.iloc[:1].to_csv(tmpdir / "first.tsv", sep="\t", index=False)
+                runner.run(tmpdir / "first.tsv", outdir / all_vs_all.RESULTS_DIR)
+                runner.run(blocks_tsv, outdir / all_vs_all.RESULTS_DIR)
+                self.assertEqual(list((tmpdir / "shm").iterdir()), [])
+
+            nof_blocks = all_vs_all.fill_matrix(
+                outdir, file_digest(outdir / all_vs_all.INDEX_TSV)
+            )
+            self.assertEqual(nof_blocks, 2)
+            matrix, df_index = all_vs_all.read_matrix(outdir)
+            self.assertEqual(df_index["id"].tolist(), ["a", "b", "c", "d"])
+            # the mock scores 0.9 normalized by the first and 0.8 by the second structure
+            nan = np.nan
+            np.testing.assert_array_equal(
+                matrix,
+                np.array(
+                    [
+                        [1.0, nan, 0.9, nan],
+                        [nan, 1.0, nan, 0.9],
+                        [0.8, nan, 1.0, 0.9],
+                        [nan, 0.8, 0.8, 1.0],
+                    ],
+                    dtype=np.float32,
+                ),
+            )
+
+            # every pair was aligned once, every structure decompressed once per run
+            with open(tmpdir / "reads.txt") as f:
+                reads = [line.strip() for line in f]
+            self.assertEqual(len(reads), 6)
+            self.assertFalse(any(r.endswith(".gz") for r in reads))
@@ -0,0 +1,77 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from helper.hpc.scheduling import (
+    estimate_costs,
+    find_perf_files,
+    read_perf_timings,
+    schedule_longest_first,
+    task_ranges,
+)
+
+
+class SchedulingTests(unittest.TestCase):
+    def test_schedule_longest_first(self):
+        costs = pd.Series([1.0, 10.0, 2.0, 9.0, 3.0, 8.0, 1.0], index=list("abcdefg"))
+        schedule = schedule_longest_first(costs, 3)
+
+        self.assertEqual(sorted(schedule.index), sorted(costs.index))
+        # ordered by task and decreasing cost within each task
+        self.assertTrue(schedule.is_monotonic_increasing)
+        for _, rows in schedule.groupby(schedule):
+            self.assertTrue(costs[rows.index].is_monotonic_decreasing)
+        # balanced loads
+        loads = costs.groupby(schedule).sum()
+        self.assertEqual(sorted(loads), [11.0, 11.0, 12.0])
+
+        ranges = task_ranges(schedule, 3)
+        self.assertEqual(ranges["start"].tolist(), [0, 3, 5])
+        self.assertEqual(ranges["count"].tolist(), [3, 2, 2])
+        # the most expensive rows start first
+        self.assertEqual(set(schedule.index[ranges["start"]]), {"b", "d", "f"})
+
+        with self.assertRaises(ValueError):
+            schedule_longest_first(costs, 0)
+
+        # rows without cost are distributed evenly
+        schedule = schedule_longest_first(pd.Series([0.0] * 6), 3)
+        self.assertEqual(schedule.value_counts().tolist(), [2, 2, 2])
+
+    def test_estimate_costs(self):
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t)
+            for name, size in [("a.pdb", 100), ("b.pdb", 400), ("c.pdb", 1000)]:
+                (tmpdir / name).write_bytes(b"x" * size)
+            df = pd.DataFrame(
+                {
+                    "id": ["a", "b", "c", "d"],
+                    "structure_path": [
+                        tmpdir / "a.pdb",
+                        tmpdir / "b.pdb",
+                        tmpdir / "c.pdb",
+                        tmpdir / "missing.pdb",
+                    ],
+                }
+            )
+
+            # file sizes only. Missing files cost the median.
+            costs = estimate_costs(df)
+            self.assertEqual(costs.tolist(), [100.0, 400.0, 1000.0, 400.0])
+
+            # timings of earlier runs (local and HPC tasks) scale the file sizes
+            (tmpdir / "results").mkdir()
+            pd.DataFrame({"id": ["a"], "search_time": [1.0]}).to_csv(
+                tmpdir / "perf.tsv", sep="\t", index=False
+            )
+            pd.DataFrame({"id": ["b", "a"], "search_time": [8.0, np.nan]}).to_csv(
+                tmpdir / "results" / "perf_1_1.tsv", sep="\t", index=False
+            )
+            timings = read_perf_timings(find_perf_files(tmpdir))
+            self.assertEqual(timings.to_dict(), {"a": 1.0, "b": 8.0})
+            costs = estimate_costs(df, timings)
+            # median seconds per byte of a and b is 0.015
+            np.testing.assert_allclose(costs.tolist(), [1.0, 8.0, 15.0, 8.0])
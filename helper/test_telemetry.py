@@ -0,0 +1,77 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+from helper import telemetry
+from helper.cmdl_calls import exe_cmdl_call
+from helper.constants import CONFIG
+from helper.mock_executables import write_mock_microminer
+from helper.runners import MicroMinerSearch
+from helper.test_runner import write_mock_search_input
+
+
+class TelemetryTests(unittest.TestCase):
+    def test_exe_cmdl_call_usage(self):
+        out = exe_cmdl_call(
+            [
+                sys.executable,
+                "-c",
+                "import sys; b = bytearray(64 * 1024**2); sum(range(10**6));"
+                " print('out'); print('err', file=sys.stderr); sys.exit(3)",
+            ],
+            "test",
+            raise_error=False,
+        )
+        self.assertEqual(out["exit_code"], 3)
+        self.assertEqual(out["stdout"].strip(), b"out")
+        self.assertEqual(out["stderr"].strip(), b"err")
+        self.assertGreater(out["usage"]["wall_time"], 0)
+        self.assertGreater(out["usage"]["cpu_time"], 0)
+        self.assertGreater(out["usage"]["max_rss_mb"], 64)
+
+    def test_search_events(self):
+        nof_queries = 4
+        with tempfile.TemporaryDirectory() as t, mock.patch.dict(os.environ):
+            tmpdir = Path(t)
+            exe = write_mock_microminer(tmpdir / "MicroMiner", tmpdir / "index.log")
+            param_tsv = write_mock_search_input(tmpdir, nof_queries)
+            telemetry.enable(tmpdir / "telemetry", dataset="test")
+
+            with mock.patch.dict(CONFIG["EXECUTABLES"], {"MICROMINER": str(exe)}):
+                for batch in [False, True]:
+                    MicroMinerSearch(
+                        "single_mutation", "monomer", batch=batch, resume=False
+                    ).run(param_tsv, tmpdir / "out")
+
+            df = telemetry.read_events([tmpdir])
+            self.assertEqual(
+                df["tool"].value_counts().to_dict(),
+                {"microminer_search": nof_queries, "microminer_search_batch": 1},
+            )
+            self.assertTrue((df["dataset"] == "test").all())
+            self.assertTrue((df["repr"] == "monomer").all())
+            self.assertTrue(df["exe_version"].notna().all())
+            self.assertTrue((df["cpu_time"] > 0).all())
+            df_batch = df[df["tool"] == "microminer_search_batch"]
+            self.assertEqual(df_batch["nof_candidates"].iloc[0], 3 * nof_queries)
+            self.assertEqual(df_batch["index_read_time"].iloc[0], 0.5)
+
+            summary = telemetry.summarize(df, ["dataset", "repr", "missing"])
+            self.assertEqual(summary.shape[0], 2)
+            self.assertEqual(summary["queries"].tolist(), [nof_queries, nof_queries])
+            self.assertIn("index_read_share", summary.columns)
+
+            with redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(
+                    telemetry.main(
+                        [str(tmpdir), "--by", "dataset", "--out", str(tmpdir / "s.tsv")]
+                    ),
+                    0,
+                )
+            self.assertIn("microminer_search_batch", out.getvalue())
+            self.assertTrue((tmpdir / "s.tsv").is_file())
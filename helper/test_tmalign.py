@@ -0,0 +1,87 @@
+import unittest
+
+from helper.tmalign import TMAlignRecord, parse_stdout, parse_stdout_records
+
+
+class TMAlignTests(unittest.TestCase):
+    """Test TM-align output parsing"""
+
+    header = (
+        "\n"
+        " *********************************************************************\n"
+        " * TM-align (Version 20190822): protein structure alignment          *\n"
+        " *********************************************************************\n"
+        "\n"
+    )
+    alignment = (
+        "Name of Chain_1: /tmp/x/pdb1abc.ent:A (to be superimposed onto Chain_2)\n"
+        "Name of Chain_2: /tmp/y/pdb2xyz.ent:B\n"
+        "Length of Chain_1: 120 residues\n"
+        "Length of Chain_2: 130 residues\n"
+        "\n"
+        "Aligned length=  110, RMSD=   1.23, Seq_ID=n_identical/n_aligned= 0.800\n"
+        "TM-score= 0.85000 (if normalized by length of Chain_1, i.e., LN=120, d0=3.84)\n"
+        "TM-score= 0.80000 (if normalized by length of Chain_2, i.e., LN=130, d0=3.98)\n"
+        "(You should use TM-score normalized by length of the reference structure)\n"
+        "\n"
+        '(":" denotes residue pairs of d <  5.0 Angstrom, "." denotes other aligned'
+        " residues)\n"
+        "MKV-A\n"
+        ":: .:\n"
+        "MKVLA\n"
+        "\n"
+    )
+    exp_dict = {
+        "id1": "pdb1abc",
+        "chain_id1": "A",
+        "id2": "pdb2xyz",
+        "chain_id2": "B",
+        "chain1_len": 120,
+        "chain2_len": 130,
+        "align_len": 110,
+        "rmsd": 1.23,
+        "seqid": 0.8,
+        "tm_score1": 0.85,
+        "tm_score2": 0.8,
+    }
+    exp_alignment = {"refseq": "MKV-A", "matching": ":: .:", "targetseq": "MKVLA"}
+
+    def test_parse_stdout(self):
+        """Test parsing the output of several alignments"""
+
+        stdout = (self.header + self.alignment) * 2
+        self.assertEqual(parse_stdout(stdout), [self.exp_dict] * 2)
+        self.assertEqual(
+            parse_stdout(stdout, read_alignment=True),
+            [{**self.exp_dict, **self.exp_alignment}] * 2,
+        )
+        records = parse_stdout_records(stdout.encode(), read_alignment=True)
+        self.assertEqual(
+            records, [TMAlignRecord(**self.exp_dict, **self.exp_alignment)] * 2
+        )
+
+        # file names without chain and suffix
+        stdout = self.header + self.alignment.replace(
+            "/tmp/y/pdb2xyz.ent:B", "2xyz"
+        ).replace("/tmp/x/pdb1abc.ent:A", "pdb1abc.ent.gz")
+        exp_dict = {**self.exp_dict, "id1": "pdb1abc.ent", "id2": "2xyz"}
+        del exp_dict["chain_id1"], exp_dict["chain_id2"]
+        self.assertEqual(parse_stdout(stdout), [exp_dict])
+
+    def test_parse_stdout_incomplete(self):
+        """Test parsing invalid and truncated output"""
+
+        self.assertEqual(parse_stdout("Error: file not found\n\n\n"), [])
+        self.assertEqual(parse_stdout(""), [{}])
+        # truncated alignment
+        stdout = self.header + self.alignment[: self.alignment.index(":: .:")]
+        self.assertEqual(
+            parse_stdout(stdout, read_alignment=True),
+            [{**self.exp_dict, "refseq": "MKV-A", "matching": ""}],
+        )
+        # next alignment right after the alignment strings
+        stdout = (self.header + self.alignment.rstrip("\n") + "\n") * 2
+        self.assertEqual(
+            parse_stdout(stdout, read_alignment=True),
+            [{**self.exp_dict, **self.exp_alignment}] * 2,
+        )
@@ -1,8 +1,13 @@
+import os
 import tempfile
+import time
 import unittest
 from pathlib import Path
+from unittest import mock
 
-from helper.utils import count_lines
+import pandas as pd
+
+from helper.utils import count_lines, scantree, TsvWriter
 
 
 class UtilsTests(unittest.TestCase):
@@ -19,3 +24,78 @@ class UtilsTests(unittest.TestCase):
             file.truncate(0)
             file.seek(0)
             self.assertEqual(count_lines(path), 0)
+
+    def test_tsv_writer(self):
+        """Test writing rows to TSV one at a time"""
+
+        with tempfile.TemporaryDirectory() as t:
+            path = Path(t) / "out.tsv"
+            with TsvWriter(path) as writer:
+                writer.write({"id": "1ABC", "time": 1.5, "count": None})
+                # rows are on disk before the writer is closed
+                self.assertEqual(pd.read_csv(path, sep="\t").shape, (1, 3))
+                writer.write({"id": "2ABC", "time": 2.5, "count": 3})
+
+            with TsvWriter(path, append=True) as writer:
+                writer.write({"count": 4, "id": "3ABC", "time": 0.5, "extra": "x"})
+
+            df = pd.read_csv(path, sep="\t")
+            self.assertEqual(df.columns.tolist(), ["id", "time", "count"])
+            self.assertEqual(df["id"].tolist(), ["1ABC", "2ABC", "3ABC"])
+            self.assertEqual(df["count"].iloc[2], 4)
+            self.assertTrue(pd.isna(df["count"].iloc[0]))
+
+            with TsvWriter(path) as writer:
+                writer.write({"id": "4ABC"})
+            self.assertEqual(pd.read_csv(path, sep="\t").shape, (1, 1))
+
+    def test_scantree(self):
+        """Test scantree with name filter, threads and manifest"""
+
+        with tempfile.TemporaryDirectory() as t:
+            tmpdir = Path(t) / "results"
+            for i in range(20):
+                (tmpdir / f"q{i}" / "sub").mkdir(parents=True)
+                (tmpdir / f"q{i}" / "resultStatistic.csv").touch()
+                (tmpdir / f"q{i}" / "sub" / "other.txt").touch()
+            expected = sorted(
+                tmpdir / f"q{i}" / "resultStatistic.csv" for i in range(20)
+            )
+
+            self.assertEqual(len(list(scantree(tmpdir))), 40)
+            self.assertEqual(
+                sorted(scantree(tmpdir, name="resultStatistic.csv")), expected
+            )
+            self.assertEqual(
+                sorted(scantree(tmpdir, name=lambda n: n.endswith(".csv"), threads=4)),
+                expected,
+            )
+
+            manifest = Path(t) / "manifest.json"
+            self.assertEqual(
+                sorted(
+                    scantree(
+                        tmpdir, name="resultStatistic.csv", threads=4, manifest=manifest
+                    )
+                ),
+                expected,
+            )
+            self.assertTrue(manifest.is_file())
+
+            # pretend that all dirs were last modified long ago
+            past = time.time() - 3600
+            for path in [tmpdir] + [p for p in tmpdir.rglob("*") if p.is_dir()]:
+                os.utime(path, (past, past))
+            list(scantree(tmpdir, name="resultStatistic.csv", manifest=manifest))
+
+            (tmpdir / "q3" / "sub" / "resultStatistic.csv").touch()
+            with mock.patch("helper.utils.os.scandir", wraps=os.scandir) as scandir:
+                files = sorted(
+                    scantree(tmpdir, name="resultStatistic.csv", manifest=manifest)
+                )
+            # only the modified dir is listed again
+            self.assertEqual(scandir.call_count, 1)
+            self.assertEqual(
+                files,
+                sorted(expected + [tmpdir / "q3" / "sub" / "resultStatistic.csv"]),
+            )
@@ -1,9 +1,9 @@
 """Utils functionality for TM-align like reading and parsing results"""
 import logging
-import os
+import re
 import tempfile
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, List, NamedTuple, Optional, Union
 
 from .cmdl_calls import call_tmalign
 from .utils import unpack_gz
@@ -11,67 +11,166 @@ from .utils import unpack_gz
 logger = logging.getLogger(__name__)
 
 
+class TMAlignRecord(NamedTuple):
+    """A pair-wise alignment parsed from the standard out of TM-align. Fields that are
+    not in the output are None."""
+
+    id1: Optional[str] = None
+    chain_id1: Optional[str] = None
+    id2: Optional[str] = None
+    chain_id2: Optional[str] = None
+    chain1_len: Optional[int] = None
+    chain2_len: Optional[int] = None
+    align_len: Optional[int] = None
+    rmsd: Optional[float] = None
+    seqid: Optional[float] = None
+    tm_score1: Optional[float] = None
+    tm_score2: Optional[float] = None
+    refseq: Optional[str] = None
+    matching: Optional[str] = None
+    targetseq: Optional[str] = None
+
+
+_NOF_FIELDS = len(TMAlignRecord._fields)
+(
+    _ID1,
+    _CHAIN_ID1,
+    _ID2,
+    _CHAIN_ID2,
+    _CHAIN1_LEN,
+    _CHAIN2_LEN,
+    _ALIGN_LEN,
+    _RMSD,
+    _SEQID,
+    _TM_SCORE1,
+    _TM_SCORE2,
+    _REFSEQ,
+    _MATCHING,
+    _TARGETSEQ,
+) = range(_NOF_FIELDS)
+
+_HEADER = " * TM-align"
+# the only lines of the output that are parsed. Matched with their preceding line break,
+# so that the regex engine can skip to line breaks quickly.
+_PARSED_LINE = re.compile(
+    r"\n(?: \* TM-align|Name of Chain_[12]|Length of Chain_[12]|Aligned length="
+    r'|TM-score=|\(":" denotes residue pairs of)[^\n]*'
+)
+
+
+def _parse_name(line: str, fields: list, id_index: int) -> None:
+    """Parses the structure id and chain from a "Name of Chain_X: <path>:<chain>" line.
+
+    :param line: The line.
+    :param fields: Fields of the current record.
+    :param id_index: Index of the id field. The chain field follows.
+    :return: None
+    """
+    token = line.split(" ")[3]
+    # file name without the last suffix, e.g. pdb1abc from /data/pdb1abc.ent:A
+    name = token.rstrip("/").rpartition("/")[2]
+    dot = name.rfind(".")
+    fields[id_index] = name[:dot] if 0 < dot < len(name) - 1 else name
+    chain = name.rpartition(":")
+    if chain[1] and len(chain[2]) < 3:
+        fields[id_index + 1] = chain[2]
+
+
+def parse_stdout_records(
+    stdout: Union[str, bytes], read_alignment: bool = False
+) -> List[TMAlignRecord]:
+    """Parse the standard out of TM-align in a single pass to compact records.
+
+    Only the lines with results are visited, all other lines are skipped by the regex
+    engine.
+
+    :param stdout: The standard out (as returned by call_tmalign or decoded).
+    :param read_alignment: Whether to also parse the alignment strings.
+    :return: List of records. One record for each pair-wise alignment in the output.
+    """
+    if isinstance(stdout, bytes):
+        stdout = stdout.decode()
+    text = "\n" + stdout
+    # line break before the third line, which must be the header of the first alignment
+    line2 = text.find("\n", 1)
+    if line2 >= 0:
+        line2 = text.find("\n", line2 + 1)
+    if line2 >= 0 and not text.startswith(_HEADER, line2 + 1):
+        return []
+
+    records = []
+    fields = [None] * _NOF_FIELDS
+    # lines up to this position belong to an alignment
+    alignment_end = 0
+    for match in _PARSED_LINE.finditer(text):
+        start = match.start()
+        if start < alignment_end:
+            continue
+        line = match.group()
+        kind = line[1:5]
+        if kind == " * T":
+            if start > line2 >= 0:
+                # new entry
+                records.append(TMAlignRecord._make(fields))
+                fields = [None] * _NOF_FIELDS
+        elif kind == "Name":
+            _parse_name(line, fields, _ID1 if line[15] == "1" else _ID2)
+        elif kind == "Leng":
+            fields[_CHAIN1_LEN if line[17] == "1" else _CHAIN2_LEN] = int(
+                line.split(" ")[3]
+            )
+        elif kind == "Alig":
+            splitted = line.split("=")
+            fields[_ALIGN_LEN] = int(splitted[1].strip().split(",")[0])
+            fields[_RMSD] = float(splitted[2].strip().split(",")[0])
+            fields[_SEQID] = float(splitted[4].strip())
+        elif kind == "TM-s":
+            tm_score = float(line.split(" ")[1])
+            if "Chain_1" in line:
+                fields[_TM_SCORE1] = tm_score
+            else:
+                fields[_TM_SCORE2] = tm_score
+        elif read_alignment:
+            alignment_end = _read_alignment(text, match.end(), fields)
+    records.append(TMAlignRecord._make(fields))
+    return records
+
+
+def _read_alignment(text: str, pos: int, fields: list) -> int:
+    """Reads the alignment strings following the alignment header line.
+
+    :param text: The standard out.
+    :param pos: End of the alignment header line.
+    :param fields: Fields of the current record.
+    :return: End of the alignment. The 3 strings are followed by a separator line.
+    """
+    for index in (_REFSEQ, _MATCHING, _TARGETSEQ, None):
+        if pos >= len(text):
+            break
+        end = text.find("\n", pos + 1)
+        if end < 0:
+            end = len(text)
+        if text.startswith(_HEADER, pos + 1):
+            # the next entry starts
+            break
+        if index is not None:
+            fields[index] = text[pos + 1 : end]
+        pos = end
+    return pos
+
+
 def parse_stdout(stdout_str: str, read_alignment: bool = False) -> List[Dict]:
     """Parse the standard out output of TM-Align to a list of dictionaries.
 
     :param stdout_str: The standard out string to parse.
     :param read_alignment: Whether to also parse the alignment.
-    :return: List of dicts. One dict for each pair-wise alignment in the output.
+    :return: List of dicts. One dict for each pair-wise alignment in the output. Only
+             fields in the output are keys (see parse_stdout_records).
     """
-    info_dicts = [{}]
-    next_line_is_alignment = False
-    align_counter = 0
-    for i, line in enumerate(stdout_str.split(os.linesep)):
-        if i == 2 and not line.startswith(" * TM-align"):
-            return []
-        if i > 2 and line.startswith(" * TM-align"):
-            # new entry
-            next_line_is_alignment = False
-            align_counter = 0
-            info_dicts.append({})
-
-        if next_line_is_alignment:
-            if align_counter == 0:
-                info_dicts[-1]["refseq"] = line.strip("\n")
-            elif align_counter == 1:
-                info_dicts[-1]["matching"] = line.strip("\n")
-            elif align_counter == 2:
-                info_dicts[-1]["targetseq"] = line.strip("\n")
-            else:
-                next_line_is_alignment = False
-            align_counter += 1
-
-        elif line.startswith("Name of Chain_1"):
-            p = Path(line.split(" ")[3])
-            info_dicts[-1]["id1"] = p.stem
-            name_split = p.name.split(":")
-            if len(name_split) > 1 and len(name_split[-1]) < 3:
-                info_dicts[-1]["chain_id1"] = name_split[-1]
-        elif line.startswith("Name of Chain_2"):
-            p = Path(line.split(" ")[3])
-            info_dicts[-1]["id2"] = p.stem
-            name_split = p.name.split(":")
-            if len(name_split) > 1 and len(name_split[-1]) < 3:
-                info_dicts[-1]["chain_id2"] = name_split[-1]
-        elif line.startswith("Length of Chain_1"):
-            info_dicts[-1]["chain1_len"] = int(line.split(" ")[3])
-        elif line.startswith("Length of Chain_2"):
-            info_dicts[-1]["chain2_len"] = int(line.split(" ")[3])
-        elif line.startswith("Aligned length="):
-            splitted = line.split("=")
-            info_dicts[-1]["align_len"] = int(splitted[1].strip().split(",")[0])
-            info_dicts[-1]["rmsd"] = float(splitted[2].strip().split(",")[0])
-            info_dicts[-1]["seqid"] = float(splitted[4].strip())
-        elif line.startswith("TM-score="):
-            tm_score = line.split(" ")[1]
-            if "Chain_1" in line:
-                info_dicts[-1]["tm_score1"] = float(tm_score)
-            else:
-                info_dicts[-1]["tm_score2"] = float(tm_score)
-        elif read_alignment and line.startswith('(":" denotes residue pairs of'):
-            next_line_is_alignment = True
-
-    return info_dicts
+    return [
+        {k: v for k, v in zip(TMAlignRecord._fields, record) if v is not None}
+        for record in parse_stdout_records(stdout_str, read_alignment=read_alignment)
+    ]
 
 
 def call_and_parse(
@@ -1,40 +1,198 @@
+import concurrent.futures
 import contextlib
+import csv
 import gzip
+import json
 import logging
 import os
 import shutil
 import time
 from pathlib import Path
-from typing import Iterator
+from typing import Callable, Dict, Iterator, List, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
 
-def scantree(path: Path) -> Iterator[Path]:
+def _name_matches(name: str, name_filter: Union[str, Callable[[str], bool]]) -> bool:
+    """Checks a file name against a scantree name filter.
+
+    :param name: File name.
+    :param name_filter: None, an exact file name or a predicate on file names.
+    :return: True if the file name passes the filter.
+    """
+    if name_filter is None:
+        return True
+    if isinstance(name_filter, str):
+        return name == name_filter
+    return name_filter(name)
+
+
+def scantree(
+    path: Path,
+    name: Union[str, Callable[[str], bool]] = None,
+    threads: int = 1,
+    manifest: Path = None,
+) -> Iterator[Path]:
     """Recursively yield Path objects for given directory.
 
+    With more than one thread, directories are listed concurrently and the entries are
+    yielded in no particular order. This pays off on network file systems, where listing a
+    directory is dominated by latency.
+
+    With a manifest file, the matching files of every directory are remembered together
+    with the directory's modification time. Later scans list only directories that changed
+    since and take the files of all other directories from the manifest.
+
     :param path: Directory or file path.
-    :return: Yields all file system entries (dirs and files) as Path object.
+    :param name: Only yield files with this name or, if callable, files whose name it
+                 returns True for. Other entries never become Path objects.
+    :param threads: Number of threads for listing directories.
+    :param manifest: Path to a manifest file of an earlier scan with the same name filter.
+                     It is created or updated after a complete scan. A manifest of a scan
+                     with a different file name filter is ignored. For callable name
+                     filters, the caller must use the same filter for the same manifest.
+    :return: Yields all file system entries except dirs as Path object.
     """
     if path.is_file():
-        yield path
+        if _name_matches(path.name, name):
+            yield path
+    elif threads <= 1 and manifest is None:
+        yield from _scantree(path, name)
     else:
-        yield from _scantree(path)
+        yield from _scantree_parallel(path, name, threads, manifest)
 
 
-def _scantree(path: Path):
+def _scantree(path: Path, name: Union[str, Callable[[str], bool]] = None):
     """Private function for yielding Path objects for given directory recursively.
 
     :param path: Directory path.
-    :return: Yields all file system entries (dirs and files) as Path object.
+    :param name: Name filter (see scantree).
+    :return: Yields all file system entries except dirs as Path object.
     """
     for entry in os.scandir(path):
         if entry.is_dir(follow_symlinks=False):
-            yield from _scantree(Path(entry.path))
-        else:
+            yield from _scantree(Path(entry.path), name)
+        elif _name_matches(entry.name, name):
             yield Path(entry.path)
 
 
+# Directories modified less than this many seconds before a scan are listed again in the
+# next scan. Their modification time may not change with later modifications within the
+# resolution of the file system's time stamps.
+_MANIFEST_MTIME_SLACK = 2.0
+
+
+def _scan_dir(
+    path: str,
+    name: Union[str, Callable[[str], bool]],
+    known: List = None,
+    scan_time: float = None,
+) -> Tuple[str, List]:
+    """Lists a single directory for _scantree_parallel.
+
+    :param path: Directory path.
+    :param name: Name filter (see scantree).
+    :param known: Manifest entry of the directory from an earlier scan.
+    :param scan_time: Start time of the scan.
+    :return: Tuple of the directory path and its manifest entry: modification time,
+             matching file names and subdir names. The entry is None if the directory
+             vanished.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        if (
+            known is not None
+            and known[0] == mtime_ns
+            and mtime_ns / 1e9 < scan_time - _MANIFEST_MTIME_SLACK
+        ):
+            return path, known
+        files = []
+        subdirs = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif _name_matches(entry.name, name):
+                    files.append(entry.name)
+    except FileNotFoundError:
+        return path, None
+    return path, [mtime_ns, files, subdirs]
+
+
+def _scantree_parallel(
+    path: Path,
+    name: Union[str, Callable[[str], bool]],
+    threads: int,
+    manifest: Path = None,
+) -> Iterator[Path]:
+    """Private function for yielding Path objects for given directory recursively with
+    concurrent directory listings and an optional manifest (see scantree).
+
+    :param path: Directory path.
+    :param name: Name filter (see scantree).
+    :param threads: Number of threads for listing directories.
+    :param manifest: Path to the manifest file.
+    :return: Yields all file system entries except dirs as Path object.
+    """
+    manifest_name = name if isinstance(name, str) else None
+    known_dirs = {}
+    if manifest is not None and manifest.is_file():
+        try:
+            with open(manifest, "r") as f:
+                content = json.load(f)
+            if content["root"] == str(path) and content["name"] == manifest_name:
+                known_dirs = content["dirs"]
+        except (OSError, ValueError, KeyError):
+            logger.warning(f"Ignoring unreadable scantree manifest {manifest}")
+
+    scan_time = time.time()
+    scanned_dirs = {}
+    with concurrent.futures.ThreadPoolExecutor(max(1, threads)) as pool:
+        pending = {
+            pool.submit(_scan_dir, str(path), name, known_dirs.get("."), scan_time)
+        }
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                dir_path, dir_entry = future.result()
+                if dir_entry is None:
+                    continue
+                rel_dir_path = os.path.relpath(dir_path, str(path))
+                scanned_dirs[rel_dir_path] = dir_entry
+                for file_name in dir_entry[1]:
+                    yield Path(dir_path) / file_name
+                for subdir_name in dir_entry[2]:
+                    rel_subdir_path = os.path.normpath(
+                        os.path.join(rel_dir_path, subdir_name)
+                    )
+                    pending.add(
+                        pool.submit(
+                            _scan_dir,
+                            os.path.join(dir_path, subdir_name),
+                            name,
+                            known_dirs.get(rel_subdir_path),
+                            scan_time,
+                        )
+                    )
+
+    if manifest is not None:
+        nof_listed = sum(
+            1 for k, v in scanned_dirs.items() if known_dirs.get(k) is not v
+        )
+        logger.info(
+            f"Listed {nof_listed} of {len(scanned_dirs)} dirs in {path}"
+            f" (others unchanged since last scan)"
+        )
+        tmp_manifest = manifest.with_name(f".{manifest.name}.tmp{os.getpid()}")
+        with open(tmp_manifest, "w") as f:
+            json.dump(
+                {"root": str(path), "name": manifest_name, "dirs": scanned_dirs}, f
+            )
+        os.replace(tmp_manifest, manifest)
+
+
 @contextlib.contextmanager
 def timer(message: str):
     """Simple context manager based timer for logging timings.
@@ -133,3 +291,87 @@ def parse_microminer_search_stdout(stdout: str) -> dict:
         elif line.startswith("Run search | Took:"):
             info_dict["search_time"] = float(line.split(" ")[-2])
     return info_dict
+
+
+def split_microminer_batch_stdout(stdout: str) -> Dict[str, str]:
+    """Splits the standard out of a batched MicroMiner search into per-query sections.
+
+    Each query section starts with a "Working on <query>" line. Output before the first
+    query (e.g. reading the k-mer index) is attributed to the first query.
+
+    :param stdout: The standard out of a batched MicroMiner search.
+    :return: Dict mapping query file paths to their standard out section.
+    """
+    sections = {}
+    header_lines = []
+    current_lines = header_lines
+    for line in stdout.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("Working on "):
+            current_lines = [line] if sections else header_lines + [line]
+            sections[stripped[11:]] = current_lines
+        else:
+            current_lines.append(line)
+    return {query: "\n".join(lines) for query, lines in sections.items()}
+
+
+class TsvWriter:
+    """Writes dicts as rows to a TSV file, one row at a time.
+
+    The columns are taken from the first written dict. Every row is flushed to disk
+    immediately, so that an interrupted program leaves a readable file.
+    """
+
+    def __init__(self, path: Path, append: bool = False):
+        """Create a new writer.
+
+        :param path: Path to the TSV file.
+        :param append: Whether to append to an existing file. Rows are written with the
+                       columns of the existing header.
+        """
+        self.path = path
+        self.append = append
+        self.columns = None
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        """Opens the TSV file.
+
+        :return: this.
+        """
+        if self.append and self.path.is_file() and self.path.stat().st_size > 0:
+            with open(self.path, "r", newline="") as f:
+                self.columns = next(csv.reader(f, delimiter="\t"))
+            self._file = open(self.path, "a", newline="")
+            self._writer = csv.DictWriter(
+                self._file, self.columns, delimiter="\t", extrasaction="ignore"
+            )
+        else:
+            self._file = open(self.path, "w", newline="")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Closes the TSV file.
+
+        :param exc_type:
+        :param exc_val:
+        :param exc_tb:
+        :return:
+        """
+        self._file.close()
+
+    def write(self, row: dict) -> None:
+        """Writes a row and flushes it to disk.
+
+        :param row: Dict mapping column names to values.
+        :return: None
+        """
+        if self._writer is None:
+            self.columns = list(row.keys())
+            self._writer = csv.DictWriter(
+                self._file, self.columns, delimiter="\t", extrasaction="ignore"
+            )
+            self._writer.writeheader()
+        self._writer.writerow(row)
+        self._file.flush()
@@ -0,0 +1,64 @@
+from pathlib import Path
+import argparse
+import sys
+import logging
+
+from helper import CONFIG
+from helper.plddt import PLDDT_DTYPES, extract_plddt
+from helper.utils import scantree
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""
+        Extract pLDDT values from Alphafold PDB files to a Parquet dataset. Run again to
+        resume an interrupted extraction.
+        """
+    )
+
+    parser.add_argument(
+        "--dir",
+        "-d",
+        required=False,
+        type=str,
+        default=CONFIG["DATA"]["AFDB_DIR"],
+        help="Directory to read PDB files from.",
+    )
+    parser.add_argument(
+        "--outdir", "-o", type=str, required=True, help="Path to output dataset dir"
+    )
+    parser.add_argument(
+        "--cpus", "-c", type=int, default=1, help="Number of processes to use."
+    )
+    parser.add_argument(
+        "--plddt_dtype",
+        type=str,
+        default="float16",
+        choices=sorted(PLDDT_DTYPES),
+        help="Type of the pLDDT column. uint8 stores rounded values.",
+    )
+
+    args = parser.parse_args()
+
+    dir = Path(args.dir)
+    outdir = Path(args.outdir)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(name)-12s %(levelname)-8s %(message)s"
+    )
+    logger.info(f'Starting scripts: {" ".join(sys.argv)}')
+
+    if not dir.is_dir():
+        print("Error: Directory to read structure files from does not exist.")
+        sys.exit(1)
+
+    paths = sorted(
+        scantree(dir, name=lambda n: n.endswith(".pdb.gz"), threads=args.cpus * 4)
+    )
+    extract_plddt(paths, outdir, cpus=args.cpus, plddt_dtype=args.plddt_dtype)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,9 @@ This script finds the positions of these point mutations by:
      from the alignment.
   2. mapping the position of the mutation in the alignment to the PDB-file numbering
 """
+import gzip
 import logging
-import tempfile
+import multiprocessing
 from pathlib import Path
 from typing import Dict, List
 
@@ -22,8 +23,7 @@ import pandas as pd
 import helper
 from helper.constants import one_2_three_dict
 from helper.datasets.utils import get_pdb_file_path
-from helper.tmalign import call_tmalign, parse_stdout
-from helper.utils import unpack_gz
+from helper.runners import TMAlignBatch
 
 logger = logging.getLogger(__name__)
 
@@ -70,7 +70,8 @@ def get_atom_based_sequence(pdb_file: Path) -> List[Dict]:
     :return: A list of dicts with residue information representing the sequence.
     """
     seq = []
-    with open(pdb_file, "r") as f:
+    opener = gzip.open if pdb_file.suffix == ".gz" else open
+    with opener(pdb_file, "rt") as f:
         for line in f:
             if line.startswith("ATOM"):
                 seqnum = line[22:27]  # last char is iCode
@@ -186,89 +187,86 @@ def main():
     tmalign_seqlen2_list = []
     tmalign_alignlen_list = []
     has_non_terminal_indels_list = []
-    for wild_name, wild_chain, mutant_name, mutant_chain in zip(
-        df["wild_name"], df["wild_chain"], df["mutant_name"], df["mutant_chain"]
+    # align all pairs at once. split_flag=2 and ter_flag=0 means that all n^2 monomer
+    # chain combinations are tried out
+    df_pairs = pd.DataFrame(
+        {
+            "id1": df["wild_name"],
+            "structure_path1": df["wild_name"].map(get_pdb_file_path),
+            "id2": df["mutant_name"],
+            "structure_path2": df["mutant_name"].map(get_pdb_file_path),
+        }
+    )
+    runner = TMAlignBatch(
+        cpus=multiprocessing.cpu_count(),
+        read_alignment=True,
+        split_flag=2,
+        ter_flag=0,
+        raise_error=True,
+    )
+    alignments = {
+        (r["id1"], r["chain_id1"], r["id2"], r["chain_id2"]): r
+        for r in runner.run(df_pairs).to_dict("records")
+    }
+
+    for (
+        wild_name,
+        wild_chain,
+        mutant_name,
+        mutant_chain,
+        pdb_query_path,
+        pdb_target_path,
+    ) in zip(
+        df["wild_name"],
+        df["wild_chain"],
+        df["mutant_name"],
+        df["mutant_chain"],
+        df_pairs["structure_path1"],
+        df_pairs["structure_path2"],
     ):
-        with tempfile.TemporaryDirectory() as tmpdirname:
-            tmpdir_path = Path(tmpdirname)
-            pdb_query_path = get_pdb_file_path(wild_name)
-            pdb_target_path = get_pdb_file_path(mutant_name)
-
-            # tmalign can not read gz files
-            unpack_gz(pdb_query_path, tmpdir_path / pdb_query_path.stem)
-            unpack_gz(pdb_target_path, tmpdir_path / pdb_target_path.stem)
-            pdb_query_path = tmpdir_path / pdb_query_path.stem
-            pdb_target_path = tmpdir_path / pdb_target_path.stem
-
-            out_prefix = f"tmalign_stdout_{pdb_query_path.name}_{pdb_target_path.name}"
-            res_dict = call_tmalign(
-                pdb_query_path,
-                pdb_target_path,
-                tmpdir_path / out_prefix,
-                out_prefix,
-                split_flag=2,
-                ter_flag=0,
-                write_rotation=False,
-                raise_error=True,
-            )
-
-            if not res_dict or not "stdout" in res_dict or not res_dict["stdout"]:
-                raise ValueError("Failed TMalign calculation")
-
-            info_dicts = parse_stdout(res_dict["stdout"].decode(), read_alignment=True)
-
-            relevant_info_dict = None
-            for i_dict in info_dicts:
-                if "chain_id1" not in i_dict or "chain_id2" not in i_dict:
-                    continue
-                if (
-                    i_dict["chain_id1"] == wild_chain
-                    and i_dict["chain_id2"] == mutant_chain
-                ):
-                    relevant_info_dict = i_dict
-                    break
-            if relevant_info_dict is None:
-                raise ValueError("No alignment for chain pair")
-
-            # print(out_prefix, relevant_info_dict)
-
-            # get sequences from atom entries in PDB files
-            ref_seq = [
-                res_entry
-                for res_entry in get_atom_based_sequence(pdb_query_path)
-                if res_entry["chain"] == wild_chain
-            ]
-            tar_seq = [
-                res_entry
-                for res_entry in get_atom_based_sequence(pdb_target_path)
-                if res_entry["chain"] == mutant_chain
-            ]
-
-            aligned_position_dict = calc_point_mutation_position(
-                relevant_info_dict, ref_seq, tar_seq
-            )
-
-            wild_aas.append(aligned_position_dict["ref_aa"])
-            wild_align_pos.append(aligned_position_dict["ref_align_pos"])
-            wild_infile_pos.append(aligned_position_dict["ref_infile_id"])
-            mutant_aas.append(aligned_position_dict["tar_aa"])
-            mutant_align_pos.append(aligned_position_dict["tar_align_pos"])
-            mutant_infile_pos.append(aligned_position_dict["tar_infile_id"])
-
-            tmalign_rmsd_list.append(i_dict["rmsd"])
-            tmalign_seqid_list.append(i_dict["seqid"])
-            tmscore1_list.append(i_dict["tm_score1"])
-            tmscore2_list.append(i_dict["tm_score2"])
-            tmalign_seqlen1_list.append(i_dict["chain1_len"])
-            tmalign_seqlen2_list.append(i_dict["chain2_len"])
-            tmalign_alignlen_list.append(i_dict["align_len"])
-            has_non_terminal_indels_list.append(
-                has_non_terminal_indels(relevant_info_dict, 20)
-            )
-
-            if has_non_terminal_indels_list[-1]:
-                print(relevant_info_dict["refseq"])
-                print(relevant_info_dict["targetseq"])
+        relevant_info_dict = alignments.get(
+            (wild_name, wild_chain, mutant_name, mutant_chain)
+        )
+        if relevant_info_dict is None:
+            raise ValueError("No alignment for chain pair")
+
+        # get sequences from atom entries in PDB files
+        ref_seq = [
+            res_entry
+            for res_entry in get_atom_based_sequence(pdb_query_path)
+            if res_entry["chain"] == wild_chain
+        ]
+        tar_seq = [
+            res_entry
+            for res_entry in get_atom_based_sequence(pdb_target_path)
+            if res_entry["chain"] == mutant_chain
+        ]
+
+        aligned_position_dict = calc_point_mutation_position(
+            relevant_info_dict, ref_seq, tar_seq
+        )
+
+        wild_aas.append(aligned_position_dict["ref_aa"])
+        wild_align_pos.append(aligned_position_dict["ref_align_pos"])
+        wild_infile_pos.append(aligned_position_dict["ref_infile_id"])
+        mutant_aas.append(aligned_position_dict["tar_aa"])
+        mutant_align_pos.append(aligned_position_dict["tar_align_pos"])
+        mutant_infile_pos.append(aligned_position_dict["tar_infile_id"])
+
+        tmalign_rmsd_list.append(relevant_info_dict["rmsd"])
+        tmalign_seqid_list.append(relevant_info_dict["seqid"])
+        tmscore1_list.append(relevant_info_dict["tm_score1"])
+        tmscore2_list.append(relevant_info_dict["tm_score2"])
+        tmalign_seqlen1_list.append(relevant_info_dict["chain1_len"])
+        tmalign_seqlen2_list.append(relevant_info_dict["chain2_len"])
+        tmalign_alignlen_list.append(relevant_info_dict["align_len"])
+        has_non_terminal_indels_list.append(
+            has_non_terminal_indels(relevant_info_dict, 20)
+        )
+
+        if has_non_terminal_indels_list[-1]:
+            print(relevant_info_dict["refseq"])
+            print(relevant_info_dict["targetseq"])
 
     df[helper.WILD_AA] = wild_aas
     df[helper.WILD_SEQ_NUM] = wild_infile_pos
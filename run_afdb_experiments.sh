@@ -26,7 +26,7 @@ run_search() {
     --cpus ${max_cpus} \
     --outdir "${result_dir}" \
     --mode "standard" \
-    ${run_on_hpc:+--hpc} || { return 1; }
+    ${run_on_hpc:+--backend sge} || { return 1; }
 }
 
 python create_dataset.py --dataset afdb -o "${work_dir}"
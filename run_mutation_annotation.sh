@@ -19,7 +19,7 @@ run_search() {
     --cpus ${max_cpus} \
     --outdir "${result_dir}" \
     --representation "${repr}" \
-    ${run_on_hpc:+--hpc} || { return 1; }
+    ${run_on_hpc:+--backend sge} || { return 1; }
 }
 
 # annotation: find structures for the mutant in the PDB
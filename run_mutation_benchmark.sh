@@ -21,7 +21,7 @@ run_search() {
     --cpus ${max_cpus} \
     --outdir "${result_dir}" \
     --representation "${repr}" \
-    ${run_on_hpc:+--hpc} || { return 1; }
+    ${run_on_hpc:+--backend sge} || { return 1; }
 
   if [ "$do_eval" = true ]; then
     report_dir="${result_dir}/report"
@@ -28,7 +28,7 @@ run_search() {
     --cpus ${max_cpus} \
     --outdir "${result_dir}" \
     --representation "${repr}" \
-    ${run_on_hpc:+--hpc} || { return 1; }
+    ${run_on_hpc:+--backend sge} || { return 1; }
 }
 
 python create_dataset.py --dataset pdb -o "${work_dir}"
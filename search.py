@@ -7,9 +7,8 @@ import os
 import sys
 from pathlib import Path
 
-import pandas as pd
-
-from helper.hpc import distribute_csv
+from helper import telemetry
+from helper.hpc import EXECUTORS, distribute_csv
 from helper.runners import MicroMinerSearch
 
 logger = logging.getLogger(__name__)
@@ -54,10 +53,27 @@ def main():
         help="Number of processes to use for parallel execution",
     )
     parser.add_argument(
-        "--hpc",
+        "--backend",
+        default=None,
+        type=str,
+        choices=sorted(EXECUTORS),
+        help="Distribute the searches as chunked array jobs: 'sge' on the HPC (ZBH"
+        " in-house cluster), 'local' with a pool of processes on this machine (--cpus"
+        " concurrent tasks). By default, searches run in this process.",
+    )
+    parser.add_argument(
+        "--batch_size",
+        default=16,
+        type=int,
+        help="Number of queries per MicroMiner invocation, if MicroMiner supports"
+        " searching many queries at once. Results are written when their batch finished.",
+    )
+    parser.add_argument(
+        "--no_resume",
         default=False,
         action="store_true",
-        help="Run calculation on HPC (ZBH in-house cluster).",
+        help="Recompute all queries. By default, queries that finished successfully in an"
+        " earlier run with the same parameters (see journal in outdir) are skipped.",
     )
 
     args = parser.parse_args()
@@ -65,9 +81,11 @@ def main():
     dataset_file = Path(args.dataset)
     outdir = Path(args.outdir)
     cpus = args.cpus
-    is_hpc = args.hpc
+    backend = args.backend
     mm_mode = args.mode
     mm_repr = args.representation
+    resume = not args.no_resume
+    batch_size = args.batch_size
 
     if not dataset_file.is_file():
         print("Error: Dataset file does not exist.")
@@ -86,24 +104,38 @@ def main():
     # prepare outdir
     outdir.mkdir(parents=False, exist_ok=True)
 
-    if is_hpc:
+    # timings of all MicroMiner calls (summarize with python -m helper.telemetry)
+    telemetry.enable(
+        telemetry.telemetry_dir() or outdir / "telemetry", dataset=dataset_file.stem
+    )
+
+    if backend is not None:
         distribute_csv(
             dataset_file,
             runner=MicroMinerSearch(
-                cpus=1, mm_mode=mm_mode, mm_repr=mm_repr, raise_error=False
+                cpus=1,
+                mm_mode=mm_mode,
+                mm_repr=mm_repr,
+                raise_error=False,
+                resume=resume,
+                batch_size=batch_size,
             ),
             outdir=outdir,
             job_name="search",
             cpus=cpus,
+            executor=EXECUTORS[backend](),
         )
     else:
         runner = MicroMinerSearch(
-            cpus=cpus, mm_mode=mm_mode, mm_repr=mm_repr, raise_error=False
+            cpus=cpus,
+            mm_mode=mm_mode,
+            mm_repr=mm_repr,
+            raise_error=False,
+            resume=resume,
+            batch_size=batch_size,
         )
-        perf_dict_list = runner.run(dataset_file, outdir=outdir)
-        # df_perf = pd.DataFrame(perf_dict_list).drop(['stdout', 'stderr', 'exit_code'], axis=1)
-        df_perf = pd.DataFrame(perf_dict_list)
-        df_perf.to_csv(outdir / "perf.tsv", sep="\t", index=False)
+        # the parsed output of every search is written to perf.tsv as soon as it finished
+        runner.run_to_tsv(dataset_file, outdir=outdir, perf_tsv=outdir / "perf.tsv")
 
 
 if __name__ == "__main__":